@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-19 22:03:48 krylon>
+#
+# /data/code/python/cephalopod/backup.py
+# created on 19. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/gpl-3.0
+
+"""
+cephalopod.backup
+
+(c) 2026 Benjamin Walkenhorst
+
+Back up the database while the application is running. Copying the file
+by hand can catch it halfway through a write, and the WAL has to be
+copied along with it. SQLite's online backup API copies a consistent
+snapshot instead. We copy a few pages at a time and pause in between, so
+the backup holds a read lock only briefly and writers are never kept
+waiting.
+
+If another connection writes to the database while the backup runs,
+SQLite starts the copy over. The daemon only backs up while it is idle,
+so that is rare, but if it keeps happening we give up rather than copy
+forever.
+
+Each backup is checked with PRAGMA integrity_check before it replaces
+anything, and optionally compressed with gzip. Only the newest few
+backups are kept.
+"""
+
+import gzip
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+from typing import Final, Optional
+
+from cephalopod import common
+
+# How many pages we copy at a time, and how long we pause after each step.
+PAGES_PER_STEP: Final[int] = 256
+STEP_SLEEP: Final[float] = 0.01
+# How often the backup may start over because the database changed.
+MAX_RESTARTS: Final[int] = 10
+STAMP_FMT: Final[str] = "%Y%m%d-%H%M%S"
+
+_name_pat: Final[re.Pattern] = \
+    re.compile(rf"^{common.APP_NAME.lower()}-(\d{{8}}-\d{{6}})\.db(?:\.gz)?$")
+
+
+class BackupError(Exception):
+    """BackupError is raised when a backup cannot be created, or a backup
+    turns out to be broken."""
+
+
+def verify(path: str) -> None:
+    """Check the integrity of a backup, which may be compressed. Raises
+    BackupError if the backup is broken."""
+    if path.endswith(".gz"):
+        with tempfile.TemporaryDirectory() as tmp:
+            plain: Final[str] = os.path.join(tmp, "verify.db")
+            try:
+                with gzip.open(path, "rb") as src, open(plain, "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+            except (OSError, EOFError) as err:
+                raise BackupError(f"Cannot decompress {path}: {err}") from err
+            verify(plain)
+        return
+
+    try:
+        conn: Final[sqlite3.Connection] = \
+            sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            res = conn.execute("PRAGMA integrity_check").fetchall()
+        finally:
+            conn.close()
+    except sqlite3.DatabaseError as err:
+        raise BackupError(f"Cannot check {path}: {err}") from err
+    if res != [("ok", )]:
+        raise BackupError(f"{path} is corrupt: {'; '.join(r[0] for r in res[:5])}")
+
+
+class Backup:
+    """Backup copies the database and keeps a number of older copies."""
+
+    __slots__ = [
+        "log",
+        "path",
+        "folder",
+        "keep",
+        "compress",
+    ]
+
+    log: logging.Logger
+    path: str
+    folder: str
+    keep: int
+    compress: bool
+
+    def __init__(self,
+                 path: str = "",
+                 folder: str = "",
+                 keep: int = 7,
+                 compress: bool = False) -> None:
+        """Create a Backup of the database at path, the application's
+        database by default, into folder, keeping the newest keep
+        backups."""
+        self.log = common.get_logger("Backup")
+        self.path = path if path != "" else common.path.db()
+        self.folder = folder if folder != "" else common.path.backup()
+        self.keep = keep
+        self.compress = compress
+
+    def backups(self) -> list[tuple[datetime, str]]:
+        """Return the existing backups with the time they were made, the
+        oldest first."""
+        try:
+            names: Final[list[str]] = os.listdir(self.folder)
+        except FileNotFoundError:
+            return []
+        result: Final[list[tuple[datetime, str]]] = []
+        for name in names:
+            m = _name_pat.match(name)
+            if m is not None:
+                result.append((datetime.strptime(m[1], STAMP_FMT),
+                               os.path.join(self.folder, name)))
+        result.sort()
+        return result
+
+    def latest(self) -> Optional[datetime]:
+        """Return when the newest backup was made, or None if there is
+        none."""
+        backups: Final[list[tuple[datetime, str]]] = self.backups()
+        return backups[-1][0] if len(backups) > 0 else None
+
+    def _copy(self, dest: str) -> None:
+        """Copy the database to dest, a few pages at a time."""
+        restarts: int = 0
+        last: int = -1
+
+        def progress(_status: int, remaining: int, _total: int) -> None:
+            nonlocal restarts, last
+            if 0 <= last < remaining:
+                restarts += 1
+                if restarts > MAX_RESTARTS:
+                    raise BackupError("The database keeps changing, "
+                                      f"gave up after {restarts} attempts")
+            last = remaining
+            time.sleep(STEP_SLEEP)
+
+        src: Final[sqlite3.Connection] = sqlite3.connect(self.path)
+        dst: Final[sqlite3.Connection] = sqlite3.connect(dest)
+        try:
+            src.backup(dst, pages=PAGES_PER_STEP, progress=progress)
+            # The copy would be in WAL mode like the original, but a backup
+            # should be a single file.
+            dst.execute("PRAGMA journal_mode = DELETE").fetchall()
+        finally:
+            dst.close()
+            src.close()
+
+    def run(self) -> str:
+        """Create a new backup, check it, and delete the backups that are
+        too old to keep. Returns the path of the new backup."""
+        os.makedirs(self.folder, exist_ok=True)
+        name: Final[str] = \
+            f"{common.APP_NAME.lower()}-{datetime.now().strftime(STAMP_FMT)}.db"
+        dest: Final[str] = os.path.join(self.folder, name + (".gz" if self.compress else ""))
+        tmp: Final[str] = os.path.join(self.folder, name + ".tmp")
+        part: Final[str] = dest + ".part"
+        start: Final[float] = time.monotonic()
+
+        try:
+            self._copy(tmp)
+            verify(tmp)
+            if self.compress:
+                with open(tmp, "rb") as src, gzip.open(part, "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                os.replace(part, dest)
+                os.remove(tmp)
+            else:
+                os.replace(tmp, dest)
+        except (sqlite3.Error, OSError) as err:
+            raise BackupError(f"Cannot back up {self.path}: {err}") from err
+        finally:
+            for p in (tmp, part):
+                if os.path.exists(p):
+                    os.remove(p)
+
+        self.log.info("Backed up %s to %s (%s) in %.1f s",
+                      self.path,
+                      dest,
+                      common.fmt_bytes(os.stat(dest).st_size),
+                      time.monotonic() - start)
+        self.rotate()
+        return dest
+
+    def rotate(self) -> list[str]:
+        """Delete all but the newest backups. Returns the paths of the
+        backups that were deleted."""
+        backups: Final[list[tuple[datetime, str]]] = self.backups()
+        doomed: Final[list[str]] = [p for _, p in backups[:max(0, len(backups) - self.keep)]]
+        for p in doomed:
+            self.log.debug("Delete old backup %s", p)
+            os.remove(p)
+        return doomed
+
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -18,9 +18,14 @@ cephalopod.cast
 """
 
 from datetime import datetime, timedelta
+from typing import Final, Optional
 
 from dataclasses import dataclass
 
+# After this many failed refreshes in a row, a Feed is parked: it is only
+# retried once in a long while, until a refresh succeeds again.
+FAILURE_LIMIT: Final[int] = 8
+
 
 @dataclass(slots=True, kw_only=True)
 class Feed:  # pylint: disable-msg=R0902
@@ -35,11 +40,34 @@ class Feed:  # pylint: disable-msg=R0902
     last_refresh: datetime
     autorefresh: bool
     folder: str
+    # The number of failed refreshes since the last successful one, the
+    # earliest time we try again, and what went wrong the last time.
+    failures: int = 0
+    retry_after: datetime = datetime.fromtimestamp(0)
+    last_error: str = ""
+    # The validators from the last response, for conditional requests.
+    etag: str = ""
+    last_modified: str = ""
+    # How many bytes of downloaded Episodes we keep for this Feed, 0 means
+    # no limit other than the global one.
+    quota: int = 0
 
     def age(self) -> timedelta:
         """Return the time that has passed since the last refresh of this podcast"""
         return datetime.now() - self.last_refresh
 
+    def is_parked(self) -> bool:
+        """Return True if the Feed has failed too often to be refreshed
+        along with the others."""
+        return self.failures >= FAILURE_LIMIT
+
+    def status(self) -> str:
+        """Return a short description of the Feed's health."""
+        if self.failures == 0:
+            return ""
+        state: Final[str] = "parked" if self.is_parked() else f"failed {self.failures}x"
+        return f"{state}: {self.last_error}"
+
 
 @dataclass(slots=True, kw_only=True)
 class Episode:  # pylint: disable-msg=R0902
@@ -57,7 +85,37 @@ class Episode:  # pylint: disable-msg=R0902
     finished: bool
     path: str
     keep: bool
+    # The description is stored compressed and not loaded along with the
+    # Episode, Database.episode_get_description fetches it when it is
+    # needed.
     description: str
+    # Duration in seconds. 0 means unknown, -1 means we tried to find
+    # out and failed.
+    duration: int = 0
+    # The space the downloaded file takes up on disk, 0 if it has not been
+    # downloaded.
+    size: int = 0
+
+
+@dataclass(slots=True, kw_only=True)
+class Subscription:
+    """A WebSub subscription for a Feed.
+
+    hub and topic are discovered from the feed itself. secret is empty
+    until we have asked the hub for a subscription, expires is the end of
+    the lease the hub has granted us, the epoch if none has been granted,
+    yet."""
+
+    feed_id: int
+    hub: str
+    topic: str
+    secret: str = ""
+    requested: datetime = datetime.fromtimestamp(0)
+    expires: datetime = datetime.fromtimestamp(0)
+
+    def is_active(self, now: Optional[datetime] = None) -> bool:
+        """Return True if the hub is pushing updates to us."""
+        return self.expires > (now if now is not None else datetime.now())
 
 
 # Local Variables: #
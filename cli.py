@@ -0,0 +1,585 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-19 13:34:02 krylon>
+#
+# /data/code/python/cephalopod/cli.py
+# created on 19. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/gpl-3.0
+
+"""
+cephalopod.cli
+
+(c) 2026 Benjamin Walkenhorst
+
+A command line interface that does not need Gtk, suitable for running
+from cron or a systemd timer. Keep the imports in this module (and the
+modules it imports) free of gi, so it starts quickly.
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta
+from typing import Final, Optional
+
+from cephalopod import common, config, daemon, opml
+from cephalopod.backup import Backup, BackupError, verify
+from cephalopod.client import Client
+from cephalopod.database import LIST_ORDER, Database, Selection
+from cephalopod.history import SessionLog
+from cephalopod.maintenance import Maintenance
+from cephalopod.playqueue import PlayQueue
+from cephalopod.retention import Retention
+from cephalopod.stats import ListeningStats, Period
+
+
+def use_daemon(args: argparse.Namespace) -> bool:
+    """Return True if we should hand the command to a running daemon."""
+    return not args.local and daemon.is_running()
+
+
+def cmd_daemon(args: argparse.Namespace) -> int:
+    """Run the refresh daemon in the foreground."""
+    address: Optional[tuple[str, int]] = None
+    if args.push_listen is not None:
+        host, _, port = args.push_listen.rpartition(":")
+        address = (host or "0.0.0.0", int(port))
+    daemon.Daemon(push_address=address,
+                  push_url=args.push_url,
+                  quota=args.quota).run()
+    return 0
+
+
+def cmd_refresh(args: argparse.Namespace) -> int:
+    """Refresh the feeds that are due, or all feeds with --force."""
+    cnt: int
+    if use_daemon(args):
+        cnt = daemon.call("refresh", force=args.force)["refreshed"]
+    else:
+        cnt = Client().refresh(args.force)
+    print(f"Refreshed {cnt} feeds")
+    return 0
+
+
+def cmd_add(args: argparse.Namespace) -> int:
+    """Subscribe to one or more feeds."""
+    remote: Final[bool] = use_daemon(args)
+    client: Final[Optional[Client]] = None if remote else Client()
+    status: int = 0
+    for url in args.url:
+        try:
+            if client is None:
+                res = daemon.call("add", url=url)
+                print(f"Added {res['title']} ({res['id']})")
+            else:
+                f = client.feed_add(url)
+                print(f"Added {f.title} ({f.fid})")
+        except Exception as e:  # pylint: disable-msg=W0718
+            print(f"Cannot add {url}: {e}", file=sys.stderr)
+            status = 1
+    return status
+
+
+def cmd_import(args: argparse.Namespace) -> int:
+    """Subscribe to all feeds listed in an OPML file, or a text file
+    listing one URL per line."""
+    added: int
+    failed: dict[str, str]
+    if use_daemon(args):
+        res = daemon.call("import", path=os.path.abspath(args.file))
+        added, failed = res["added"], res["failed"]
+    else:
+        feeds, failed = Client().import_feeds(opml.urls(args.file))
+        added = len(feeds)
+    for url, err in failed.items():
+        print(f"Cannot add {url}: {err}", file=sys.stderr)
+    print(f"Added {added} feeds, {len(failed)} failed")
+    return 1 if failed else 0
+
+
+def cmd_export(args: argparse.Namespace) -> int:
+    """Write the list of subscriptions as OPML."""
+    db: Final[Database] = Database()
+    if args.file == "-":
+        opml.write(db.feed_iter(), sys.stdout)
+    else:
+        with open(args.file, "w", encoding="utf-8") as fh:
+            opml.write(db.feed_iter(), fh)
+    return 0
+
+
+def cmd_backfill(args: argparse.Namespace) -> int:
+    """Fetch the back catalogue of paged feeds."""
+    ids: Final[Optional[list[int]]] = args.id if len(args.id) > 0 else None
+    new: int = 0
+    if use_daemon(args):
+        new = daemon.call("backfill", ids=ids)["new"]
+    else:
+        client: Final[Client] = Client()
+        for f in client.get_database().feed_get_all():
+            if ids is not None and f.fid not in ids:
+                continue
+            try:
+                new += client.backfill(f)
+            except Exception as e:  # pylint: disable-msg=W0718
+                print(f"Cannot fetch the back catalogue of {f.title}: {e}", file=sys.stderr)
+    print(f"Found {new} new episodes")
+    return 0
+
+
+def cmd_download(args: argparse.Namespace) -> int:
+    """Download one or more episodes."""
+    remote: Final[bool] = use_daemon(args)
+    client: Final[Optional[Client]] = None if remote else Client()
+    status: int = 0
+    for epid in args.id:
+        try:
+            if client is None:
+                path = daemon.call("download", id=epid)["path"]
+            else:
+                ep = client.get_database().episode_get_by_id(epid)
+                if ep is None:
+                    raise ValueError(f"No episode with ID {epid}")
+                client.episode_download(ep)
+                path = ep.path
+            print(f"Downloaded episode {epid} to {path}")
+        except Exception as e:  # pylint: disable-msg=W0718
+            print(f"Cannot download episode {epid}: {e}", file=sys.stderr)
+            status = 1
+    if client is not None:
+        Retention(client.get_database(), config.get().quota).run()
+    return status
+
+
+def cmd_delete(args: argparse.Namespace) -> int:
+    """Unsubscribe from one or more feeds, and delete their episodes and
+    downloads."""
+    remote: Final[bool] = use_daemon(args)
+    client: Final[Optional[Client]] = None if remote else Client()
+    status: int = 0
+    for fid in args.id:
+        try:
+            if client is None:
+                counts = daemon.call("delete", id=fid)
+            else:
+                f = client.get_database().feed_get_by_id(fid)
+                if f is None:
+                    raise ValueError(f"No feed with ID {fid}")
+                counts = client.feed_delete(f)
+            print(f"Deleted feed {fid}: {counts['episodes']} episodes, "
+                  f"{counts['files']} downloads, {common.fmt_bytes(counts['freed'])}")
+        except Exception as e:  # pylint: disable-msg=W0718
+            print(f"Cannot delete feed {fid}: {e}", file=sys.stderr)
+            status = 1
+    return status
+
+
+def cmd_mark(args: argparse.Namespace) -> int:
+    """Mark episodes as played or unplayed, keep them or not, or rewind
+    them, all at once."""
+    sel: Final[Selection] = Selection(
+        feed_id=args.feed,
+        ids=args.id if len(args.id) > 0 else None,
+        published_before=args.before)
+    if sel.feed_id is None and sel.ids is None and sel.published_before is None \
+       and not args.all:
+        print("Give episode IDs, --feed or --before, or --all", file=sys.stderr)
+        return 1
+    db: Final[Database] = Database()
+    with db:
+        match args.action:
+            case "played":
+                cnt = db.episodes_set_finished(sel, True)
+            case "unplayed":
+                cnt = db.episodes_set_finished(sel, False)
+            case "keep":
+                cnt = db.episodes_set_keep(sel, True)
+            case "unkeep":
+                cnt = db.episodes_set_keep(sel, False)
+            case _:
+                cnt = db.episodes_reset_pos(sel)
+    print(f"Changed {cnt} episodes")
+    return 0
+
+
+def cmd_list(args: argparse.Namespace) -> int:
+    """List episodes, or add them up by feed with --totals."""
+    db: Final[Database] = Database()
+    sel: Final[Selection] = Selection(
+        feed_id=args.feed,
+        published_before=args.before,
+        finished=False if args.unplayed else None,
+        downloaded=True if args.downloaded else None)
+    if args.totals:
+        feeds = db.feed_map()
+        for fid, t in sorted(db.episode_totals(sel).items()):
+            f = feeds.get(fid)
+            print(f"{fid:>5} {f.title if f is not None else '':<40.40} {t.episodes:>6} "
+                  f"{t.unplayed:>6} {t.downloaded:>6} {t.remaining / 3600:>8.1f}h")
+        return 0
+    for epid, title in db.episode_list(sel, args.sort, not args.ascending,
+                                       args.limit if args.limit > 0 else -1):
+        print(f"{epid:>8} {title}")
+    return 0
+
+
+def cmd_listen(args: argparse.Namespace) -> int:
+    """Record that an episode was played, e.g. by an external player."""
+    stop: Final[datetime] = datetime.now()
+    start: Final[datetime] = args.start if args.start is not None \
+        else stop - timedelta(seconds=max(args.pos_to - args.pos_from, 0))
+    if use_daemon(args):
+        daemon.call("listen",
+                    id=args.id,
+                    start=int(start.timestamp()),
+                    stop=int(stop.timestamp()),
+                    pos_from=args.pos_from,
+                    pos_to=args.pos_to)
+        return 0
+    db: Final[Database] = Database()
+    ep = db.episode_get_by_id(args.id)
+    if ep is None:
+        print(f"No episode with ID {args.id}", file=sys.stderr)
+        return 1
+    with db:
+        db.episode_set_pos(ep, args.pos_to)
+    log: Final[SessionLog] = SessionLog()
+    log.record(ep, start, stop, args.pos_from, args.pos_to)
+    log.flush(db)
+    return 0
+
+
+def cmd_history(args: argparse.Namespace) -> int:
+    """Print how much was listened to, by period and feed."""
+    until: Final[datetime] = args.until or datetime.now()
+    since: Final[datetime] = args.since or until - timedelta(days=28)
+    rows: list[list[int]]
+    if use_daemon(args):
+        rows = daemon.call("history",
+                           period=args.period,
+                           since=int(since.timestamp()),
+                           until=int(until.timestamp()))
+    else:
+        totals = ListeningStats(Database()).get(Period(args.period), since, until)
+        rows = [[int(start.timestamp()), fid, t.sessions, t.seconds, t.wall]
+                for start, feeds in totals.items()
+                for fid, t in feeds.items()]
+    feeds = Database().feed_map()
+    for stamp, fid, sessions, seconds, wall in sorted(rows, key=lambda r: (r[0], -r[3])):
+        f = feeds.get(fid)
+        print(f"{datetime.fromtimestamp(stamp).strftime('%Y-%m-%d')} "
+              f"{f.title if f is not None else fid:<40.40} {sessions:>5} "
+              f"{seconds / 3600:>7.1f}h {wall / 3600:>7.1f}h")
+    return 0
+
+
+def cmd_queue(args: argparse.Namespace) -> int:
+    """Show the queue of episodes to listen to next, or add, move or
+    remove episodes."""
+    db: Final[Database] = Database()
+    pq: Final[PlayQueue] = PlayQueue(db)
+    if args.action in ("add", "move"):
+        for epid in args.id:
+            if db.episode_get_by_id(epid) is None:
+                print(f"No episode with ID {epid}", file=sys.stderr)
+                return 1
+    match args.action:
+        case "add":
+            for epid in args.id:
+                pq.add(epid)
+        case "move":
+            # The episodes end up behind each other, in the order given.
+            after: Optional[int] = args.after
+            for epid in args.id:
+                pq.move(epid, after)
+                after = epid
+        case "remove":
+            for epid in args.id:
+                if not pq.remove(epid):
+                    print(f"Episode {epid} is not in the queue", file=sys.stderr)
+        case "rebalance":
+            print(f"Gave {pq.rebalance(force=True)} episodes a new rank")
+        case _:
+            ids = pq.next(args.limit)
+            episodes = {e.epid: e for e in db.episode_get_by_ids(ids)}
+            for epid in ids:
+                print(f"{epid:>8} {episodes[epid].title}")
+    return 0
+
+
+def cmd_stats(args: argparse.Namespace) -> int:
+    """Print some numbers about the database, and the daemon if it is running."""
+    stats: Final[dict] = daemon.call("status") if use_daemon(args) else Database().stats()
+    for k, v in stats.items():
+        print(f"{k:<12} {v!s:>12}")
+    return 0
+
+
+def cmd_quota(args: argparse.Namespace) -> int:
+    """Set how much space the downloads of a feed may take up."""
+    db: Final[Database] = Database()
+    f = db.feed_get_by_id(args.id)
+    if f is None:
+        print(f"No feed with ID {args.id}", file=sys.stderr)
+        return 1
+    with db:
+        db.feed_set_quota(f, args.size)
+    print(f"Quota of {f.title}: {common.fmt_bytes(f.quota) if f.quota > 0 else 'none'}")
+    return 0
+
+
+def cmd_prune(args: argparse.Namespace) -> int:
+    """Delete finished downloads that exceed their quotas."""
+    db: Final[Database] = Database()
+    if args.check:
+        with db:
+            fixed = db.episode_check_sizes()
+        print(f"Fixed the sizes of {fixed} downloads")
+    quota: Final[int] = args.quota if args.quota is not None else config.get().quota
+    files, freed = Retention(db, quota).run()
+    print(f"Deleted {files} downloads, freed {common.fmt_bytes(freed)}")
+    return 0
+
+
+def cmd_compress(_args: argparse.Namespace) -> int:
+    """Build a new dictionary to compress episode descriptions with, and
+    recompress them."""
+    db: Final[Database] = Database()
+    before: Final[dict] = db.stats()
+    db.text_train()
+    after: Final[dict] = db.stats()
+    raw: Final[int] = after["text_raw"]
+    print(f"{'descriptions':<12} {raw:>12}")
+    for label, st in (("before", before), ("after", after)):
+        ratio = st["text_stored"] / raw if raw > 0 else 1.0
+        print(f"{label:<12} {st['text_stored']:>12} {ratio:>8.1%}")
+    return 0
+
+
+def cmd_maintain(args: argparse.Namespace) -> int:
+    """Optimize, checkpoint and vacuum the database, or rebuild it with
+    --vacuum."""
+    lines: list[str]
+    if args.vacuum:
+        lines = Maintenance(Database()).rebuild().lines()
+    elif use_daemon(args):
+        lines = daemon.call("maintain")
+    else:
+        lines = Maintenance(Database()).run().lines()
+    for line in lines:
+        print(line)
+    return 0
+
+
+def cmd_backup(args: argparse.Namespace) -> int:
+    """Back up the database, or check existing backups with --verify."""
+    if len(args.verify) > 0:
+        status: int = 0
+        for path in args.verify:
+            try:
+                verify(path)
+                print(f"{path}: ok")
+            except BackupError as e:
+                print(e, file=sys.stderr)
+                status = 1
+        return status
+
+    settings: Final[config.Settings] = config.get()
+    b: Final[Backup] = Backup(folder=args.folder or "",
+                              keep=args.keep or settings.backup_keep,
+                              compress=args.compress or settings.backup_compress)
+    try:
+        print(b.run())
+    except BackupError as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
+
+
+def cmd_settings(_args: argparse.Namespace) -> int:
+    """Print the settings in effect, from the profile and settings.toml."""
+    print(f"# {common.path.config()}")
+    for name, value in config.describe(config.get()):
+        print(f"{name:<17} {value}")
+    return 0
+
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    """Parse the command line arguments."""
+    parser = argparse.ArgumentParser(prog=common.APP_NAME.lower(),
+                                     description="Manage podcasts without a GUI")
+    parser.add_argument("-b", "--basedir",
+                        help="The folder for the database, downloads, etc.")
+    parser.add_argument("-l", "--local", action="store_true",
+                        help="Do not hand commands to a running daemon")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("daemon", help=cmd_daemon.__doc__)
+    p.add_argument("--push-listen", metavar="[HOST:]PORT",
+                   help="Accept WebSub callbacks on this address")
+    p.add_argument("--push-url", metavar="URL", default="",
+                   help="The URL under which WebSub hubs reach --push-listen")
+    p.add_argument("--quota", metavar="SIZE", type=common.parse_size,
+                   help="The space all downloads together may take up, e.g. 20G, "
+                   "instead of downloads.quota from the settings")
+    p.set_defaults(func=cmd_daemon)
+
+    p = sub.add_parser("refresh", help=cmd_refresh.__doc__)
+    p.add_argument("-f", "--force", action="store_true",
+                   help="Refresh all feeds, whether they are due or not")
+    p.set_defaults(func=cmd_refresh)
+
+    p = sub.add_parser("add", help=cmd_add.__doc__)
+    p.add_argument("url", nargs="+")
+    p.set_defaults(func=cmd_add)
+
+    p = sub.add_parser("import", help=cmd_import.__doc__)
+    p.add_argument("file")
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser("export", help=cmd_export.__doc__)
+    p.add_argument("file", nargs="?", default="-",
+                   help="The file to write to, standard output by default")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("backfill", help=cmd_backfill.__doc__)
+    p.add_argument("id", nargs="*", type=int,
+                   help="The IDs of the feeds to backfill, all feeds by default")
+    p.set_defaults(func=cmd_backfill)
+
+    p = sub.add_parser("download", help=cmd_download.__doc__)
+    p.add_argument("id", nargs="+", type=int)
+    p.set_defaults(func=cmd_download)
+
+    p = sub.add_parser("delete", help=cmd_delete.__doc__)
+    p.add_argument("id", nargs="+", type=int)
+    p.set_defaults(func=cmd_delete)
+
+    p = sub.add_parser("mark", help=cmd_mark.__doc__)
+    p.add_argument("action", choices=("played", "unplayed", "keep", "unkeep", "rewind"))
+    p.add_argument("id", nargs="*", type=int,
+                   help="The IDs of the episodes to mark")
+    p.add_argument("--feed", type=int, metavar="ID",
+                   help="Only the episodes of this feed")
+    p.add_argument("--before", type=datetime.fromisoformat, metavar="DATE",
+                   help="Only the episodes published before this date, e.g. 2026-01-01")
+    p.add_argument("--all", action="store_true",
+                   help="All episodes, unless narrowed down by the other options")
+    p.set_defaults(func=cmd_mark)
+
+    p = sub.add_parser("list", help=cmd_list.__doc__)
+    p.add_argument("--feed", type=int, metavar="ID",
+                   help="Only the episodes of this feed")
+    p.add_argument("--before", type=datetime.fromisoformat, metavar="DATE",
+                   help="Only the episodes published before this date")
+    p.add_argument("--unplayed", action="store_true",
+                   help="Only the episodes not listened to, yet")
+    p.add_argument("--downloaded", action="store_true",
+                   help="Only the episodes that are downloaded")
+    p.add_argument("--sort", default="published", choices=LIST_ORDER)
+    p.add_argument("--ascending", action="store_true",
+                   help="Sort in ascending order, newest or largest first by default")
+    p.add_argument("-n", "--limit", type=int, default=0, metavar="N",
+                   help="List at most N episodes")
+    p.add_argument("--totals", action="store_true",
+                   help="Print the number of episodes, unplayed and downloaded ones, "
+                   "and the time left to listen by feed instead")
+    p.set_defaults(func=cmd_list)
+
+    p = sub.add_parser("listen", help=cmd_listen.__doc__)
+    p.add_argument("id", type=int)
+    p.add_argument("pos_from", type=int, metavar="FROM",
+                   help="Where playback started, in seconds into the episode")
+    p.add_argument("pos_to", type=int, metavar="TO",
+                   help="Where playback stopped, in seconds into the episode")
+    p.add_argument("--start", type=datetime.fromisoformat, metavar="TIME",
+                   help="When playback started, by default as long before now "
+                   "as the span played")
+    p.set_defaults(func=cmd_listen)
+
+    p = sub.add_parser("history", help=cmd_history.__doc__)
+    p.add_argument("--period", default="week", choices=[x.value for x in Period])
+    p.add_argument("--since", type=datetime.fromisoformat, metavar="DATE",
+                   help="Four weeks ago by default")
+    p.add_argument("--until", type=datetime.fromisoformat, metavar="DATE",
+                   help="Now by default")
+    p.set_defaults(func=cmd_history)
+
+    p = sub.add_parser("queue", help=cmd_queue.__doc__)
+    p.add_argument("action", nargs="?", default="show",
+                   choices=("show", "add", "move", "remove", "rebalance"))
+    p.add_argument("id", nargs="*", type=int,
+                   help="The IDs of the episodes to add, move or remove")
+    p.add_argument("--after", type=int, metavar="ID",
+                   help="Move the episodes behind this one, to the start of the queue "
+                   "by default")
+    p.add_argument("-n", "--limit", type=int, default=10, metavar="N",
+                   help="Show the next N episodes")
+    p.set_defaults(func=cmd_queue)
+
+    p = sub.add_parser("stats", help=cmd_stats.__doc__)
+    p.set_defaults(func=cmd_stats)
+
+    p = sub.add_parser("quota", help=cmd_quota.__doc__)
+    p.add_argument("id", type=int)
+    p.add_argument("size", type=common.parse_size,
+                   help="e.g. 500M or 2G, 0 for no limit")
+    p.set_defaults(func=cmd_quota)
+
+    p = sub.add_parser("prune", help=cmd_prune.__doc__)
+    p.add_argument("--quota", metavar="SIZE", type=common.parse_size,
+                   help="The space all downloads together may take up, e.g. 20G, "
+                   "instead of downloads.quota from the settings")
+    p.add_argument("--check", action="store_true",
+                   help="Check the recorded sizes against the files first")
+    p.set_defaults(func=cmd_prune)
+
+    p = sub.add_parser("compress", help=cmd_compress.__doc__)
+    p.set_defaults(func=cmd_compress)
+
+    p = sub.add_parser("maintain", help=cmd_maintain.__doc__)
+    p.add_argument("--vacuum", action="store_true",
+                   help="Rebuild the whole database, which may take a while")
+    p.set_defaults(func=cmd_maintain)
+
+    p = sub.add_parser("backup", help=cmd_backup.__doc__)
+    p.add_argument("--folder", help="Where to put the backup, the backup folder by default")
+    p.add_argument("--keep", type=int, metavar="N",
+                   help="How many backups to keep, instead of backup.keep from the settings")
+    p.add_argument("-z", "--compress", action="store_true",
+                   help="Compress the backup with gzip")
+    p.add_argument("--verify", nargs="+", default=[], metavar="FILE",
+                   help="Check the integrity of existing backups instead")
+    p.set_defaults(func=cmd_backup)
+
+    p = sub.add_parser("settings", help=cmd_settings.__doc__)
+    p.set_defaults(func=cmd_settings)
+
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """Run the command given on the command line and return the exit status."""
+    args: Final[argparse.Namespace] = parse_args(argv)
+    if args.basedir is not None:
+        common.set_basedir(args.basedir)
+    try:
+        config.get()
+    except config.ConfigError as e:
+        print(e, file=sys.stderr)
+        return 2
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -18,22 +18,196 @@ cephalopod.client
 """
 
 import calendar
+import email.utils
 import logging
 import os
+import random
+import re
+import shutil
 import time
-from datetime import datetime, timedelta
+import urllib.error
+import urllib.request
+from concurrent.futures import (FIRST_COMPLETED, Future, ThreadPoolExecutor,
+                                as_completed, wait)
+from dataclasses import replace
+from datetime import datetime, timedelta, timezone
 from mimetypes import guess_extension
-from queue import Empty, SimpleQueue
-from threading import Lock, Thread, local
-from typing import Final
+from threading import BoundedSemaphore, Lock, Thread, local
+from typing import Any, Final, Iterable, Optional
 
-import feedparser
-
-from cephalopod import common
-from cephalopod.cast import Episode, Feed
-from cephalopod.database import Database
+from cephalopod import common, config, paging
+from cephalopod.cast import FAILURE_LIMIT, Episode, Feed
+from cephalopod.database import Database, file_size
+from cephalopod.probe import parse_itunes_duration
+from cephalopod.retention import unlink_batch
+from cephalopod.scheduler import FetchScheduler
 
 refresh_interval: Final[timedelta] = timedelta(minutes=60)
+download_timeout: Final[float] = 30.0
+# How many imported feeds are added to the database per transaction.
+import_batch: Final[int] = 50
+# How many pages of a paged feed we fetch at the same time. The per-host
+# limits of the fetch scheduler apply on top of that.
+backfill_workers: Final[int] = 4
+
+# connect_timeout applies to establishing the connection and to every
+# single read from it, read_timeout limits the transfer of a feed as a
+# whole, so a server that trickles out a byte every few seconds cannot
+# hold on to a worker either.
+connect_timeout: Final[float] = 10.0
+read_timeout: Final[float] = 60.0
+max_feed_size: Final[int] = 32 << 20
+
+# A feed that failed to refresh is retried after backoff_base, the delay
+# doubles with each further failure up to backoff_max. Once a feed is
+# parked, it is only retried every park_interval.
+backoff_base: Final[timedelta] = timedelta(minutes=15)
+backoff_max: Final[timedelta] = timedelta(hours=24)
+park_interval: Final[timedelta] = timedelta(days=7)
+
+# How long we wait before asking a server again that told us to slow down,
+# but did not say for how long.
+default_retry_after: Final[float] = 60.0
+
+# Feeds whose hub pushes updates to us (WebSub) are still polled once in a
+# while, in case the hub silently drops our subscription.
+push_interval: Final[timedelta] = timedelta(hours=24)
+
+_max_age_pat: Final[re.Pattern] = re.compile(r"(?:^|,)\s*max-age\s*=\s*(\d+)", re.I)
+
+
+class FetchError(Exception):
+    """FetchError is raised when a feed cannot be fetched or parsed."""
+
+
+class RateLimited(FetchError):
+    """RateLimited is raised when a server answers with HTTP 429 or 503.
+    delay is the number of seconds it wants us to wait."""
+
+    def __init__(self, url: str, status: int, delay: float) -> None:
+        super().__init__(f"{url} answered {status}, retry after {delay:.0f} seconds")
+        self.delay = delay
+
+
+def parse_retry_after(value: Optional[str]) -> float:
+    """Parse a Retry-After header, which is either a number of seconds or
+    an HTTP date, and return the number of seconds to wait."""
+    if value is None or value.strip() == "":
+        return default_retry_after
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        then = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default_retry_after
+    if then.tzinfo is None:
+        then = then.replace(tzinfo=timezone.utc)
+    return max(0.0, (then - datetime.now(timezone.utc)).total_seconds())
+
+
+def parse_max_age(value: Optional[str]) -> int:
+    """Return the max-age from a Cache-Control header in seconds, or 0 if
+    there is none or the response must not be cached."""
+    if value is None or "no-cache" in value or "no-store" in value:
+        return 0
+    m = _max_age_pat.search(value)
+    return int(m[1]) if m is not None else 0
+
+
+def parse(src, headers=None):
+    """Parse a feed from a URL or a string.
+
+    feedparser is imported on first use, so a process that never parses a
+    feed (e.g. the GUI, or the command line client showing statistics)
+    does not have to pay for loading it."""
+    import feedparser  # pylint: disable-msg=C0415
+    return feedparser.parse(src, response_headers=headers)
+
+
+def fetch(url: str,
+          etag: str = "",
+          last_modified: str = "") -> Optional[tuple[bytes, dict[str, str]]]:
+    """Fetch the document at url, within the time limits set by
+    connect_timeout and read_timeout. If etag or last_modified are given,
+    the request is conditional.
+
+    Returns the body and the headers that matter to the feed parser, or
+    None if the document has not changed."""
+    deadline: Final[float] = time.monotonic() + read_timeout
+    req: Final[urllib.request.Request] = urllib.request.Request(url, headers={
+        "User-Agent": f"{common.APP_NAME}/{common.APP_VERSION}",
+    })
+    if etag != "":
+        req.add_header("If-None-Match", etag)
+    if last_modified != "":
+        req.add_header("If-Modified-Since", last_modified)
+    chunks: list[bytes] = []
+    size: int = 0
+    try:
+        res = urllib.request.urlopen(req, timeout=connect_timeout)  # pylint: disable-msg=R1732
+    except urllib.error.HTTPError as err:
+        if err.code == 304:
+            return None
+        if err.code in (429, 503):
+            raise RateLimited(url, err.code, parse_retry_after(err.headers.get("Retry-After"))) \
+                from err
+        raise
+    with res:
+        while chunk := res.read(1 << 16):
+            size += len(chunk)
+            if size > max_feed_size:
+                raise FetchError(f"{url} is larger than {max_feed_size} bytes")
+            if time.monotonic() > deadline:
+                raise FetchError(f"Reading {url} took longer than {read_timeout} seconds")
+            chunks.append(chunk)
+        headers: Final[dict[str, str]] = {
+            "content-location": res.geturl(),
+            "content-type": res.headers.get("Content-Type", ""),
+            "cache-control": res.headers.get("Cache-Control", ""),
+            "etag": res.headers.get("ETag", ""),
+            "last-modified": res.headers.get("Last-Modified", ""),
+        }
+    return b"".join(chunks), headers
+
+
+def fetch_feed(url: str, etag: str = "", last_modified: str = ""):
+    """Fetch and parse the feed at url. If etag or last_modified are
+    given, returns None if the feed has not changed since.
+
+    Raises FetchError if the document is not a feed at all."""
+    res = fetch(url, etag, last_modified)
+    if res is None:
+        return None
+    d = parse(*res)
+    if d.get("bozo") and not d["entries"] and "title" not in d["feed"]:
+        raise FetchError(f"Cannot parse {url}: {d.get('bozo_exception')}")
+    return d
+
+
+def backoff(failures: int) -> timedelta:
+    """Return how long to wait before retrying a Feed that has failed to
+    refresh failures times in a row.
+
+    The delay is randomized by up to half its length, so feeds that broke
+    at the same time (because they live on the same server, say) do not
+    keep being retried in lockstep."""
+    delay: Final[timedelta] = park_interval if failures >= FAILURE_LIMIT \
+        else min(backoff_max, backoff_base * (1 << max(failures - 1, 0)))
+    return delay / 2 + delay / 2 * random.random()
+
+
+def is_due(f: Feed,
+           now: datetime,
+           force: bool = False,
+           interval: timedelta = refresh_interval) -> bool:
+    """Return True if the Feed should be refreshed.
+
+    force skips the regular refresh interval as well as the backoff of
+    failing Feeds, but parked Feeds still wait for their next retry."""
+    if now < f.retry_after and (not force or f.is_parked()):
+        return False
+    return force or f.age() >= interval
 
 
 class Client:  # pylint: disable-msg=R0903
@@ -44,83 +218,149 @@ class Client:  # pylint: disable-msg=R0903
         "workers",
         "lock",
         "active",
+        "refreshing",
         "log",
         "pool",
         "fetch_queue",
+        "fresh_until",
+        "settings",
+        "download_slots",
     ]
 
     worker_cnt: int
     workers: list[Thread]
     lock: Lock
     active: bool
+    refreshing: bool
     log: logging.Logger
     pool: local
-    fetch_queue: SimpleQueue[Feed]
+    fetch_queue: FetchScheduler
+    fresh_until: dict[int, datetime]
+    settings: config.Settings
+    download_slots: BoundedSemaphore
 
     def __init__(self, worker_cnt: int = 0):
-        if worker_cnt == 0:
-            worker_cnt = os.cpu_count() or 1
-
-        self.worker_cnt = worker_cnt
+        """Create a Client. worker_cnt overrides the number of fetch
+        workers from the settings.
+
+        Fetching feeds is mostly waiting for the network, and the scheduler
+        keeps the load on each single server down, so the profiles afford
+        more workers than there are CPUs."""
+        self.settings = config.get()
+        if worker_cnt > 0:
+            self.settings = replace(self.settings, workers=worker_cnt)
+
+        self.worker_cnt = self.settings.workers
+        self.download_slots = BoundedSemaphore(self.settings.downloads)
         self.workers = []
         self.lock = Lock()
         self.active = False
+        self.refreshing = False
         self.log = common.get_logger("Client")
         self.pool = local()
-        self.fetch_queue = SimpleQueue()
+        self.fetch_queue = FetchScheduler()
+        self.fresh_until = {}
 
     def get_database(self) -> Database:
         """Get the Database instance for the calling thread."""
         try:
-            return self.pool.db
+            db = self.pool.db
         except AttributeError:
             db = Database()  # pylint: disable-msg=C0103
             self.pool.db = db
             return db
+        db.retune()
+        return db
 
     def is_active(self) -> bool:
         """Return the Client's Active flag"""
         with self.lock:
             return self.active
 
+    def is_refreshing(self) -> bool:
+        """Return True if a refresh is currently in progress."""
+        with self.lock:
+            return self.refreshing
+
+    def queued(self) -> int:
+        """Return the number of feeds that are queued or being fetched."""
+        return len(self.fetch_queue)
+
+    def start(self) -> None:
+        """Start the worker threads, unless they are already running.
+
+        A Client that has been started keeps its workers (and their
+        database connections) around until stop is called, so a long-running
+        process does not pay for starting them over and over again."""
+        with self.lock:
+            if self.active:
+                return
+            self.active = True
+
+        self.log.debug("Starting %d worker threads.", self.worker_cnt)
+        self._spawn(0, self.worker_cnt)
+
+    def _spawn(self, lo: int, hi: int) -> None:
+        """Start the workers with the numbers from lo up to hi."""
+        for i in range(lo, hi):
+            t = Thread(target=self._fetch_worker, args=(i, ), daemon=True)
+            t.start()
+            self.workers.append(t)
+
+    def apply(self, settings: config.Settings) -> None:
+        """Switch to new Settings while the Client is running. Workers are
+        started or retired as needed, downloads that are running already
+        do not count against the new limit."""
+        with self.lock:
+            old: Final[int] = self.worker_cnt
+            self.settings = settings
+            self.worker_cnt = settings.workers
+            self.download_slots = BoundedSemaphore(settings.downloads)
+            active: Final[bool] = self.active
+        self.workers = [w for w in self.workers if w.is_alive()]
+        if active and settings.workers > old:
+            self._spawn(old, settings.workers)
+        self.log.info("Apply settings of profile %s: %d workers, %d downloads",
+                      settings.profile,
+                      settings.workers,
+                      settings.downloads)
+
     def stop(self) -> None:
-        """Clear the Client's active flag"""
+        """Clear the Client's active flag and wait for the workers to finish."""
         with self.lock:
             self.active = False
 
+        self.log.debug("Shutting down worker threads")
+        for w in self.workers:
+            w.join()
+        self.workers.clear()
+
+    def enqueue(self, feed: Feed, urgent: bool = False) -> Optional[Future]:
+        """Queue a Feed to be fetched by the worker threads, and return a
+        Future that resolves to the list of new Episodes once it has been
+        processed. Feeds the user is waiting for should be queued as urgent,
+        they are fetched before the Feeds queued by a regular refresh.
+
+        Returns None if the Feed's server has asked us to stay away for the
+        time being."""
+        fut: Final[Optional[Future]] = self.fetch_queue.put(feed, urgent)
+        if fut is None:
+            self.log.info("Skip feed %s, its server asked us to come back later", feed.title)
+        return fut
+
+    def wait(self) -> None:
+        """Wait until all queued Feeds have been processed."""
+        self.fetch_queue.join()
+
     def feed_add(self, url: str) -> Feed:
-        """Add a new feed."""
+        """Add a new feed, along with the Episodes it lists."""
         try:
             self.log.info("Add feed %s", url)
-            d = feedparser.parse(url)
-            f = d['feed']
-            folder = os.path.join(
-                common.path.download(),
-                f['title']
-            )
-
-            self.log.debug("Episodes for %s will be saved in %s",
-                           f['title'],
-                           folder)
-
-            feed = Feed(
-                fid=0,
-                feed_url=url,
-                homepage=f['link'],
-                title=f['title'],
-                description=f['description'],
-                cover_url=f['image']['href'],
-                last_refresh=datetime.fromtimestamp(0),
-                autorefresh=True,
-                folder=folder,
-            )
-
+            d = fetch_feed(url)
+            feed = self.make_feed(url, d)
             db = self.get_database()
-
             with db:
-                db.feed_add(feed)
-                assert feed.fid != 0
-
+                self.store_feed(feed, d)
             return feed
         except Exception as e:
             self.log.error("Error trying to load podcast from URL %s: %s",
@@ -128,53 +368,363 @@ class Client:  # pylint: disable-msg=R0903
                            e)
             raise
 
-    def refresh(self) -> None:
-        """Refresh all the podcast feeds that need a refresh."""
-        with self.lock:
-            if self.active:
-                self.log.error("Refresh is currently active.")
-                return
-            self.active = True
+    def feed_delete(self, feed: Feed) -> dict[str, int]:
+        """Unsubscribe from a Feed, and delete its Episodes and downloads.
+        Returns the number of rows deleted, by kind, plus the number of
+        files deleted and the bytes freed.
 
-        self.log.info("Refreshing podcast feeds")
+        The files are only deleted once the database changes have been
+        committed, so a failure leaves us with downloads we still know
+        about rather than rows that point to nothing."""
+        self.log.info("Delete feed %s (%d)", feed.title, feed.fid)
+        db: Final[Database] = self.get_database()
+        with db:
+            files: Final[list[tuple[int, str, int]]] = db.episode_get_files(feed)
+            counts: Final[dict[str, int]] = db.feed_delete(feed)
+        gone: Final[list[tuple[int, int]]] = unlink_batch(self.log, files)
+        counts["files"] = len(gone)
+        counts["freed"] = sum(size for _, size in gone)
+        try:
+            os.rmdir(feed.folder)
+        except OSError:
+            # Either it is gone already, or there is something in it we do
+            # not know about, which is not ours to delete.
+            pass
+        return counts
+
+    def make_feed(self, url: str, d) -> Feed:
+        """Create a Feed from the parsed document at url."""
+        f = d['feed']
+        folder = os.path.join(
+            common.path.download(),
+            f['title']
+        )
+
+        self.log.debug("Episodes for %s will be saved in %s",
+                       f['title'],
+                       folder)
+
+        return Feed(
+            fid=0,
+            feed_url=url,
+            homepage=f.get('link', ''),
+            title=f['title'],
+            description=f.get('description', ''),
+            cover_url=f.get('image', {}).get('href', ''),
+            last_refresh=datetime.fromtimestamp(0),
+            autorefresh=True,
+            folder=folder,
+        )
+
+    def store_feed(self, feed: Feed, d) -> list[Episode]:
+        """Add a new Feed to the database, along with the Episodes in its
+        parsed document d. Must be called inside a transaction.
+
+        We already have the whole feed, so there is no point in waiting for
+        the next refresh to fetch it again."""
+        db = self.get_database()
+        db.feed_add(feed)
+        assert feed.fid != 0
+        episodes: Final[list[Episode]] = self.ingest(feed, d)
+        self.set_validators(feed, d)
+        self.set_hub(feed, d)
+        db.feed_set_timestamp(feed, datetime.now())
+        self.log.debug("Added %d episodes of %s", len(episodes), feed.title)
+        return episodes
+
+    def import_feeds(self,
+                     urls: Iterable[str],
+                     batch_size: int = import_batch) -> tuple[list[Feed], dict[str, str]]:
+        """Subscribe to many feeds at once, e.g. from an OPML file.
+
+        The feeds are fetched and parsed concurrently, within the same
+        per-host limits as a refresh, and are added to the database in
+        batches of batch_size per transaction. A feed that cannot be added
+        does not stop the others.
+
+        Returns the Feeds that were added, and a dict mapping the URLs that
+        could not be added to the reason why."""
+        db = self.get_database()
+        known: Final[set[str]] = {f.feed_url for f in db.feed_iter()}
+        added: Final[list[Feed]] = []
+        failed: Final[dict[str, str]] = {}
+        parsed: list[tuple[str, Any]] = []
 
-        self.log.debug("Starting worker threads.")
-        for _i in range(self.worker_cnt):
-            t = Thread(target=self._fetch_worker, daemon=True)
-            t.start()
-            self.workers.append(t)
+        def work(url: str):
+            with self.fetch_queue.slot(url):
+                return fetch_feed(url)
 
+        def flush() -> None:
+            with db:
+                for url, d in parsed:
+                    try:
+                        with db.savepoint():
+                            feed = self.make_feed(url, d)
+                            self.store_feed(feed, d)
+                    except Exception as e:  # pylint: disable-msg=W0718
+                        self.log.error("Cannot add feed %s: %s", url, e)
+                        failed[url] = str(e)
+                    else:
+                        added.append(feed)
+            parsed.clear()
+
+        with ThreadPoolExecutor(self.worker_cnt, thread_name_prefix="import") as pool:
+            futures: Final[dict[Future, str]] = {}
+            for url in urls:
+                if url in known:
+                    continue
+                known.add(url)
+                futures[pool.submit(work, url)] = url
+
+            for fut in as_completed(futures):
+                url = futures[fut]
+                try:
+                    parsed.append((url, fut.result()))
+                except Exception as e:  # pylint: disable-msg=W0718
+                    self.log.error("Cannot fetch feed %s: %s", url, e)
+                    failed[url] = str(e) or type(e).__name__
+                if len(parsed) >= batch_size:
+                    flush()
+            flush()
+
+        self.log.info("Imported %d feeds, %d failed", len(added), len(failed))
+        return added, failed
+
+    def backfill(self, feed: Feed) -> int:
+        """Fetch the older pages of a paged or archived Feed (RFC 5005), and
+        add the Episodes listed on them. Returns the number of new Episodes.
+
+        Pages we have fetched before are not fetched again, since anything
+        that shows up on an older page later must have been on the head
+        page before, and regular refreshes take care of that."""
         db = self.get_database()
-        feeds = db.feed_get_autorefresh()
-        self.log.debug("Ready to fetch %d feeds", len(feeds))
-        for f in feeds:
-            self.fetch_queue.put(f)
+        done: Final[dict[str, str]] = db.page_get_by_feed(feed)
+        with self.fetch_queue.slot(feed.feed_url):
+            head = fetch_feed(feed.feed_url)
+        seen: Final[set[str]] = {feed.feed_url}
+        pages: Final[list[tuple[str, Any]]] = []
+        numbered: Final[list[str]] = paging.numbered_pages(head)
+
+        def work(url: str):
+            with self.fetch_queue.slot(url):
+                return fetch_feed(url)
+
+        def resume(url: Optional[str]) -> Optional[str]:
+            # Skip the part of a chain of pages we have fetched before.
+            while url is not None and url in done and url not in seen:
+                seen.add(url)
+                url = done[url] or None
+            return url
+
+        with ThreadPoolExecutor(backfill_workers, thread_name_prefix="backfill") as pool:
+            futures: Final[dict[Future, str]] = {}
+
+            def submit(url: Optional[str]) -> None:
+                if url is not None and url not in seen and url not in done:
+                    seen.add(url)
+                    futures[pool.submit(work, url)] = url
+
+            if len(numbered) > 0:
+                # We know all the pages in advance, so we fetch them at once.
+                for url in numbered:
+                    submit(url)
+            else:
+                submit(resume(paging.older(head)))
+
+            while len(futures) > 0:
+                finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    url = futures.pop(fut)
+                    try:
+                        d = fut.result()
+                    except Exception as e:  # pylint: disable-msg=W0718
+                        self.log.error("Cannot fetch page %s of %s: %s", url, feed.title, e)
+                        continue
+                    pages.append((url, d))
+                    if len(numbered) == 0:
+                        submit(resume(paging.older(d)))
+
+        if len(pages) == 0:
+            return 0
+
+        new: int = 0
+        with db:
+            for url, d in pages:
+                new += len(self.ingest(feed, d))
+                db.page_add(feed, url, paging.older(d) or "")
+        self.log.info("Fetched %d pages of %s, found %d new episodes",
+                      len(pages),
+                      feed.title,
+                      new)
+        return new
+
+    def refresh(self, force: bool = False) -> int:
+        """Refresh all the podcast feeds that need a refresh, or all feeds
+        with autorefresh set if force is True.
+
+        If the worker threads have not been started, they are started for
+        the duration of the refresh.
+        Returns the number of feeds that were refreshed."""
+        with self.lock:
+            if self.refreshing:
+                self.log.error("Refresh is currently active.")
+                return 0
+            self.refreshing = True
 
-        while not self.fetch_queue.empty():
-            time.sleep(1)
+        try:
+            self.log.info("Refreshing podcast feeds")
+            temporary: Final[bool] = not self.is_active()
+            if temporary:
+                self.start()
 
-        self.log.debug("Shutting down worker threads")
-        self.stop()
-        for w in self.workers:
-            w.join()
-        self.workers.clear()
-        self.log.debug("Refresh is done.")
+            db = self.get_database()
+            now: Final[datetime] = datetime.now()
+            with self.lock:
+                fresh: Final[dict[int, datetime]] = {} if force else self.fresh_until.copy()
+            pushed: Final[set[int]] = db.websub_get_active(now)
+            feeds = [f for f in db.feed_get_autorefresh()
+                     if is_due(f, now, force,
+                               push_interval if f.fid in pushed
+                               else self.settings.refresh_interval)
+                     and fresh.get(f.fid, now) <= now]
+            self.log.debug("Ready to fetch %d feeds", len(feeds))
+            futures: Final[list[Future]] = \
+                [fut for f in feeds if (fut := self.enqueue(f)) is not None]
+
+            wait(futures)
+
+            if temporary:
+                self.stop()
+            self.log.debug("Refresh is done.")
+            return len(futures)
+        finally:
+            with self.lock:
+                self.refreshing = False
+
+    def refresh_feed(self, feed: Feed) -> Future:
+        """Refresh a single Feed ahead of everything else that is queued,
+        whether it is due or not, and return a Future that resolves to the
+        list of its new Episodes.
+
+        The worker threads are started if they are not running, yet. They
+        keep running until stop is called."""
+        self.start()
+        fut: Final[Optional[Future]] = self.enqueue(feed, True)
+        if fut is None:
+            fut = Future()
+            fut.set_exception(
+                FetchError(f"The server of {feed.title} asked us to come back later"))
+        return fut
+
+    def _fetch_worker(self, num: int) -> None:
+        # Workers numbered beyond worker_cnt retire, see apply.
+        while self.is_active() and num < self.worker_cnt:
+            feed: Optional[Feed] = self.fetch_queue.get(2)
+            if feed is None:
+                continue
 
-    def _fetch_worker(self) -> None:
-        while self.is_active():
             try:
-                feed: Feed = self.fetch_queue.get(True, 2)
-                d = feedparser.parse(feed.feed_url)
-                self.process_feed(feed, d)
-            except Empty:
-                continue
+                d = fetch_feed(feed.feed_url, feed.etag, feed.last_modified)
+                episodes = self.process_feed(feed, d)
+                max_age = parse_max_age(d.get("headers", {}).get("cache-control")) \
+                    if d is not None else 0
+                if max_age > 0:
+                    with self.lock:
+                        self.fresh_until[feed.fid] = datetime.now() + timedelta(seconds=max_age)
+            except RateLimited as e:
+                self.log.info("Server of feed %s asks us to slow down: %s",
+                              feed.title,
+                              e)
+                if not self.fetch_queue.hold(feed, e.delay, e):
+                    self.feed_failed(feed, e, timedelta(seconds=e.delay))
+            except Exception as e:  # pylint: disable-msg=W0718
+                self.log.error("Error refreshing feed %s: %s",
+                               feed.title,
+                               e)
+                self.feed_failed(feed, e)
+                self.fetch_queue.done(feed, err=e)
+            else:
+                self.fetch_queue.done(feed, episodes)
+
+    def feed_failed(self,
+                    feed: Feed,
+                    err: Exception,
+                    delay: timedelta = timedelta(0)) -> None:
+        """Record a failed refresh and schedule the next attempt, no
+        earlier than delay from now."""
+        failures: Final[int] = feed.failures + 1
+        retry: Final[datetime] = datetime.now() + max(delay, backoff(failures))
+        if failures == FAILURE_LIMIT:
+            self.log.warning("Feed %s failed %d times in a row, parking it until %s",
+                             feed.title,
+                             failures,
+                             retry.strftime(common.TIME_FMT))
+        try:
+            db = self.get_database()
+            with db:
+                db.feed_set_failure(feed, failures, retry, str(err) or type(err).__name__)
+        except Exception as e:  # pylint: disable-msg=W0718
+            self.log.error("Cannot record failure of feed %s: %s", feed.title, e)
+
+    def episode_download(self, ep: Episode) -> None:
+        """Download an Episode's enclosure to its path.
 
-    def process_feed(self, feed: Feed, d) -> list[Episode]:
-        """Process the Feed data once it is fetched and parsed."""
+        The data is written to a temporary file first that is only renamed
+        to the final path once the download is complete."""
+        self.log.info("Download episode %s from %s", ep.title, ep.url)
+        folder: Final[str] = os.path.dirname(ep.path)
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+
+        tmp: Final[str] = ep.path + ".part"
+        try:
+            with self.download_slots, \
+                 urllib.request.urlopen(ep.url, timeout=download_timeout) as res, \
+                 open(tmp, "wb") as fh:
+                shutil.copyfileobj(res, fh, 1 << 20)
+            os.replace(tmp, ep.path)
+            db = self.get_database()
+            with db:
+                db.episode_set_size(ep, file_size(ep.path))
+        except Exception as e:
+            self.log.error("Error downloading episode %s from %s: %s",
+                           ep.title,
+                           ep.url,
+                           e)
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def process_feed(self, feed: Feed, d, pushed: bool = False) -> list[Episode]:
+        """Process the Feed data once it is fetched and parsed.
+        d is None if the feed has not changed since the last refresh.
+        pushed is True if a WebSub hub sent us d, rather than us fetching
+        it, in which case d does not carry validators."""
         now = datetime.now()
         db = self.get_database()
-        episodes_old: list[Episode] = db.episode_get_by_feed(feed)
-        urls: set[str] = {x.url for x in episodes_old}
+        with db:
+            episodes_new: list[Episode] = []
+            if d is not None:
+                episodes_new = self.ingest(feed, d)
+                if not pushed:
+                    self.set_validators(feed, d)
+                self.set_hub(feed, d)
+            db.feed_set_timestamp(feed, now)
+        return episodes_new
+
+    def ingest(self, feed: Feed, d) -> list[Episode]:
+        """Add the Episodes of a parsed feed that we do not know about yet.
+
+        We only look up the enclosure URLs the document lists, so the cost
+        does not grow with the number of Episodes a Feed has accumulated.
+
+        The caller is responsible for running this in a transaction, so all
+        Episodes of a feed are added in one go."""
+        db = self.get_database()
+        urls: Final[set[str]] = db.episode_known_urls(
+            feed,
+            (lnk['href'] for entry in d['entries'] for lnk in entry['links']
+             if lnk['rel'] == 'enclosure'))
         episodes_new: list[Episode] = []
 
         for entry in d['entries']:
@@ -199,18 +749,34 @@ class Client:  # pylint: disable-msg=R0903
                             path=path,
                             keep=False,
                             description=entry['summary'],
+                            duration=parse_itunes_duration(entry.get('itunes_duration', '')),
                         )
-                        with db:
-                            if db.episode_add(ep):
-                                episodes_new.append(ep)
-                            else:
-                                self.log.error("Failed to add episode %s", ep.title)
+                        urls.add(ep.url)
+                        if db.episode_add(ep):
+                            episodes_new.append(ep)
+                        else:
+                            self.log.error("Failed to add episode %s", ep.title)
                     break
 
-        with db:
-            db.feed_set_timestamp(feed, now)
         return episodes_new
 
+    def set_validators(self, feed: Feed, d) -> None:
+        """Remember the validators of the response a parsed feed came in."""
+        headers = d.get('headers', {})
+        self.get_database().feed_set_validators(feed,
+                                                headers.get('etag', ''),
+                                                headers.get('last-modified', ''))
+
+    def set_hub(self, feed: Feed, d) -> None:
+        """Remember the WebSub hub a parsed feed advertises, if any. The
+        topic to subscribe to is the feed's self link, which may differ
+        from the URL we fetch it from."""
+        lnk: Final[dict[str, str]] = paging.links(d)
+        if "hub" in lnk:
+            self.get_database().websub_discover(feed,
+                                                lnk["hub"],
+                                                lnk.get("self", feed.feed_url))
+
 
 # Local Variables: #
 # python-indent: 4 #
@@ -60,10 +60,18 @@ class Path:
         """Return the path of the configuration file"""
         return os.path.join(self.__base, "settings.toml")
 
+    def socket(self) -> str:
+        """Return the path of the daemon's control socket"""
+        return os.path.join(self.__base, f"{APP_NAME.lower()}.sock")
+
     def download(self) -> str:
         """Return the path of the download folder"""
         return os.path.join(self.__base, "downloads")
 
+    def backup(self) -> str:
+        """Return the path of the folder for database backups"""
+        return os.path.join(self.__base, "backup")
+
 
 path: Path = Path(os.path.expanduser(f"~/.{APP_NAME.lower()}.d"))
 
@@ -95,10 +103,19 @@ def get_logger(name: str, terminal: bool = True) -> logging.Logger:
         if name in _cache:
             return _cache[name]
 
+        # config needs this module, so it is imported when it is needed.
+        from cephalopod import config  # pylint: disable-msg=C0415
+        try:
+            settings = config.get()
+        except config.ConfigError:
+            # Whoever loads the configuration first gets to report the
+            # error, loggers fall back to the defaults.
+            settings = config.Settings()
+
         log_format = "%(asctime)s (%(name)-16s / line %(lineno)-4d) " + \
             "- %(levelname)-8s %(message)s"
-        max_log_size = 256 * 2**20
-        max_log_count = 4
+        max_log_size = settings.log_size
+        max_log_count = settings.log_count
 
         log_obj = logging.getLogger(name)
         log_obj.setLevel(logging.DEBUG)
@@ -121,6 +138,47 @@ def get_logger(name: str, terminal: bool = True) -> logging.Logger:
         return log_obj
 
 
+def fmt_pos(p: int) -> str:
+    """Format the argument p as a playback position, i.e. minutes and seconds."""
+    hours: int = 0
+    minutes: int = 0
+    seconds: int = p
+
+    if seconds >= 3600:
+        hours, seconds = divmod(seconds, 3600)
+
+    if seconds >= 60:
+        minutes, seconds = divmod(seconds, 60)
+
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+
+_size_units: Final[str] = "KMGT"
+
+
+def fmt_bytes(n: int) -> str:
+    """Format a number of bytes in a human-readable way."""
+    size: float = n
+    unit: str = ""
+    for u in _size_units:
+        if size < 1024:
+            break
+        size /= 1024
+        unit = u
+    return f"{size:.1f} {unit}iB" if unit else f"{n} B"
+
+
+def parse_size(s: str) -> int:
+    """Parse a number of bytes with an optional suffix K, M, G or T, as in
+    "500M" or "20G". Raises ValueError if s is not such a number."""
+    s = s.strip().upper().removesuffix("IB").removesuffix("B")
+    factor: int = 1
+    if s != "" and s[-1] in _size_units:
+        factor = 1024 ** (_size_units.index(s[-1]) + 1)
+        s = s[:-1]
+    return int(float(s) * factor)
+
+
 # Local Variables: #
 # python-indent: 4 #
 # End: #
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-19 19:40:18 krylon>
+#
+# /data/code/python/cephalopod/compression.py
+# created on 19. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/gpl-3.0
+
+"""
+cephalopod.compression
+
+(c) 2026 Benjamin Walkenhorst
+
+Compress the texts we store, episode descriptions mostly. Those are
+short HTML documents, too short for zlib to find much redundancy in any
+single one of them, but the descriptions of a podcast tend to share a lot
+of boilerplate - links to the hosts' pages, sponsors, calls for support.
+
+A preset dictionary built from a sample of descriptions lets zlib refer
+to that boilerplate from the first byte on. zlib only looks back 32 KiB,
+so the dictionary is no larger than that, and the most common strings
+go at its end, where they are cheapest to refer to.
+"""
+
+import re
+import zlib
+from collections import Counter
+from typing import Final, Iterable
+
+# zlib cannot refer back further than this, so a larger dictionary would
+# be wasted.
+DICT_SIZE: Final[int] = 32 * 1024
+# Strings shorter than this are not worth putting in the dictionary.
+MIN_CHUNK: Final[int] = 16
+LEVEL: Final[int] = 9
+
+# Descriptions are split into chunks after sentences, lines and tags.
+_chunk_pat: Final[re.Pattern] = re.compile(r"(?<=[.!?>\n])")
+
+
+def compress(text: str, zdict: bytes = b"") -> bytes:
+    """Compress a text, using a preset dictionary if one is given."""
+    c = zlib.compressobj(LEVEL, zdict=zdict) if zdict else zlib.compressobj(LEVEL)
+    return c.compress(text.encode("utf-8")) + c.flush()
+
+
+def decompress(data: bytes, zdict: bytes = b"") -> str:
+    """Decompress a text compressed with the same dictionary."""
+    d = zlib.decompressobj(zdict=zdict) if zdict else zlib.decompressobj()
+    return (d.decompress(data) + d.flush()).decode("utf-8")
+
+
+def train(samples: Iterable[str], size: int = DICT_SIZE) -> bytes:
+    """Build a preset dictionary from the chunks of text that occur in more
+    than one of the samples. Returns an empty dictionary if the samples
+    have nothing in common."""
+    counts: Final[Counter[str]] = Counter()
+    for s in samples:
+        counts.update({c.strip() for c in _chunk_pat.split(s) if len(c.strip()) >= MIN_CHUNK})
+
+    chunks: list[bytes] = []
+    total: int = 0
+    for chunk, n in counts.most_common():
+        if n < 2:
+            break
+        b = chunk.encode("utf-8")
+        if total + len(b) > size:
+            continue
+        chunks.append(b)
+        total += len(b)
+    # The most common chunks go last, closest to the data.
+    chunks.reverse()
+    return b"".join(chunks)
+
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
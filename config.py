@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-19 20:58:33 krylon>
+#
+# /data/code/python/cephalopod/config.py
+# created on 19. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/gpl-3.0
+
+"""
+cephalopod.config
+
+(c) 2026 Benjamin Walkenhorst
+
+Load the settings from settings.toml in the base directory. The file is
+optional, and so is every setting in it. A profile supplies the values
+for everything that is not set explicitly:
+
+    profile = "server"          # laptop (the default), server, low-memory
+
+    [fetch]
+    workers = 16                # threads fetching feeds
+    refresh_interval = 30       # minutes
+    downloads = 4               # concurrent episode downloads
+
+    [database]
+    cache_size = "64M"          # SQLite page cache, per connection
+    mmap_size = "1G"
+    synchronous = "normal"      # off, normal, full, extra
+    busy_timeout = 10.0         # seconds
+
+    [cache]
+    titles = 8192               # episode titles the GUI keeps in memory
+
+    [log]
+    max_size = "256M"
+    keep = 8
+
+    [downloads]
+    quota = "50G"               # 0 means no limit
+
+    [backup]
+    interval = 24               # hours between backups, 0 means never
+    keep = 7                    # how many backups to keep
+    compress = false
+
+Sizes are given in bytes, or as strings with a suffix K, M, G or T.
+Unknown sections or keys are an error, so a typo does not go unnoticed.
+"""
+
+import os
+import tomllib
+from dataclasses import dataclass, fields, replace
+from datetime import timedelta
+from threading import Lock
+from typing import Any, Callable, Final, Optional
+
+from cephalopod import common
+
+
+class ConfigError(Exception):
+    """ConfigError is raised when the configuration file is invalid."""
+
+
+_cpus: Final[int] = os.cpu_count() or 1
+
+
+@dataclass(slots=True, kw_only=True, frozen=True)
+class Settings:  # pylint: disable-msg=R0902
+    """The settings of the application. Fields that are sizes are in
+    bytes."""
+
+    profile: str = "laptop"
+    # Fetching feeds is mostly waiting for the network, so we can afford
+    # more workers than we have CPUs.
+    workers: int = min(32, _cpus + 4)
+    refresh_interval: timedelta = timedelta(minutes=60)
+    downloads: int = 2
+    cache_size: int = 16 << 20
+    mmap_size: int = 64 << 20
+    synchronous: str = "NORMAL"
+    busy_timeout: float = 5.0
+    title_cache: int = 2048
+    log_size: int = 256 << 20
+    log_count: int = 4
+    quota: int = 0
+    backup_interval: timedelta = timedelta(hours=24)
+    backup_keep: int = 7
+    backup_compress: bool = False
+
+
+# The profiles only list what differs from the defaults in Settings,
+# which are what the laptop profile uses.
+PROFILES: Final[dict[str, dict[str, Any]]] = {
+    "laptop": {},
+    "server": {
+        "workers": min(64, _cpus * 4),
+        "refresh_interval": timedelta(minutes=30),
+        "downloads": 4,
+        "cache_size": 64 << 20,
+        "mmap_size": 1 << 30,
+        "busy_timeout": 10.0,
+        "title_cache": 8192,
+        "log_count": 8,
+    },
+    "low-memory": {
+        "workers": 4,
+        "refresh_interval": timedelta(minutes=120),
+        "downloads": 1,
+        "cache_size": 2 << 20,
+        "mmap_size": 0,
+        "title_cache": 512,
+        "log_size": 4 << 20,
+        "log_count": 2,
+    },
+}
+
+
+def _count(v: Any) -> int:
+    if isinstance(v, bool) or not isinstance(v, int) or v < 1:
+        raise ValueError(f"expected a positive integer, not {v!r}")
+    return v
+
+
+def _size(v: Any) -> int:
+    if isinstance(v, str):
+        v = common.parse_size(v)
+    if isinstance(v, bool) or not isinstance(v, int) or v < 0:
+        raise ValueError(f"expected a size, not {v!r}")
+    return v
+
+
+def _minutes(v: Any) -> timedelta:
+    if isinstance(v, bool) or not isinstance(v, (int, float)) or v <= 0:
+        raise ValueError(f"expected a number of minutes, not {v!r}")
+    return timedelta(minutes=v)
+
+
+def _hours(v: Any) -> timedelta:
+    if isinstance(v, bool) or not isinstance(v, (int, float)) or v < 0:
+        raise ValueError(f"expected a number of hours, not {v!r}")
+    return timedelta(hours=v)
+
+
+def _seconds(v: Any) -> float:
+    if isinstance(v, bool) or not isinstance(v, (int, float)) or v < 0:
+        raise ValueError(f"expected a number of seconds, not {v!r}")
+    return float(v)
+
+
+def _flag(v: Any) -> bool:
+    if not isinstance(v, bool):
+        raise ValueError(f"expected true or false, not {v!r}")
+    return v
+
+
+def _synchronous(v: Any) -> str:
+    if not isinstance(v, str) or v.upper() not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+        raise ValueError(f"expected one of off, normal, full, extra, not {v!r}")
+    return v.upper()
+
+
+# The keys of the configuration file, by section, with the fields of
+# Settings they set and the functions that check and convert them.
+_KEYS: Final[dict[str, dict[str, tuple[str, Callable[[Any], Any]]]]] = {
+    "fetch": {
+        "workers": ("workers", _count),
+        "refresh_interval": ("refresh_interval", _minutes),
+        "downloads": ("downloads", _count),
+    },
+    "database": {
+        "cache_size": ("cache_size", _size),
+        "mmap_size": ("mmap_size", _size),
+        "synchronous": ("synchronous", _synchronous),
+        "busy_timeout": ("busy_timeout", _seconds),
+    },
+    "cache": {
+        "titles": ("title_cache", _count),
+    },
+    "log": {
+        "max_size": ("log_size", _size),
+        "keep": ("log_count", _count),
+    },
+    "downloads": {
+        "quota": ("quota", _size),
+    },
+    "backup": {
+        "interval": ("backup_interval", _hours),
+        "keep": ("backup_keep", _count),
+        "compress": ("backup_compress", _flag),
+    },
+}
+
+
+def parse(doc: dict[str, Any]) -> Settings:
+    """Turn the contents of a configuration file into Settings."""
+    profile: Final[Any] = doc.get("profile", "laptop")
+    if not isinstance(profile, str) or profile not in PROFILES:
+        raise ConfigError(f"Unknown profile {profile!r}, "
+                          f"expected one of {', '.join(PROFILES)}")
+    values: Final[dict[str, Any]] = dict(PROFILES[profile], profile=profile)
+
+    for section, table in doc.items():
+        if section == "profile":
+            continue
+        keys = _KEYS.get(section)
+        if keys is None or not isinstance(table, dict):
+            raise ConfigError(f"Unknown section [{section}]")
+        for key, value in table.items():
+            if key not in keys:
+                raise ConfigError(f"Unknown setting {section}.{key}")
+            field, check = keys[key]
+            try:
+                values[field] = check(value)
+            except ValueError as err:
+                raise ConfigError(f"Invalid value for {section}.{key}: {err}") from err
+
+    return replace(Settings(), **values)
+
+
+def load(path: str = "") -> Settings:
+    """Load the Settings from a configuration file. If the file does not
+    exist, the defaults of the laptop profile are used."""
+    if path == "":
+        path = common.path.config()
+    try:
+        with open(path, "rb") as fh:
+            doc = tomllib.load(fh)
+    except FileNotFoundError:
+        doc = {}
+    except (tomllib.TOMLDecodeError, UnicodeDecodeError) as err:
+        raise ConfigError(f"Cannot parse {path}: {err}") from err
+    except OSError as err:
+        raise ConfigError(f"Cannot read {path}: {err}") from err
+    return parse(doc)
+
+
+_lock: Final[Lock] = Lock()
+_current: Optional[Settings] = None
+_path: str = ""
+_stamp: float = 0.0
+# Goes up each time the Settings are replaced, so holders of a database
+# connection can tell that they have to tune it again.
+_generation: int = 0
+
+
+def _mtime(path: str) -> float:
+    try:
+        return os.stat(path).st_mtime
+    except FileNotFoundError:
+        return 0.0
+
+
+def get() -> Settings:
+    """Return the Settings of the application. The configuration file is
+    loaded on the first call, subsequent calls return the same Settings
+    until reload picks up a change, or the base directory changes."""
+    global _current, _path, _stamp, _generation  # pylint: disable-msg=W0603
+    with _lock:
+        path: Final[str] = common.path.config()
+        if _current is None or path != _path:
+            _stamp = _mtime(path)
+            _current = load(path)
+            _path = path
+            _generation += 1
+        return _current
+
+
+def generation() -> int:
+    """Return the generation of the current Settings. It changes whenever
+    get or reload replace them."""
+    with _lock:
+        return _generation
+
+
+def reload() -> Optional[Settings]:
+    """Load the configuration file again if it has changed since it was
+    last loaded. Returns the new Settings, or None if nothing changed.
+    If the file is invalid, ConfigError is raised and the old Settings
+    stay in effect."""
+    global _current, _path, _stamp, _generation  # pylint: disable-msg=W0603
+    with _lock:
+        path: Final[str] = common.path.config()
+        stamp: Final[float] = _mtime(path)
+        if _current is not None and path == _path and stamp == _stamp:
+            return None
+        settings: Final[Settings] = load(path)
+        _path = path
+        _stamp = stamp
+        if settings == _current:
+            return None
+        _current = settings
+        _generation += 1
+        return settings
+
+
+def describe(settings: Settings) -> list[tuple[str, str]]:
+    """Return the Settings as a list of names and printable values."""
+    result: list[tuple[str, str]] = []
+    for f in fields(settings):
+        v = getattr(settings, f.name)
+        if f.name in ("cache_size", "mmap_size", "log_size", "quota"):
+            v = common.fmt_bytes(v)
+        result.append((f.name, str(v)))
+    return result
+
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,520 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-19 14:31:26 krylon>
+#
+# /data/code/python/cephalopod/daemon.py
+# created on 19. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/gpl-3.0
+
+"""
+cephalopod.daemon
+
+(c) 2026 Benjamin Walkenhorst
+
+A long-running process that keeps a Client and its workers around,
+refreshes feeds on schedule and accepts commands from the GUI and the
+command line client over a Unix domain socket. If it is given an address
+to listen on, it also subscribes to the WebSub hubs of our feeds and
+receives the updates they push.
+
+The protocol is line-based: each request is a JSON object with a "cmd"
+key and the command's arguments, each response is a JSON object with
+an "ok" key and either a "result" or an "error".
+"""
+
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from threading import Event, Thread, current_thread, main_thread
+from typing import Any, Callable, Final, Optional
+
+from cephalopod import common, config, opml
+from cephalopod.backup import Backup
+from cephalopod.cast import Feed
+from cephalopod.client import Client
+from cephalopod.database import Database
+from cephalopod.history import SessionLog
+from cephalopod.maintenance import Maintenance, Report
+from cephalopod.playqueue import PlayQueue
+from cephalopod.probe import Prober
+from cephalopod.retention import Retention
+from cephalopod.stats import ListeningStats, Period
+from cephalopod.websub import Subscriber
+
+# How often the scheduler checks for feeds that are due for a refresh.
+SCHEDULER_TICK: Final[float] = 60.0
+# How many requests the daemon handles concurrently.
+HANDLER_CNT: Final[int] = 4
+# The daemon counts as idle when it has not received a request for this
+# long and is neither refreshing nor fetching anything.
+IDLE_TIME: Final[timedelta] = timedelta(minutes=5)
+# How often we maintain the database, if the daemon is idle.
+MAINTENANCE_INTERVAL: Final[timedelta] = timedelta(hours=6)
+
+
+class DaemonError(Exception):
+    """DaemonError is raised when the daemon reports a failed command."""
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """Handle the requests sent over a single connection."""
+
+    def handle(self) -> None:
+        owner: Final[Daemon] = self.server.owner  # type: ignore
+        for line in self.rfile:
+            res: dict[str, Any]
+            try:
+                req = json.loads(line)
+                res = {"ok": True, "result": owner.dispatch(req)}
+            except Exception as e:  # pylint: disable-msg=W0718
+                owner.log.error("Error handling request %s: %s", line, e)
+                res = {"ok": False, "error": str(e)}
+            self.wfile.write(json.dumps(res).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+class _Server(socketserver.UnixStreamServer):
+    """A UnixStreamServer that handles requests in a fixed pool of threads,
+    so each handler thread can keep its database connection open."""
+
+    def __init__(self, path: str, owner: "Daemon") -> None:
+        self.owner: Final[Daemon] = owner
+        self.executor: Final[ThreadPoolExecutor] = \
+            ThreadPoolExecutor(HANDLER_CNT, thread_name_prefix="handler")
+        super().__init__(path, _Handler)
+
+    def process_request(self, request, client_address) -> None:
+        self.executor.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address) -> None:
+        try:
+            self.finish_request(request, client_address)
+        except Exception:  # pylint: disable-msg=W0718
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.executor.shutdown(wait=False)
+
+
+class Daemon:
+    """Daemon runs the refresh scheduler and serves the control socket."""
+
+    __slots__ = [
+        "log",
+        "client",
+        "path",
+        "server",
+        "stop_evt",
+        "commands",
+        "last_refresh",
+        "last_request",
+        "last_maintenance",
+        "push_address",
+        "push_url",
+        "subscriber",
+        "quota",
+        "history",
+    ]
+
+    log: logging.Logger
+    client: Client
+    path: str
+    server: Optional[_Server]
+    stop_evt: Event
+    commands: dict[str, Callable[..., Any]]
+    last_refresh: Optional[datetime]
+    last_request: datetime
+    last_maintenance: Optional[datetime]
+    push_address: Optional[tuple[str, int]]
+    push_url: str
+    subscriber: Optional[Subscriber]
+    quota: Optional[int]
+    history: SessionLog
+
+    def __init__(self,  # pylint: disable-msg=R0913
+                 client: Optional[Client] = None,
+                 path: str = "",
+                 push_address: Optional[tuple[str, int]] = None,
+                 push_url: str = "",
+                 quota: Optional[int] = None) -> None:
+        """Create a Daemon. If push_address is given, the daemon accepts
+        WebSub callbacks there, push_url is the URL the hubs reach it
+        at. quota is the space all downloads together may take up, 0 means
+        no limit, None means the quota from the settings."""
+        self.log = common.get_logger("Daemon")
+        self.client = client if client is not None else Client()
+        self.path = path if path != "" else common.path.socket()
+        self.server = None
+        self.stop_evt = Event()
+        self.last_refresh = None
+        self.last_request = datetime.now()
+        self.last_maintenance = None
+        self.push_address = push_address
+        self.push_url = push_url
+        self.subscriber = None
+        self.quota = quota
+        self.history = SessionLog()
+        self.commands = {
+            "refresh": self.cmd_refresh,
+            "refresh_feed": self.cmd_refresh_feed,
+            "add": self.cmd_add,
+            "import": self.cmd_import,
+            "backfill": self.cmd_backfill,
+            "download": self.cmd_download,
+            "delete": self.cmd_delete,
+            "listen": self.cmd_listen,
+            "history": self.cmd_history,
+            "queue": self.cmd_queue,
+            "queue_add": self.cmd_queue_add,
+            "queue_move": self.cmd_queue_move,
+            "queue_remove": self.cmd_queue_remove,
+            "status": self.cmd_status,
+            "maintain": self.cmd_maintain,
+        }
+
+    def dispatch(self, req: dict[str, Any]) -> Any:
+        """Execute a request and return its result."""
+        cmd: Final[str] = req.pop("cmd", "")
+        try:
+            handler = self.commands[cmd]
+        except KeyError as err:
+            raise DaemonError(f"Unknown command {cmd!r}") from err
+        self.log.debug("Handle command %s %s", cmd, req)
+        self.last_request = datetime.now()
+        return handler(**req)
+
+    def cmd_refresh(self, force: bool = True) -> dict[str, Any]:
+        """Refresh all feeds right now."""
+        cnt: Final[int] = self.client.refresh(force)
+        self.last_refresh = datetime.now()
+        return {"refreshed": cnt}
+
+    def cmd_refresh_feed(self, id: int) -> dict[str, Any]:  # pylint: disable-msg=W0622
+        """Refresh a single feed ahead of the regular refresh, and report
+        its new state once it is done."""
+        db: Final[Database] = self.client.get_database()
+        f = db.feed_get_by_id(id)
+        if f is None:
+            raise DaemonError(f"No feed with ID {id}")
+        try:
+            new: int = len(self.client.refresh_feed(f).result())
+        except Exception as e:  # pylint: disable-msg=W0718
+            self.log.error("Refreshing feed %s failed: %s", f.title, e)
+            new = 0
+        f = db.feed_get_by_id(id)
+        assert f is not None
+        return {
+            "id": f.fid,
+            "new": new,
+            "last_refresh": int(f.last_refresh.timestamp()),
+            "status": f.status(),
+        }
+
+    def cmd_add(self, url: str) -> dict[str, Any]:
+        """Subscribe to a new feed, and fetch its back catalogue in the
+        background."""
+        f = self.client.feed_add(url)
+        Thread(target=self._backfill, args=([f], ), daemon=True).start()
+        return {"id": f.fid, "title": f.title}
+
+    def cmd_backfill(self, ids: Optional[list[int]] = None) -> dict[str, Any]:
+        """Fetch the back catalogue of the given feeds, or all feeds."""
+        db: Final[Database] = self.client.get_database()
+        feeds: list[Feed] = db.feed_get_all()
+        if ids is not None:
+            feeds = [f for f in feeds if f.fid in ids]
+        return {"new": self._backfill(feeds)}
+
+    def _backfill(self, feeds: list[Feed]) -> int:
+        """Fetch the older pages of the given Feeds."""
+        new: int = 0
+        for f in feeds:
+            try:
+                new += self.client.backfill(f)
+            except Exception as e:  # pylint: disable-msg=W0718
+                self.log.error("Cannot fetch the back catalogue of %s: %s", f.title, e)
+        return new
+
+    def cmd_import(self, path: str) -> dict[str, Any]:
+        """Subscribe to all feeds listed in a file."""
+        feeds, failed = self.client.import_feeds(opml.urls(path))
+        return {"added": len(feeds), "failed": failed}
+
+    def cmd_download(self, id: int) -> dict[str, Any]:  # pylint: disable-msg=W0622
+        """Download an episode."""
+        ep = self.client.get_database().episode_get_by_id(id)
+        if ep is None:
+            raise DaemonError(f"No episode with ID {id}")
+        self.client.episode_download(ep)
+        self.prune()
+        return {"path": ep.path}
+
+    def cmd_delete(self, id: int) -> dict[str, int]:  # pylint: disable-msg=W0622
+        """Unsubscribe from a feed and delete its episodes and downloads."""
+        f = self.client.get_database().feed_get_by_id(id)
+        if f is None:
+            raise DaemonError(f"No feed with ID {id}")
+        return self.client.feed_delete(f)
+
+    def cmd_listen(self,  # pylint: disable-msg=R0913
+                   id: int,  # pylint: disable-msg=W0622
+                   start: int,
+                   stop: int,
+                   pos_from: int,
+                   pos_to: int) -> dict[str, Any]:
+        """Record that an episode was played from pos_from to pos_to, in
+        seconds, between the timestamps start and stop, and remember
+        pos_to as its position."""
+        db: Final[Database] = self.client.get_database()
+        ep = db.episode_get_by_id(id)
+        if ep is None:
+            raise DaemonError(f"No episode with ID {id}")
+        with db:
+            db.episode_set_pos(ep, pos_to)
+        self.history.record(ep,
+                            datetime.fromtimestamp(start),
+                            datetime.fromtimestamp(stop),
+                            pos_from,
+                            pos_to)
+        if self.history.is_due():
+            self.flush_history()
+        return {"pending": len(self.history)}
+
+    def cmd_history(self, period: str, since: int, until: int) -> list[list[int]]:
+        """Return the listening statistics by period and feed, as lists of
+        [start, feed ID, sessions, seconds, wall clock seconds]."""
+        self.flush_history()
+        totals = ListeningStats(self.client.get_database()).get(
+            Period(period),
+            datetime.fromtimestamp(since),
+            datetime.fromtimestamp(until))
+        return [[int(start.timestamp()), fid, t.sessions, t.seconds, t.wall]
+                for start, feeds in totals.items()
+                for fid, t in feeds.items()]
+
+    def cmd_queue(self, cnt: int = 10) -> list[int]:
+        """Return the IDs of the next episodes in the queue."""
+        return PlayQueue(self.client.get_database()).next(cnt)
+
+    def cmd_queue_add(self, id: int) -> dict[str, Any]:  # pylint: disable-msg=W0622
+        """Add an episode to the end of the queue."""
+        if self.client.get_database().episode_get_by_id(id) is None:
+            raise DaemonError(f"No episode with ID {id}")
+        return {"rank": PlayQueue(self.client.get_database()).add(id)}
+
+    def cmd_queue_move(self,
+                       id: int,  # pylint: disable-msg=W0622
+                       after: Optional[int] = None) -> dict[str, Any]:
+        """Put an episode behind the episode after in the queue, or at its
+        start."""
+        if self.client.get_database().episode_get_by_id(id) is None:
+            raise DaemonError(f"No episode with ID {id}")
+        return {"rank": PlayQueue(self.client.get_database()).move(id, after)}
+
+    def cmd_queue_remove(self, id: int) -> dict[str, Any]:  # pylint: disable-msg=W0622
+        """Take an episode out of the queue."""
+        return {"removed": PlayQueue(self.client.get_database()).remove(id)}
+
+    def flush_history(self) -> None:
+        """Write the listening sessions we have collected."""
+        try:
+            self.history.flush(self.client.get_database())
+        except Exception as e:  # pylint: disable-msg=W0718
+            self.log.error("Cannot record listening sessions: %s", e)
+
+    def prune(self) -> None:
+        """Delete finished downloads that exceed their quotas."""
+        try:
+            quota = self.quota if self.quota is not None else config.get().quota
+            Retention(self.client.get_database(), quota).run()
+        except Exception as e:  # pylint: disable-msg=W0718
+            self.log.error("Cannot enforce the download quotas: %s", e)
+
+    def cmd_maintain(self) -> list[str]:
+        """Maintain the database right now."""
+        return self.maintain().lines()
+
+    def maintain(self) -> Report:
+        """Optimize, checkpoint and vacuum the database."""
+        self.last_maintenance = datetime.now()
+        return Maintenance(self.client.get_database()).run()
+
+    def backup(self, now: datetime) -> None:
+        """Back up the database if the last backup is older than the
+        settings call for."""
+        settings: Final[config.Settings] = config.get()
+        if settings.backup_interval.total_seconds() <= 0:
+            return
+        b: Final[Backup] = Backup(keep=settings.backup_keep, compress=settings.backup_compress)
+        latest: Final[Optional[datetime]] = b.latest()
+        if latest is None or now - latest >= settings.backup_interval:
+            b.run()
+
+    def is_idle(self, now: datetime) -> bool:
+        """Return True if the daemon has had nothing to do for a while."""
+        return now - self.last_request >= IDLE_TIME and \
+            not self.client.is_refreshing() and \
+            self.client.queued() == 0
+
+    def reload(self) -> None:
+        """Load the settings again if the configuration file has changed,
+        and apply them to the workers. Each thread tunes its database
+        connection the next time it picks it up."""
+        try:
+            settings = config.reload()
+        except config.ConfigError as e:
+            self.log.error("Keep the old settings: %s", e)
+            return
+        if settings is None:
+            return
+        self.log.info("Reloaded the settings, profile %s", settings.profile)
+        self.client.apply(settings)
+
+    def cmd_status(self) -> dict[str, Any]:
+        """Report what the daemon is doing."""
+        db: Final[Database] = self.client.get_database()
+        stats: Final[dict[str, Any]] = db.stats()
+        stats["pid"] = os.getpid()
+        stats["pushed"] = len(db.websub_get_active(datetime.now()))
+        stats["refreshing"] = self.client.is_refreshing()
+        stats["queued"] = self.client.queued()
+        stats["last_refresh"] = self.last_refresh.strftime(common.TIME_FMT) \
+            if self.last_refresh is not None else None
+        stats["maintained"] = self.last_maintenance.strftime(common.TIME_FMT) \
+            if self.last_maintenance is not None else None
+        return stats
+
+    def _scheduler(self) -> None:
+        """Periodically refresh the feeds that are due, find out the
+        duration of new Episodes that did not come with one, keep our
+        WebSub subscriptions alive, and the downloads within their
+        quotas. Changes to the settings are picked up on each tick, and
+        when there is nothing else to do, the database gets maintained,
+        the queue rebalanced and the database backed up."""
+        prober: Final[Prober] = Prober(self.client.get_database(), self.client.fetch_queue)
+        try:
+            while not self.stop_evt.wait(SCHEDULER_TICK):
+                try:
+                    self.reload()
+                    if self.client.refresh() > 0:
+                        self.last_refresh = datetime.now()
+                        self.prune()
+                    prober.run()
+                    if self.history.is_due():
+                        self.flush_history()
+                    if self.subscriber is not None:
+                        self.subscriber.maintain()
+                    now = datetime.now()
+                    if self.is_idle(now):
+                        if self.last_maintenance is None or \
+                                now - self.last_maintenance >= MAINTENANCE_INTERVAL:
+                            self.maintain()
+                        PlayQueue(self.client.get_database()).rebalance()
+                        self.backup(now)
+                except Exception as e:  # pylint: disable-msg=W0718
+                    self.log.error("Scheduled refresh failed: %s", e)
+        finally:
+            prober.close()
+
+    def run(self) -> None:
+        """Start the workers and the scheduler, and serve requests until
+        shutdown is called or we receive SIGTERM or SIGINT. SIGHUP makes
+        the daemon reload its settings."""
+        if os.path.exists(self.path):
+            if is_running(self.path):
+                raise DaemonError(f"Daemon is already running at {self.path}")
+            self.log.info("Remove stale socket %s", self.path)
+            os.unlink(self.path)
+
+        self.client.start()
+        self.server = _Server(self.path, self)
+        if self.push_address is not None:
+            self.subscriber = Subscriber(self.client, self.push_address, self.push_url)
+            self.subscriber.start()
+        sched: Final[Thread] = Thread(target=self._scheduler, daemon=True)
+        sched.start()
+
+        def handle_signal(_sig, _frame) -> None:
+            Thread(target=self.shutdown).start()
+
+        # Signal handlers can only be installed from the main thread.
+        if current_thread() is main_thread():
+            signal.signal(signal.SIGTERM, handle_signal)
+            signal.signal(signal.SIGINT, handle_signal)
+            signal.signal(signal.SIGHUP,
+                          lambda _sig, _frame: Thread(target=self.reload).start())
+
+        self.log.info("Daemon listening on %s", self.path)
+        try:
+            self.server.serve_forever()
+        finally:
+            self.stop_evt.set()
+            self.server.server_close()
+            self.flush_history()
+            if self.subscriber is not None:
+                self.subscriber.stop()
+            self.client.stop()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            self.log.info("Daemon stopped.")
+
+    def shutdown(self) -> None:
+        """Tell the daemon to stop. Must not be called from the thread that
+        called run."""
+        self.stop_evt.set()
+        if self.server is not None:
+            self.server.shutdown()
+
+
+def call(cmd: str, path: str = "", timeout: Optional[float] = None, **kwargs) -> Any:
+    """Send a command to the daemon and return its result.
+
+    Raises OSError if the daemon is not running, and DaemonError if it
+    reports an error."""
+    if path == "":
+        path = common.path.socket()
+    req: Final[dict[str, Any]] = dict(kwargs, cmd=cmd)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        with sock.makefile("rwb") as fh:
+            fh.write(json.dumps(req).encode("utf-8") + b"\n")
+            fh.flush()
+            line = fh.readline()
+
+    if line == b"":
+        raise DaemonError("Daemon closed the connection")
+    res: Final[dict[str, Any]] = json.loads(line)
+    if not res["ok"]:
+        raise DaemonError(res["error"])
+    return res["result"]
+
+
+def is_running(path: str = "") -> bool:
+    """Return True if a daemon is listening on the control socket."""
+    if path == "":
+        path = common.path.socket()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except OSError:
+            return False
+    return True
+
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
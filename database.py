@@ -17,19 +17,26 @@ cephalopod.database
 (c) 2024 Benjamin Walkenhorst
 """
 
+import hashlib
 import logging
+import os
 import sqlite3
 import threading
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+from contextlib import contextmanager
+from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum, auto
-from typing import Final, Union
+from typing import Final, Optional, Union
 
-import krylib
-
-from cephalopod import common
-from cephalopod.cast import Episode, Feed
+from cephalopod import common, compression, config
+from cephalopod.cast import Episode, Feed, Subscription
+from cephalopod.feedcache import FeedCache
 
 OPEN_LOCK: Final[threading.Lock] = threading.Lock()
+# The Database instances of a process that use the same file share their
+# FeedCache, by the path of the file. Protected by OPEN_LOCK.
+_feed_caches: Final[dict[str, FeedCache]] = {}
 
 INIT_QUERIES: Final[list[str]] = [
     """
@@ -42,18 +49,50 @@ CREATE TABLE feed (
     cover_url TEXT NOT NULL DEFAULT '',
     last_refresh INTEGER NOT NULL DEFAULT 0,
     autorefresh INTEGER NOT NULL DEFAULT 0,
-    folder TEXT UNIQUE NOT NULL
+    folder TEXT UNIQUE NOT NULL,
+    failures INTEGER NOT NULL DEFAULT 0,
+    retry_after INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT NOT NULL DEFAULT '',
+    etag TEXT NOT NULL DEFAULT '',
+    last_modified TEXT NOT NULL DEFAULT '',
+    quota INTEGER NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL DEFAULT 0
 ) STRICT
     """,
     "CREATE INDEX feed_ref_idx ON feed (last_refresh)",
     "CREATE INDEX feed_auto_idx ON feed (autorefresh)",
+    "CREATE INDEX feed_title_idx ON feed (title)",
+    """
+CREATE TABLE feed_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL
+) STRICT
+    """,
+    "INSERT INTO feed_version (id, version) VALUES (1, 0)",
+    """
+CREATE TRIGGER feed_version_insert AFTER INSERT ON feed
+BEGIN
+    UPDATE feed_version SET version = version + 1 WHERE id = 1;
+    UPDATE feed SET version = (SELECT version FROM feed_version WHERE id = 1)
+    WHERE id = NEW.id;
+END
+    """,
+    """
+CREATE TRIGGER feed_version_update AFTER UPDATE ON feed
+WHEN NEW.version = OLD.version
+BEGIN
+    UPDATE feed_version SET version = version + 1 WHERE id = 1;
+    UPDATE feed SET version = (SELECT version FROM feed_version WHERE id = 1)
+    WHERE id = NEW.id;
+END
+    """,
     """
 CREATE TABLE episode (
     id INTEGER PRIMARY KEY,
     feed_id INTEGER NOT NULL,
     number INTEGER NOT NULL DEFAULT 0,
     title TEXT NOT NULL,
-    url TEXT UNIQUE NOT NULL,
+    url TEXT NOT NULL,
     published INTEGER NOT NULL DEFAULT 0,
     link TEXT NOT NULL DEFAULT '',
     mime TEXT NOT NULL DEFAULT 'application/octet-stream',
@@ -61,14 +100,472 @@ CREATE TABLE episode (
     finished INTEGER NOT NULL DEFAULT 0,
     path TEXT UNIQUE NOT NULL,
     keep INTEGER NOT NULL DEFAULT 0,
-    description TEXT NOT NULL DEFAULT '',
+    duration INTEGER NOT NULL DEFAULT 0,
+    url_key INTEGER NOT NULL DEFAULT 0,
+    size INTEGER NOT NULL DEFAULT 0,
     FOREIGN KEY (feed_id) REFERENCES feed (id)
 ) STRICT
     """,
-    "CREATE INDEX episode_feed_idx ON episode (feed_id)",
+    "CREATE INDEX episode_key_idx ON episode (feed_id, url_key)",
+    "CREATE INDEX episode_size_idx ON episode (feed_id, size) WHERE size > 0",
     "CREATE INDEX episode_published_idx ON episode (published)",
     "CREATE INDEX episode_finished_idx ON episode (finished)",
     "CREATE INDEX episode_keep_idx ON episode (keep)",
+    "CREATE INDEX episode_feed_idx ON episode (feed_id, published)",
+    "CREATE INDEX episode_no_duration_idx ON episode (published) WHERE duration = 0",
+    """
+CREATE INDEX episode_disk_idx ON episode (published)
+WHERE size > 0 AND finished <> 0 AND keep = 0
+    """,
+    """
+CREATE TABLE feed_page (
+    feed_id INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    next TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (feed_id, url),
+    FOREIGN KEY (feed_id) REFERENCES feed (id)
+) STRICT, WITHOUT ROWID
+    """,
+    """
+CREATE TABLE websub (
+    feed_id INTEGER PRIMARY KEY,
+    hub TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    secret TEXT NOT NULL DEFAULT '',
+    requested INTEGER NOT NULL DEFAULT 0,
+    expires INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY (feed_id) REFERENCES feed (id)
+) STRICT
+    """,
+    "CREATE INDEX websub_expires_idx ON websub (expires)",
+    """
+CREATE TABLE text_dict (
+    id INTEGER PRIMARY KEY,
+    data BLOB NOT NULL
+) STRICT
+    """,
+    """
+CREATE TABLE episode_text (
+    episode_id INTEGER PRIMARY KEY,
+    dict_id INTEGER NOT NULL DEFAULT 0,
+    size INTEGER NOT NULL,
+    body BLOB NOT NULL,
+    FOREIGN KEY (episode_id) REFERENCES episode (id)
+) STRICT
+    """,
+    "CREATE INDEX episode_text_dict_idx ON episode_text (dict_id)",
+    """
+CREATE TABLE listen_session (
+    id INTEGER PRIMARY KEY,
+    episode_id INTEGER NOT NULL,
+    feed_id INTEGER NOT NULL,
+    start INTEGER NOT NULL,
+    stop INTEGER NOT NULL,
+    pos_from INTEGER NOT NULL,
+    pos_to INTEGER NOT NULL,
+    FOREIGN KEY (episode_id) REFERENCES episode (id)
+) STRICT
+    """,
+    "CREATE INDEX listen_session_start_idx ON listen_session (start)",
+    "CREATE INDEX listen_session_episode_idx ON listen_session (episode_id)",
+    """
+CREATE TABLE listen_stats (
+    period TEXT NOT NULL,
+    start INTEGER NOT NULL,
+    feed_id INTEGER NOT NULL,
+    sessions INTEGER NOT NULL,
+    seconds INTEGER NOT NULL,
+    wall INTEGER NOT NULL,
+    PRIMARY KEY (period, start, feed_id)
+) STRICT, WITHOUT ROWID
+    """,
+    "CREATE INDEX listen_stats_feed_idx ON listen_stats (feed_id)",
+    """
+CREATE TABLE play_queue (
+    episode_id INTEGER PRIMARY KEY,
+    rank TEXT NOT NULL,
+    FOREIGN KEY (episode_id) REFERENCES episode (id)
+) STRICT
+    """,
+    "CREATE UNIQUE INDEX play_queue_rank_idx ON play_queue (rank)",
+    """
+CREATE TABLE feed_totals (
+    feed_id INTEGER PRIMARY KEY,
+    episodes INTEGER NOT NULL DEFAULT 0,
+    unplayed INTEGER NOT NULL DEFAULT 0,
+    downloaded INTEGER NOT NULL DEFAULT 0,
+    duration INTEGER NOT NULL DEFAULT 0,
+    remaining INTEGER NOT NULL DEFAULT 0
+) STRICT
+    """,
+    """
+CREATE TRIGGER feed_totals_insert AFTER INSERT ON episode
+BEGIN
+    INSERT INTO feed_totals (feed_id, episodes, unplayed, downloaded, duration, remaining)
+    VALUES (NEW.feed_id, 1, NEW.finished = 0, NEW.size > 0, MAX(NEW.duration, 0),
+            CASE WHEN NEW.finished = 0 AND NEW.duration > NEW.cur_pos
+                 THEN NEW.duration - NEW.cur_pos ELSE 0 END)
+    ON CONFLICT (feed_id) DO UPDATE SET
+        episodes = episodes + excluded.episodes,
+        unplayed = unplayed + excluded.unplayed,
+        downloaded = downloaded + excluded.downloaded,
+        duration = duration + excluded.duration,
+        remaining = remaining + excluded.remaining;
+END
+    """,
+    """
+CREATE TRIGGER feed_totals_update
+AFTER UPDATE OF feed_id, finished, size, duration, cur_pos ON episode
+BEGIN
+    UPDATE feed_totals SET
+        episodes = episodes - 1,
+        unplayed = unplayed - (OLD.finished = 0),
+        downloaded = downloaded - (OLD.size > 0),
+        duration = duration - MAX(OLD.duration, 0),
+        remaining = remaining - CASE WHEN OLD.finished = 0 AND OLD.duration > OLD.cur_pos
+                                     THEN OLD.duration - OLD.cur_pos ELSE 0 END
+    WHERE feed_id = OLD.feed_id;
+    INSERT INTO feed_totals (feed_id, episodes, unplayed, downloaded, duration, remaining)
+    VALUES (NEW.feed_id, 1, NEW.finished = 0, NEW.size > 0, MAX(NEW.duration, 0),
+            CASE WHEN NEW.finished = 0 AND NEW.duration > NEW.cur_pos
+                 THEN NEW.duration - NEW.cur_pos ELSE 0 END)
+    ON CONFLICT (feed_id) DO UPDATE SET
+        episodes = episodes + excluded.episodes,
+        unplayed = unplayed + excluded.unplayed,
+        downloaded = downloaded + excluded.downloaded,
+        duration = duration + excluded.duration,
+        remaining = remaining + excluded.remaining;
+END
+    """,
+    """
+CREATE TRIGGER feed_totals_delete AFTER DELETE ON episode
+BEGIN
+    UPDATE feed_totals SET
+        episodes = episodes - 1,
+        unplayed = unplayed - (OLD.finished = 0),
+        downloaded = downloaded - (OLD.size > 0),
+        duration = duration - MAX(OLD.duration, 0),
+        remaining = remaining - CASE WHEN OLD.finished = 0 AND OLD.duration > OLD.cur_pos
+                                     THEN OLD.duration - OLD.cur_pos ELSE 0 END
+    WHERE feed_id = OLD.feed_id;
+END
+    """,
+    """
+CREATE TRIGGER feed_totals_feed_delete AFTER DELETE ON feed
+BEGIN
+    DELETE FROM feed_totals WHERE feed_id = OLD.id;
+END
+    """,
+]
+
+# MIGRATIONS holds the queries to bring an existing database up to date.
+# The database's user_version is the number of migrations that have been
+# applied to it. Fresh databases are created with the current schema by
+# INIT_QUERIES, so whenever a migration is added here, INIT_QUERIES must
+# be changed accordingly.
+MIGRATIONS: Final[list[list[str]]] = [
+    # 1: Episode durations
+    [
+        "ALTER TABLE episode ADD COLUMN duration INTEGER NOT NULL DEFAULT 0",
+    ],
+    # 2: Feed failure tracking
+    [
+        "ALTER TABLE feed ADD COLUMN failures INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE feed ADD COLUMN retry_after INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE feed ADD COLUMN last_error TEXT NOT NULL DEFAULT ''",
+    ],
+    # 3: Validators for conditional requests
+    [
+        "ALTER TABLE feed ADD COLUMN etag TEXT NOT NULL DEFAULT ''",
+        "ALTER TABLE feed ADD COLUMN last_modified TEXT NOT NULL DEFAULT ''",
+    ],
+    # 4: Pages of paged and archived feeds we have fetched completely
+    [
+        """
+CREATE TABLE feed_page (
+    feed_id INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    next TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (feed_id, url),
+    FOREIGN KEY (feed_id) REFERENCES feed (id)
+) STRICT, WITHOUT ROWID
+        """,
+    ],
+    # 5: WebSub subscriptions
+    [
+        """
+CREATE TABLE websub (
+    feed_id INTEGER PRIMARY KEY,
+    hub TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    secret TEXT NOT NULL DEFAULT '',
+    requested INTEGER NOT NULL DEFAULT 0,
+    expires INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY (feed_id) REFERENCES feed (id)
+) STRICT
+        """,
+    ],
+    # 6: Dedupe Episodes on a hash of their URL instead of the URL itself.
+    # SQLite cannot drop a UNIQUE constraint, so the table is rebuilt.
+    [
+        """
+CREATE TABLE episode_new (
+    id INTEGER PRIMARY KEY,
+    feed_id INTEGER NOT NULL,
+    number INTEGER NOT NULL DEFAULT 0,
+    title TEXT NOT NULL,
+    url TEXT NOT NULL,
+    published INTEGER NOT NULL DEFAULT 0,
+    link TEXT NOT NULL DEFAULT '',
+    mime TEXT NOT NULL DEFAULT 'application/octet-stream',
+    cur_pos INTEGER NOT NULL DEFAULT 0,
+    finished INTEGER NOT NULL DEFAULT 0,
+    path TEXT UNIQUE NOT NULL,
+    keep INTEGER NOT NULL DEFAULT 0,
+    description TEXT NOT NULL DEFAULT '',
+    duration INTEGER NOT NULL DEFAULT 0,
+    url_key INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY (feed_id) REFERENCES feed (id)
+) STRICT
+        """,
+        """
+INSERT INTO episode_new (id, feed_id, number, title, url, published, link, mime, cur_pos,
+                         finished, path, keep, description, duration, url_key)
+SELECT id, feed_id, number, title, url, published, link, mime, cur_pos,
+       finished, path, keep, description, duration, url_key(url)
+FROM episode
+        """,
+        "DROP TABLE episode",
+        "ALTER TABLE episode_new RENAME TO episode",
+        "CREATE INDEX episode_key_idx ON episode (feed_id, url_key)",
+        "CREATE INDEX episode_published_idx ON episode (published)",
+        "CREATE INDEX episode_finished_idx ON episode (finished)",
+        "CREATE INDEX episode_keep_idx ON episode (keep)",
+    ],
+    # 7: Move the descriptions of Episodes to a side table, compressed.
+    [
+        """
+CREATE TABLE text_dict (
+    id INTEGER PRIMARY KEY,
+    data BLOB NOT NULL
+) STRICT
+        """,
+        """
+CREATE TABLE episode_text (
+    episode_id INTEGER PRIMARY KEY,
+    dict_id INTEGER NOT NULL DEFAULT 0,
+    size INTEGER NOT NULL,
+    body BLOB NOT NULL,
+    FOREIGN KEY (episode_id) REFERENCES episode (id)
+) STRICT
+        """,
+        "CREATE INDEX episode_text_dict_idx ON episode_text (dict_id)",
+        """
+INSERT INTO episode_text (episode_id, size, body)
+SELECT id, length(CAST(description AS BLOB)), compress_text(description)
+FROM episode
+WHERE description <> ''
+        """,
+        "ALTER TABLE episode DROP COLUMN description",
+    ],
+    # 8: Disk usage and quotas. This looks at the files of all Episodes
+    # once, from then on we keep track of their sizes as they come and go.
+    [
+        "ALTER TABLE feed ADD COLUMN quota INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE episode ADD COLUMN size INTEGER NOT NULL DEFAULT 0",
+        "UPDATE episode SET size = file_size(path)",
+        "CREATE INDEX episode_size_idx ON episode (feed_id, size) WHERE size > 0",
+    ],
+    # 9: Indexes for the queries that had to scan or sort, see
+    # test_query_plan.
+    [
+        "CREATE INDEX episode_feed_idx ON episode (feed_id, published)",
+        "CREATE INDEX episode_no_duration_idx ON episode (published) WHERE duration = 0",
+        """
+CREATE INDEX episode_disk_idx ON episode (published)
+WHERE size > 0 AND finished <> 0 AND keep = 0
+        """,
+        "CREATE INDEX websub_expires_idx ON websub (expires)",
+    ],
+    # 10: Count the changes to the feed table, so the FeedCache can tell
+    # when its Feeds are out of date.
+    [
+        "CREATE INDEX feed_title_idx ON feed (title)",
+        """
+CREATE TABLE feed_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL
+) STRICT
+        """,
+        "INSERT INTO feed_version (id, version) VALUES (1, 0)",
+        """
+CREATE TRIGGER feed_version_insert AFTER INSERT ON feed
+BEGIN
+    UPDATE feed_version SET version = version + 1 WHERE id = 1;
+END
+        """,
+        """
+CREATE TRIGGER feed_version_update AFTER UPDATE ON feed
+BEGIN
+    UPDATE feed_version SET version = version + 1 WHERE id = 1;
+END
+        """,
+        """
+CREATE TRIGGER feed_version_delete AFTER DELETE ON feed
+BEGIN
+    UPDATE feed_version SET version = version + 1 WHERE id = 1;
+END
+        """,
+    ],
+    # 11: The listening history, and the statistics drawn from it.
+    [
+        """
+CREATE TABLE listen_session (
+    id INTEGER PRIMARY KEY,
+    episode_id INTEGER NOT NULL,
+    feed_id INTEGER NOT NULL,
+    start INTEGER NOT NULL,
+    stop INTEGER NOT NULL,
+    pos_from INTEGER NOT NULL,
+    pos_to INTEGER NOT NULL,
+    FOREIGN KEY (episode_id) REFERENCES episode (id)
+) STRICT
+        """,
+        "CREATE INDEX listen_session_start_idx ON listen_session (start)",
+        "CREATE INDEX listen_session_episode_idx ON listen_session (episode_id)",
+        """
+CREATE TABLE listen_stats (
+    period TEXT NOT NULL,
+    start INTEGER NOT NULL,
+    feed_id INTEGER NOT NULL,
+    sessions INTEGER NOT NULL,
+    seconds INTEGER NOT NULL,
+    wall INTEGER NOT NULL,
+    PRIMARY KEY (period, start, feed_id)
+) STRICT, WITHOUT ROWID
+        """,
+        "CREATE INDEX listen_stats_feed_idx ON listen_stats (feed_id)",
+    ],
+    # 12: The queue of Episodes to listen to next.
+    [
+        """
+CREATE TABLE play_queue (
+    episode_id INTEGER PRIMARY KEY,
+    rank TEXT NOT NULL,
+    FOREIGN KEY (episode_id) REFERENCES episode (id)
+) STRICT
+        """,
+        "CREATE UNIQUE INDEX play_queue_rank_idx ON play_queue (rank)",
+    ],
+    # 13: Give each Feed a version of its own, drawn from feed_version, so
+    # a change to one Feed does not have the FeedCache read all of them.
+    [
+        "DROP TRIGGER feed_version_insert",
+        "DROP TRIGGER feed_version_update",
+        "DROP TRIGGER feed_version_delete",
+        "ALTER TABLE feed ADD COLUMN version INTEGER NOT NULL DEFAULT 0",
+        """
+CREATE TRIGGER feed_version_insert AFTER INSERT ON feed
+BEGIN
+    UPDATE feed_version SET version = version + 1 WHERE id = 1;
+    UPDATE feed SET version = (SELECT version FROM feed_version WHERE id = 1)
+    WHERE id = NEW.id;
+END
+        """,
+        """
+CREATE TRIGGER feed_version_update AFTER UPDATE ON feed
+WHEN NEW.version = OLD.version
+BEGIN
+    UPDATE feed_version SET version = version + 1 WHERE id = 1;
+    UPDATE feed SET version = (SELECT version FROM feed_version WHERE id = 1)
+    WHERE id = NEW.id;
+END
+        """,
+    ],
+    # 14: The totals of each Feed's Episodes, kept current by triggers, so
+    # adding them up does not take a pass over all Episodes.
+    [
+        """
+CREATE TABLE feed_totals (
+    feed_id INTEGER PRIMARY KEY,
+    episodes INTEGER NOT NULL DEFAULT 0,
+    unplayed INTEGER NOT NULL DEFAULT 0,
+    downloaded INTEGER NOT NULL DEFAULT 0,
+    duration INTEGER NOT NULL DEFAULT 0,
+    remaining INTEGER NOT NULL DEFAULT 0
+) STRICT
+        """,
+        """
+INSERT INTO feed_totals (feed_id, episodes, unplayed, downloaded, duration, remaining)
+SELECT
+    feed_id,
+    COUNT(id),
+    SUM(finished = 0),
+    SUM(size > 0),
+    SUM(MAX(duration, 0)),
+    SUM(CASE WHEN finished = 0 AND duration > cur_pos THEN duration - cur_pos ELSE 0 END)
+FROM episode
+GROUP BY +feed_id
+        """,
+        """
+CREATE TRIGGER feed_totals_insert AFTER INSERT ON episode
+BEGIN
+    INSERT INTO feed_totals (feed_id, episodes, unplayed, downloaded, duration, remaining)
+    VALUES (NEW.feed_id, 1, NEW.finished = 0, NEW.size > 0, MAX(NEW.duration, 0),
+            CASE WHEN NEW.finished = 0 AND NEW.duration > NEW.cur_pos
+                 THEN NEW.duration - NEW.cur_pos ELSE 0 END)
+    ON CONFLICT (feed_id) DO UPDATE SET
+        episodes = episodes + excluded.episodes,
+        unplayed = unplayed + excluded.unplayed,
+        downloaded = downloaded + excluded.downloaded,
+        duration = duration + excluded.duration,
+        remaining = remaining + excluded.remaining;
+END
+        """,
+        """
+CREATE TRIGGER feed_totals_update
+AFTER UPDATE OF feed_id, finished, size, duration, cur_pos ON episode
+BEGIN
+    UPDATE feed_totals SET
+        episodes = episodes - 1,
+        unplayed = unplayed - (OLD.finished = 0),
+        downloaded = downloaded - (OLD.size > 0),
+        duration = duration - MAX(OLD.duration, 0),
+        remaining = remaining - CASE WHEN OLD.finished = 0 AND OLD.duration > OLD.cur_pos
+                                     THEN OLD.duration - OLD.cur_pos ELSE 0 END
+    WHERE feed_id = OLD.feed_id;
+    INSERT INTO feed_totals (feed_id, episodes, unplayed, downloaded, duration, remaining)
+    VALUES (NEW.feed_id, 1, NEW.finished = 0, NEW.size > 0, MAX(NEW.duration, 0),
+            CASE WHEN NEW.finished = 0 AND NEW.duration > NEW.cur_pos
+                 THEN NEW.duration - NEW.cur_pos ELSE 0 END)
+    ON CONFLICT (feed_id) DO UPDATE SET
+        episodes = episodes + excluded.episodes,
+        unplayed = unplayed + excluded.unplayed,
+        downloaded = downloaded + excluded.downloaded,
+        duration = duration + excluded.duration,
+        remaining = remaining + excluded.remaining;
+END
+        """,
+        """
+CREATE TRIGGER feed_totals_delete AFTER DELETE ON episode
+BEGIN
+    UPDATE feed_totals SET
+        episodes = episodes - 1,
+        unplayed = unplayed - (OLD.finished = 0),
+        downloaded = downloaded - (OLD.size > 0),
+        duration = duration - MAX(OLD.duration, 0),
+        remaining = remaining - CASE WHEN OLD.finished = 0 AND OLD.duration > OLD.cur_pos
+                                     THEN OLD.duration - OLD.cur_pos ELSE 0 END
+    WHERE feed_id = OLD.feed_id;
+END
+        """,
+        """
+CREATE TRIGGER feed_totals_feed_delete AFTER DELETE ON feed
+BEGIN
+    DELETE FROM feed_totals WHERE feed_id = OLD.id;
+END
+        """,
+    ],
 ]
 
 
@@ -76,17 +573,78 @@ class Query(Enum):
     """Symbolic constants to identify database queries"""
     FeedAdd = auto()
     FeedGetAll = auto()
-    FeedGetAutorefresh = auto()
+    FeedGetVersions = auto()
+    FeedGetVersion = auto()
+    FeedGetVersionByTitle = auto()
     FeedGetByID = auto()
     FeedGetByTitle = auto()
     FeedSetAutorefresh = auto()
     FeedSetRefresh = auto()
+    FeedSetFailure = auto()
+    FeedSetValidators = auto()
     FeedDelete = auto()
     EpisodeAdd = auto()
     EpisodeGetAll = auto()
     EpisodeGetByFeed = auto()
+    EpisodeGetByIDs = auto()
+    EpisodeGetKeys = auto()
+    EpisodeGetByURLKeys = auto()
     EpisodeSetPos = auto()
     EpisodeSetKeep = auto()
+    EpisodeSetFinished = auto()
+    EpisodeSetDuration = auto()
+    EpisodeGetNoDuration = auto()
+    PageAdd = auto()
+    PageGetByFeed = auto()
+    WebSubDiscover = auto()
+    WebSubGetByFeed = auto()
+    WebSubGetDue = auto()
+    WebSubGetActive = auto()
+    WebSubSetRequested = auto()
+    WebSubSetExpires = auto()
+    TextAdd = auto()
+    TextGet = auto()
+    TextGetSample = auto()
+    TextGetStale = auto()
+    TextSetBody = auto()
+    DictAdd = auto()
+    DictGet = auto()
+    DictGetCurrent = auto()
+    EpisodeSetSize = auto()
+    EpisodeCheckSize = auto()
+    FeedSetQuota = auto()
+    DiskUsage = auto()
+    DiskCandidates = auto()
+    Stats = auto()
+    SelectionClear = auto()
+    SelectionAdd = auto()
+    EpisodesSetFinished = auto()
+    EpisodesSetKeep = auto()
+    EpisodesResetPos = auto()
+    EpisodeList = auto()
+    EpisodeTotals = auto()
+    FeedTotalsGet = auto()
+    FeedTotalsGetByFeed = auto()
+    EpisodeGetFiles = auto()
+    TextDeleteByFeed = auto()
+    EpisodeDeleteByFeed = auto()
+    PageDeleteByFeed = auto()
+    WebSubDelete = auto()
+    SessionAdd = auto()
+    SessionGetRange = auto()
+    SessionDeleteByFeed = auto()
+    ListenStatsGet = auto()
+    ListenStatsAdd = auto()
+    ListenStatsClear = auto()
+    ListenStatsDeleteByFeed = auto()
+    QueueGet = auto()
+    QueueGetRank = auto()
+    QueueGetRankAfter = auto()
+    QueueGetRankLast = auto()
+    QueueSet = auto()
+    QueueRemove = auto()
+    QueueClear = auto()
+    QueueDeleteByFeed = auto()
 
 
 db_queries: Final[dict[Query, str]] = {
@@ -105,10 +663,22 @@ SELECT
     cover_url,
     last_refresh,
     autorefresh,
-    folder
+    folder,
+    failures,
+    retry_after,
+    last_error,
+    etag,
+    last_modified,
+    quota,
+    version
 FROM feed
     """,
-    Query.FeedGetAutorefresh: """
+    Query.FeedGetVersions: "SELECT id, version FROM feed ORDER BY id",
+    Query.FeedGetVersion: "SELECT version FROM feed WHERE id = ?",
+    Query.FeedGetVersionByTitle: """
+SELECT id, version FROM feed WHERE title = ? ORDER BY id LIMIT 1
+    """,
+    Query.FeedGetByID: """
 SELECT
     id,
     feed_url,
@@ -117,18 +687,68 @@ SELECT
     description,
     cover_url,
     last_refresh,
-    folder
+    autorefresh,
+    folder,
+    failures,
+    retry_after,
+    last_error,
+    etag,
+    last_modified,
+    quota,
+    version
 FROM feed
-WHERE autorefresh <> 0
+WHERE id = ?
+    """,
+    Query.FeedGetByTitle: """
+SELECT
+    id,
+    feed_url,
+    homepage,
+    title,
+    description,
+    cover_url,
+    last_refresh,
+    autorefresh,
+    folder,
+    failures,
+    retry_after,
+    last_error,
+    etag,
+    last_modified,
+    quota,
+    version
+FROM feed
+WHERE title = ?
+ORDER BY id
+LIMIT 1
     """,
     Query.FeedSetRefresh: """
-UPDATE feed SET last_refresh = ? WHERE id = ?
+UPDATE feed SET
+    last_refresh = ?,
+    failures = 0,
+    retry_after = 0,
+    last_error = ''
+WHERE id = ?
+RETURNING version
+    """,
+    Query.FeedSetFailure: """
+UPDATE feed SET failures = ?, retry_after = ?, last_error = ? WHERE id = ?
+RETURNING version
+    """,
+    Query.FeedSetValidators: """
+UPDATE feed SET etag = ?, last_modified = ? WHERE id = ?
+RETURNING version
+    """,
+    Query.FeedSetAutorefresh: """
+UPDATE feed SET autorefresh = ? WHERE id = ?
+RETURNING version
     """,
-    Query.FeedSetAutorefresh: "UPDATE feed SET autorefresh = ? WHERE id = ?",
     Query.FeedDelete: "DELETE FROM feed WHERE id = ?",
     Query.EpisodeAdd: """
-INSERT INTO episode (feed_id, number, title, url, published, link, mime, path, description)
-             VALUES (      ?,      ?,     ?,   ?,         ?,    ?,    ?,    ?,           ?)
+INSERT INTO episode (feed_id, number, title, url, published, link, mime, path, duration,
+                     url_key)
+             VALUES (      ?,      ?,     ?,   ?,         ?,    ?,    ?,    ?,        ?,
+                           ?)
 RETURNING id
     """,
     Query.EpisodeGetAll: """
@@ -145,13 +765,15 @@ SELECT
     finished,
     path,
     keep,
-    description
+    duration,
+    size
 FROM episode
 ORDER BY published DESC
     """,
     Query.EpisodeGetByFeed: """
 SELECT
     id,
+    feed_id,
     title,
     number,
     url,
@@ -162,16 +784,340 @@ SELECT
     finished,
     path,
     keep,
-    description
+    duration,
+    size
 FROM episode
 WHERE feed_id = ?
 ORDER BY published DESC
+    """,
+    Query.EpisodeGetByIDs: """
+SELECT
+    id,
+    feed_id,
+    title,
+    number,
+    url,
+    published,
+    link,
+    mime,
+    cur_pos,
+    finished,
+    path,
+    keep,
+    duration,
+    size
+FROM episode
+WHERE id IN ({})
+    """,
+    Query.EpisodeGetKeys: """
+SELECT
+    id,
+    feed_id,
+    number,
+    published,
+    cur_pos,
+    duration,
+    finished,
+    keep,
+    size > 0
+FROM episode
+ORDER BY published DESC, id DESC
+    """,
+    Query.EpisodeGetByURLKeys: """
+SELECT url FROM episode WHERE feed_id = ? AND url_key IN ({})
     """,
     Query.EpisodeSetKeep: "UPDATE episode SET keep = ? WHERE id = ?",
+    Query.EpisodeSetFinished: "UPDATE episode SET finished = ? WHERE id = ?",
     Query.EpisodeSetPos: "UPDATE episode SET cur_pos = ? WHERE id = ?",
+    Query.EpisodeSetDuration: "UPDATE episode SET duration = ? WHERE id = ?",
+    Query.EpisodeGetNoDuration: """
+SELECT
+    id,
+    feed_id,
+    title,
+    number,
+    url,
+    published,
+    link,
+    mime,
+    cur_pos,
+    finished,
+    path,
+    keep,
+    duration,
+    size
+FROM episode
+WHERE duration = 0
+ORDER BY published DESC
+LIMIT ?
+    """,
+    Query.PageAdd: """
+INSERT INTO feed_page (feed_id, url, next) VALUES (?, ?, ?)
+ON CONFLICT (feed_id, url) DO UPDATE SET next = excluded.next
+    """,
+    Query.PageGetByFeed: "SELECT url, next FROM feed_page WHERE feed_id = ?",
+    Query.WebSubDiscover: """
+INSERT INTO websub (feed_id, hub, topic) VALUES (?, ?, ?)
+ON CONFLICT (feed_id) DO UPDATE SET
+    hub = excluded.hub,
+    topic = excluded.topic,
+    secret = '',
+    requested = 0,
+    expires = 0
+WHERE hub <> excluded.hub OR topic <> excluded.topic
+    """,
+    Query.WebSubGetByFeed: """
+SELECT feed_id, hub, topic, secret, requested, expires FROM websub WHERE feed_id = ?
+    """,
+    Query.WebSubGetDue: """
+SELECT w.feed_id, w.hub, w.topic, w.secret, w.requested, w.expires
+FROM websub w
+INNER JOIN feed f ON w.feed_id = f.id
+WHERE f.autorefresh <> 0 AND w.expires < ? AND w.requested < ?
+    """,
+    Query.WebSubGetActive: "SELECT feed_id FROM websub WHERE expires > ?",
+    Query.WebSubSetRequested: "UPDATE websub SET secret = ?, requested = ? WHERE feed_id = ?",
+    Query.WebSubSetExpires: "UPDATE websub SET expires = ? WHERE feed_id = ?",
+    Query.EpisodeSetSize: "UPDATE episode SET size = ? WHERE id = ?",
+    Query.EpisodeCheckSize: """
+UPDATE episode SET size = file_size(path) WHERE size > 0 AND size <> file_size(path)
+    """,
+    Query.FeedSetQuota: """
+UPDATE feed SET quota = ? WHERE id = ?
+RETURNING version
+    """,
+    Query.DiskUsage: """
+SELECT f.id, f.quota, COALESCE(SUM(e.size), 0)
+FROM feed f
+LEFT OUTER JOIN episode e ON e.feed_id = f.id AND e.size > 0
+GROUP BY f.id
+    """,
+    Query.DiskCandidates: """
+SELECT id, feed_id, path, size
+FROM episode
+WHERE size > 0 AND finished <> 0 AND keep = 0
+ORDER BY published, id
+    """,
+    Query.TextAdd: """
+INSERT INTO episode_text (episode_id, dict_id, size, body) VALUES (?, ?, ?, ?)
+    """,
+    Query.TextGet: "SELECT dict_id, body FROM episode_text WHERE episode_id = ?",
+    Query.TextGetSample: """
+SELECT dict_id, body FROM episode_text ORDER BY episode_id DESC LIMIT ?
+    """,
+    Query.TextGetStale: """
+SELECT episode_id, dict_id, body FROM episode_text WHERE dict_id < ? LIMIT ?
+    """,
+    Query.TextSetBody: """
+UPDATE episode_text SET dict_id = ?, body = ? WHERE episode_id = ?
+    """,
+    Query.DictAdd: "INSERT INTO text_dict (data) VALUES (?) RETURNING id",
+    Query.DictGet: "SELECT data FROM text_dict WHERE id = ?",
+    Query.DictGetCurrent: "SELECT id, data FROM text_dict ORDER BY id DESC LIMIT 1",
+    Query.Stats: """
+SELECT
+    (SELECT COUNT(id) FROM feed),
+    (SELECT COUNT(id) FROM episode),
+    (SELECT COUNT(id) FROM episode WHERE finished <> 0),
+    (SELECT COUNT(id) FROM feed WHERE failures > 0),
+    (SELECT COALESCE(SUM(size), 0) FROM episode_text),
+    (SELECT COALESCE(SUM(length(body)), 0) FROM episode_text),
+    (SELECT COALESCE(SUM(size), 0) FROM episode WHERE size > 0)
+    """,
+    # The bulk updates take the conditions of a Selection in place of the
+    # {}, see Database._select. Rows that already have the new value are
+    # left alone, so they are neither written nor counted.
+    Query.SelectionClear: "DELETE FROM temp.selection",
+    Query.SelectionAdd: "INSERT OR IGNORE INTO temp.selection (id) VALUES (?)",
+    Query.EpisodesSetFinished: """
+UPDATE episode SET finished = ? WHERE finished <> ? AND ({})
+    """,
+    Query.EpisodesSetKeep: "UPDATE episode SET keep = ? WHERE keep <> ? AND ({})",
+    Query.EpisodesResetPos: "UPDATE episode SET cur_pos = 0 WHERE cur_pos <> 0 AND ({})",
+    # The episode list takes the conditions of a Selection, and the
+    # order, see Database.episode_list.
+    Query.EpisodeList: "SELECT id, title FROM episode WHERE {} ORDER BY {} LIMIT ?",
+    # Grouping in a temporary B-tree beats visiting the rows in the
+    # order of episode_feed_idx, which takes a seek per row.
+    Query.EpisodeTotals: """
+SELECT
+    feed_id,
+    COUNT(id),
+    SUM(finished = 0),
+    SUM(size > 0),
+    SUM(MAX(duration, 0)),
+    SUM(CASE WHEN finished = 0 AND duration > cur_pos THEN duration - cur_pos ELSE 0 END)
+FROM episode
+WHERE {}
+GROUP BY +feed_id
+    """,
+    Query.FeedTotalsGet: """
+SELECT feed_id, episodes, unplayed, downloaded, duration, remaining
+FROM feed_totals
+WHERE episodes > 0
+    """,
+    Query.FeedTotalsGetByFeed: """
+SELECT feed_id, episodes, unplayed, downloaded, duration, remaining
+FROM feed_totals
+WHERE feed_id = ? AND episodes > 0
+    """,
+    Query.EpisodeGetFiles: "SELECT id, path, size FROM episode WHERE feed_id = ? AND size > 0",
+    Query.TextDeleteByFeed: """
+DELETE FROM episode_text WHERE episode_id IN (SELECT id FROM episode WHERE feed_id = ?)
+    """,
+    Query.EpisodeDeleteByFeed: "DELETE FROM episode WHERE feed_id = ?",
+    Query.PageDeleteByFeed: "DELETE FROM feed_page WHERE feed_id = ?",
+    Query.WebSubDelete: "DELETE FROM websub WHERE feed_id = ?",
+    Query.SessionAdd: """
+INSERT INTO listen_session (episode_id, feed_id, start, stop, pos_from, pos_to)
+                    VALUES (         ?,       ?,     ?,    ?,        ?,      ?)
+    """,
+    Query.SessionGetRange: """
+SELECT feed_id, start, stop, pos_from, pos_to
+FROM listen_session
+WHERE start >= ? AND start < ?
+ORDER BY start
+    """,
+    Query.SessionDeleteByFeed: """
+DELETE FROM listen_session WHERE episode_id IN (SELECT id FROM episode WHERE feed_id = ?)
+    """,
+    Query.ListenStatsGet: """
+SELECT start, feed_id, sessions, seconds, wall
+FROM listen_stats
+WHERE period = ? AND start >= ? AND start < ?
+    """,
+    Query.ListenStatsAdd: """
+INSERT OR REPLACE INTO listen_stats (period, start, feed_id, sessions, seconds, wall)
+                             VALUES (     ?,     ?,       ?,        ?,       ?,    ?)
+    """,
+    Query.ListenStatsClear: "DELETE FROM listen_stats WHERE period = ? AND start = ?",
+    Query.ListenStatsDeleteByFeed: "DELETE FROM listen_stats WHERE feed_id = ?",
+    Query.QueueGet: "SELECT episode_id, rank FROM play_queue ORDER BY rank LIMIT ?",
+    Query.QueueGetRank: "SELECT rank FROM play_queue WHERE episode_id = ?",
+    Query.QueueGetRankAfter: """
+SELECT rank FROM play_queue WHERE rank > ? ORDER BY rank LIMIT 1
+    """,
+    Query.QueueGetRankLast: "SELECT max(rank) FROM play_queue",
+    Query.QueueSet: """
+INSERT INTO play_queue (episode_id, rank) VALUES (?, ?)
+ON CONFLICT (episode_id) DO UPDATE SET rank = excluded.rank
+    """,
+    Query.QueueRemove: "DELETE FROM play_queue WHERE episode_id = ?",
+    Query.QueueClear: "DELETE FROM play_queue",
+    Query.QueueDeleteByFeed: """
+DELETE FROM play_queue WHERE episode_id IN (SELECT id FROM episode WHERE feed_id = ?)
+    """,
 }
 
 
+def feed_from_row(row: Sequence) -> Feed:
+    """Create a Feed from a row returned by one of the queries that fetch
+    complete Feeds."""
+    return Feed(
+        fid=row[0],
+        feed_url=row[1],
+        homepage=row[2],
+        title=row[3],
+        description=row[4],
+        cover_url=row[5],
+        last_refresh=datetime.fromtimestamp(row[6]),
+        autorefresh=bool(row[7]),
+        folder=row[8],
+        failures=row[9],
+        retry_after=datetime.fromtimestamp(row[10]),
+        last_error=row[11],
+        etag=row[12],
+        last_modified=row[13],
+        quota=row[14],
+    )
+
+
+def file_size(path: str) -> int:
+    """Return the space a file takes up on disk, 0 if it does not exist."""
+    try:
+        st: Final[os.stat_result] = os.stat(path)
+    except OSError:
+        return 0
+    # st_blocks is what the file actually occupies, but not every
+    # platform has it.
+    return st.st_blocks * 512 if hasattr(st, "st_blocks") else st.st_size
+
+
+def url_key(url: str) -> int:
+    """Return the key we dedupe Episodes on, a 64 bit hash of their URL.
+    Different URLs may have the same key, so a matching key only tells us
+    which URLs to compare."""
+    return int.from_bytes(hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest(),
+                          "big",
+                          signed=True)
+
+
+def subscription_from_row(row: Sequence) -> Subscription:
+    """Create a Subscription from a row of the websub table."""
+    return Subscription(
+        feed_id=row[0],
+        hub=row[1],
+        topic=row[2],
+        secret=row[3],
+        requested=datetime.fromtimestamp(row[4]),
+        expires=datetime.fromtimestamp(row[5]),
+    )
+
+
+def episode_from_row(row: Sequence) -> Episode:
+    """Create an Episode from a row returned by one of the queries that
+    fetch complete Episodes. Those all must return the same columns in the
+    same order."""
+    return Episode(
+        epid=row[0],
+        feed_id=row[1],
+        title=row[2],
+        number=row[3],
+        url=row[4],
+        published=datetime.fromtimestamp(row[5]),
+        link=row[6],
+        mime_type=row[7],
+        cur_pos=row[8],
+        finished=row[9],
+        path=row[10],
+        keep=row[11],
+        description="",
+        duration=row[12],
+        size=row[13],
+    )
+
+
+@dataclass(slots=True, kw_only=True)
+class Selection:
+    """Selection describes a set of Episodes for the bulk operations of the
+    Database. Each field that is not None narrows the set down further, so
+    an empty Selection stands for all Episodes."""
+
+    feed_id: Optional[int] = None
+    ids: Optional[Sequence[int]] = None
+    published_before: Optional[datetime] = None
+    finished: Optional[bool] = None
+    downloaded: Optional[bool] = None
+
+
+@dataclass(slots=True, kw_only=True)
+class Totals:
+    """The numbers of a Feed's Episodes, and their durations in seconds."""
+
+    episodes: int = 0
+    unplayed: int = 0
+    downloaded: int = 0
+    duration: int = 0
+    # How much of the unplayed Episodes is left to listen to.
+    remaining: int = 0
+
+
+# The columns the episode list can be sorted by. They are used verbatim in
+# the ORDER BY clause, so only ever add plain column names here.
+LIST_ORDER: Final[tuple[str, ...]] = \
+    ("published", "title", "feed_id", "number", "cur_pos", "duration")
+
+
 class Database:
     """Database provides a wrapper around the, uh, database connection
     and exposes the operations to be performed on it."""
@@ -180,11 +1126,22 @@ class Database:
         "db",
         "log",
         "path",
+        "zdicts",
+        "zdict_cur",
+        "feeds",
+        "tuned",
     ]
 
     db: sqlite3.Connection
     log: logging.Logger
     path: Final[str]
+    # The compression dictionaries we have loaded, by ID, and the ID of the
+    # one new texts are compressed with, None until we have looked it up.
+    zdicts: dict[int, bytes]
+    zdict_cur: Optional[int]
+    feeds: FeedCache
+    # The generation of the Settings the connection was tuned with.
+    tuned: int
 
     def __init__(self, path: str = "") -> None:
         if path == "":
@@ -192,33 +1149,113 @@ class Database:
         self.path = path
         self.log = common.get_logger("database")
         self.log.debug("Open database at %s", path)
+        self.zdicts = {0: b""}
+        self.zdict_cur = None
         with OPEN_LOCK:
-            exist: Final[bool] = krylib.fexist(path)
+            exist: Final[bool] = os.path.exists(path)
             self.db = sqlite3.connect(path)
             self.db.isolation_level = None
+            self.db.create_function("url_key", 1, url_key, deterministic=True)
+            self.db.create_function("compress_text", 1, compression.compress,
+                                    deterministic=True)
+            self.db.create_function("file_size", 1, file_size)
 
             cur: Final[sqlite3.Cursor] = self.db.cursor()
             cur.execute("PRAGMA foreign_keys = true")
+            # The Episode IDs of a Selection are joined against this table,
+            # so there is no limit to their number, and no statement text
+            # to build for each list. It lives as long as the connection.
+            cur.execute("CREATE TEMP TABLE selection (id INTEGER PRIMARY KEY)")
+            # auto_vacuum can only be enabled before the first table is
+            # created, and before switching to WAL.
+            if not exist:
+                cur.execute("PRAGMA auto_vacuum = INCREMENTAL")
             cur.execute("PRAGMA journal_mode = WAL")
+            cur.fetchall()
+            self.tune()
 
+            if not exist:
+                # A new file, whatever we have cached is of an old one.
+                _feed_caches.pop(path, None)
+            # Creating and migrating the database run in transactions,
+            # and rolling one back invalidates the FeedCache, so it has
+            # to be in place first.
+            self.feeds = _feed_caches.setdefault(path, FeedCache())
             if not exist:
                 self.__create_db()
+            else:
+                self.__migrate()
+
+    def tune(self) -> None:
+        """Apply the performance settings to the connection."""
+        # Should the Settings change in between, the stale generation makes
+        # the next retune apply them.
+        self.tuned = config.generation()
+        settings: Final[config.Settings] = config.get()
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        # A negative cache_size is in KiB rather than in pages.
+        cur.execute(f"PRAGMA cache_size = {-(settings.cache_size // 1024)}")
+        cur.execute(f"PRAGMA mmap_size = {settings.mmap_size}")
+        cur.fetchall()
+        cur.execute(f"PRAGMA synchronous = {settings.synchronous}")
+        cur.execute(f"PRAGMA busy_timeout = {int(settings.busy_timeout * 1000)}")
+        cur.fetchall()
+
+    def retune(self) -> None:
+        """Tune the connection again if the Settings have been reloaded
+        since it was last tuned. Connections belong to one thread each, so
+        every thread does this for its own, whenever it picks it up."""
+        if self.tuned != config.generation():
+            self.tune()
 
     def __create_db(self) -> None:
         """Initialize a freshly created database"""
         self.log.debug("Initialize fresh database at %s", self.path)
-        with self.db:
+        with self:
             for query in INIT_QUERIES:
                 cur: sqlite3.Cursor = self.db.cursor()
                 cur.execute(query)
+            self.db.execute(f"PRAGMA user_version = {len(MIGRATIONS)}")
         self.log.debug("Database initialized successfully.")
 
+    def __migrate(self) -> None:
+        """Apply any migrations the database has not seen, yet."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute("PRAGMA user_version")
+        version: Final[int] = cur.fetchone()[0]
+        for i in range(version, len(MIGRATIONS)):
+            self.log.info("Migrate database %s to version %d", self.path, i + 1)
+            with self:
+                for query in MIGRATIONS[i]:
+                    cur.execute(query)
+                cur.execute(f"PRAGMA user_version = {i + 1}")
+
     def __enter__(self) -> None:
-        self.db.__enter__()
+        # Since we run the connection in autocommit mode, we have to begin
+        # the transaction ourselves, otherwise each statement is committed
+        # on its own.
+        if not self.db.in_transaction:
+            self.db.execute("BEGIN")
 
     def __exit__(self, ex_type, ex_val, traceback):
+        if ex_type is not None:
+            # The Feeds in the cache may have changes that are rolled back.
+            self.feeds.invalidate()
         return self.db.__exit__(ex_type, ex_val, traceback)
 
+    @contextmanager
+    def savepoint(self, name: str = "sp") -> Iterator[None]:
+        """Run a block of statements inside the current transaction that
+        can fail without spoiling the transaction as a whole."""
+        self.db.execute(f"SAVEPOINT {name}")
+        try:
+            yield
+        except BaseException:
+            self.db.execute(f"ROLLBACK TO {name}")
+            self.db.execute(f"RELEASE {name}")
+            raise
+        self.db.execute(f"RELEASE {name}")
+
     def feed_add(self, f: Feed) -> None:
         """Add a new feed to the database."""
         cur = self.db.cursor()
@@ -236,46 +1273,77 @@ class Database:
         assert len(row) == 1
         assert isinstance(row[0], int)
         f.fid = row[0]
+        cur.execute(db_queries[Query.FeedGetVersion], (f.fid, ))
+        self.feeds.put(f, cur.fetchone()[0])
+
+    def _feed_changed(self, f: Feed, cur: sqlite3.Cursor) -> None:
+        """Hand a Feed we have just changed to the FeedCache. cur holds the
+        version the Feed's row had before the change, the trigger has
+        given it a new one since."""
+        row: Final[Optional[tuple[int]]] = cur.fetchone()
+        if row is None:
+            return
+        cur.execute(db_queries[Query.FeedGetVersion], (f.fid, ))
+        self.feeds.changed(f, row[0], cur.fetchone()[0])
 
     def feed_get_all(self) -> list[Feed]:
-        """Fetch all Feeds from the database."""
-        cur = self.db.cursor()
+        """Fetch all Feeds from the database. The Feeds come from the
+        FeedCache, so each call returns the same objects."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute(db_queries[Query.FeedGetVersions])
+        feeds: Final[Optional[list[Feed]]] = self.feeds.all(cur.fetchall())
+        if feeds is not None:
+            return feeds
         cur.execute(db_queries[Query.FeedGetAll])
-        feeds: list[Feed] = []
-        for row in cur:
-            f = Feed(
-                fid=row[0],
-                feed_url=row[1],
-                homepage=row[2],
-                title=row[3],
-                description=row[4],
-                cover_url=row[5],
-                last_refresh=datetime.fromtimestamp(row[6]),
-                autorefresh=bool(row[7]),
-                folder=row[8],
-            )
-            feeds.append(f)
-        return feeds
+        return self.feeds.load((feed_from_row(row), row[-1]) for row in cur.fetchall())
+
+    def feed_iter(self) -> Iterator[Feed]:
+        """Iterate over all Feeds."""
+        yield from self.feed_get_all()
+
+    def feed_map(self) -> Mapping[int, Feed]:
+        """Return all Feeds by their IDs. The mapping is read-only and
+        does not change, but the Feeds in it are the ones from the
+        FeedCache, so changes to them show."""
+        self.feed_get_all()
+        return self.feeds.feeds()
 
     def feed_get_autorefresh(self) -> list[Feed]:
         """Fetch all feeds that have autorefresh set."""
-        cur = self.db.cursor()
-        cur.execute(db_queries[Query.FeedGetAutorefresh])
-        feeds: list[Feed] = []
-        for row in cur:
-            f = Feed(
-                fid=row[0],
-                feed_url=row[1],
-                homepage=row[2],
-                title=row[3],
-                description=row[4],
-                cover_url=row[5],
-                last_refresh=datetime.fromtimestamp(row[6]),
-                autorefresh=True,
-                folder=row[7],
-            )
-            feeds.append(f)
-        return feeds
+        return [f for f in self.feed_get_all() if f.autorefresh]
+
+    def _feed_load(self, fid: int, version: int) -> Optional[Feed]:
+        """Return the Feed with the given ID from the FeedCache, if it has
+        the given version of it, or from the database otherwise."""
+        f: Final[Optional[Feed]] = self.feeds.get(fid, version)
+        if f is not None:
+            return f
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute(db_queries[Query.FeedGetByID], (fid, ))
+        row = cur.fetchone()
+        if row is None:
+            self.feeds.remove(fid)
+            return None
+        return self.feeds.put(feed_from_row(row), row[-1])
+
+    def feed_get_by_id(self, fid: int) -> Optional[Feed]:
+        """Fetch a Feed by its ID. Returns None if there is no such Feed."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute(db_queries[Query.FeedGetVersion], (fid, ))
+        row = cur.fetchone()
+        if row is None:
+            self.feeds.remove(fid)
+            return None
+        return self._feed_load(fid, row[0])
+
+    def feed_get_by_title(self, title: str) -> Optional[Feed]:
+        """Fetch a Feed by its title. If several Feeds have the same
+        title, the one with the lowest ID is returned. Returns None if
+        there is no such Feed."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute(db_queries[Query.FeedGetVersionByTitle], (title, ))
+        row = cur.fetchone()
+        return self._feed_load(row[0], row[1]) if row is not None else None
 
     def feed_set_autorefresh(self, f: Feed, refresh: bool) -> None:
         """Set a Feed's autorefresh flag to the given value."""
@@ -283,13 +1351,39 @@ class Database:
         cur.execute(db_queries[Query.FeedSetAutorefresh],
                     (refresh, f.fid))
         f.autorefresh = refresh
+        self._feed_changed(f, cur)
 
     def feed_set_timestamp(self, f: Feed, stamp: datetime) -> None:
-        """Set a Feed's refresh timestamp to the given value"""
+        """Set a Feed's refresh timestamp to the given value.
+        A successful refresh also clears the Feed's failure state."""
         cur = self.db.cursor()
         cur.execute(db_queries[Query.FeedSetRefresh],
                     (int(stamp.timestamp()), f.fid))
         f.last_refresh = stamp
+        f.failures = 0
+        f.retry_after = datetime.fromtimestamp(0)
+        f.last_error = ""
+        self._feed_changed(f, cur)
+
+    def feed_set_failure(self, f: Feed, failures: int, retry_after: datetime, err: str) -> None:
+        """Record that refreshing a Feed failed."""
+        cur = self.db.cursor()
+        cur.execute(db_queries[Query.FeedSetFailure],
+                    (failures, int(retry_after.timestamp()), err, f.fid))
+        f.failures = failures
+        f.retry_after = retry_after
+        f.last_error = err
+        self._feed_changed(f, cur)
+
+    def feed_set_validators(self, f: Feed, etag: str, last_modified: str) -> None:
+        """Remember the ETag and Last-Modified headers of a Feed's last
+        response, so the next refresh can ask for changes only."""
+        cur = self.db.cursor()
+        cur.execute(db_queries[Query.FeedSetValidators],
+                    (etag, last_modified, f.fid))
+        f.etag = etag
+        f.last_modified = last_modified
+        self._feed_changed(f, cur)
 
     def episode_add(self, e: Episode) -> bool:
         """Add a new Episode to the database."""
@@ -300,11 +1394,12 @@ class Database:
                          e.number,
                          e.title,
                          e.url,
-                         e.published.timestamp(),
+                         int(e.published.timestamp()),
                          e.link,
                          e.mime_type,
                          e.path,
-                         e.description))
+                         e.duration,
+                         url_key(e.url)))
             row = cur.fetchone()
         except sqlite3.IntegrityError as err:
             self.log.error("Cannot add episode %s for podcast %d: %s\n\t%s",
@@ -315,32 +1410,15 @@ class Database:
             return False
         else:
             e.epid = row[0]
+            if e.description != "":
+                self._text_put(e.epid, e.description)
             return True
 
     def episode_get_all(self) -> list[Episode]:
         """Fetch all Episodes"""
         cur: Final[sqlite3.Cursor] = self.db.cursor()
         cur.execute(db_queries[Query.EpisodeGetAll])
-        episodes: list[Episode] = []
-        for row in cur:
-            e = Episode(
-                epid=row[0],
-                feed_id=row[1],
-                title=row[2],
-                number=row[3],
-                url=row[4],
-                published=datetime.fromtimestamp(row[5]),
-                link=row[6],
-                mime_type=row[7],
-                cur_pos=row[8],
-                finished=row[9],
-                path=row[10],
-                keep=row[11],
-                description=row[12],
-            )
-            episodes.append(e)
-
-        return episodes
+        return [episode_from_row(row) for row in cur]
 
     def episode_get_by_feed(self, f: Union[Feed, int]) -> list[Episode]:
         """Get all episodes for the given Feed."""
@@ -352,26 +1430,484 @@ class Database:
 
         cur: Final[sqlite3.Cursor] = self.db.cursor()
         cur.execute(db_queries[Query.EpisodeGetByFeed], (fid, ))
-        episodes: list[Episode] = []
-        for row in cur:
-            e = Episode(
-                epid=row[0],
-                feed_id=fid,
-                number=row[1],
-                title=row[2],
-                url=row[3],
-                published=datetime.fromtimestamp(row[4]),
-                link=row[5],
-                mime_type=row[6],
-                cur_pos=row[7],
-                finished=row[8],
-                path=row[9],
-                keep=row[10],
-                description=row[11],
-            )
-            episodes.append(e)
-
-        return episodes
+        return [episode_from_row(row) for row in cur]
+
+    def episode_get_by_ids(self, ids: Sequence[int]) -> list[Episode]:
+        """Fetch the Episodes with the given IDs.
+
+        The result is in no particular order, and IDs that do not exist are
+        silently skipped."""
+        if len(ids) == 0:
+            return []
+
+        query: Final[str] = \
+            db_queries[Query.EpisodeGetByIDs].format(", ".join("?" * len(ids)))
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute(query, tuple(ids))
+        return [episode_from_row(row) for row in cur]
+
+    def episode_get_by_id(self, epid: int) -> Optional[Episode]:
+        """Fetch a single Episode by its ID. Returns None if no such Episode exists."""
+        episodes: Final[list[Episode]] = self.episode_get_by_ids((epid, ))
+        return episodes[0] if len(episodes) > 0 else None
+
+    def episode_get_no_duration(self, limit: int = 100) -> list[Episode]:
+        """Fetch up to limit Episodes whose duration is not known, yet,
+        newest first."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute(db_queries[Query.EpisodeGetNoDuration], (limit, ))
+        return [episode_from_row(row) for row in cur]
+
+    def episode_set_durations(self, durations: Sequence[tuple[int, int]]) -> None:
+        """Set the durations of several Episodes at once. durations is a
+        sequence of (Episode ID, duration in seconds) tuples. A duration
+        of -1 means we tried and failed to determine it."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.executemany(db_queries[Query.EpisodeSetDuration],
+                        ((d, epid) for epid, d in durations))
+
+    def episode_get_keys(self) -> Iterator[tuple[int, int, int, int, int, int, bool, bool, bool]]:
+        """Iterate over the sort and filter keys of all Episodes, newest first.
+
+        Each item is a tuple of (id, feed_id, number, published, cur_pos,
+        duration, finished, keep, downloaded), with the timestamp as seconds
+        since the epoch.
+        Rows are fetched from the database in batches as the caller
+        consumes them."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute(db_queries[Query.EpisodeGetKeys])
+        while rows := cur.fetchmany(4096):
+            for row in rows:
+                yield (row[0], row[1], row[2], row[3], row[4], row[5],
+                       bool(row[6]), bool(row[7]), bool(row[8]))
+
+    def episode_set_finished(self, e: Episode, finished: bool) -> None:
+        """Mark an Episode as listened to, or not."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute(db_queries[Query.EpisodeSetFinished], (finished, e.epid))
+        e.finished = finished
+
+    def episode_set_keep(self, e: Episode, keep: bool) -> None:
+        """Mark an Episode's download to be kept, whatever the quotas say."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute(db_queries[Query.EpisodeSetKeep], (keep, e.epid))
+        e.keep = keep
+
+    def episode_set_pos(self, e: Episode, pos: int) -> None:
+        """Remember how far into an Episode we have listened, in seconds."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute(db_queries[Query.EpisodeSetPos], (pos, e.epid))
+        e.cur_pos = pos
+
+    def _select(self, sel: Selection) -> tuple[str, list]:
+        """Turn a Selection into the conditions of a WHERE clause and their
+        arguments. The conditions are fixed strings, only the arguments
+        come from the Selection. Its IDs, if any, are put in the selection
+        table."""
+        conds: Final[list[str]] = []
+        args: Final[list] = []
+        if sel.ids is not None:
+            cur: Final[sqlite3.Cursor] = self.db.cursor()
+            cur.execute(db_queries[Query.SelectionClear])
+            cur.executemany(db_queries[Query.SelectionAdd], ((i, ) for i in sel.ids))
+            conds.append("id IN (SELECT id FROM temp.selection)")
+        if sel.feed_id is not None:
+            conds.append("feed_id = ?")
+            args.append(sel.feed_id)
+        if sel.published_before is not None:
+            conds.append("published < ?")
+            args.append(int(sel.published_before.timestamp()))
+        if sel.finished is not None:
+            conds.append("finished <> 0" if sel.finished else "finished = 0")
+        if sel.downloaded is not None:
+            conds.append("size > 0" if sel.downloaded else "size = 0")
+        return " AND ".join(conds) or "1", args
+
+    def _bulk(self, q: Query, args: tuple, sel: Selection) -> int:
+        """Run one of the bulk updates on the Episodes in a Selection, and
+        return the number of Episodes it changed."""
+        where, sel_args = self._select(sel)
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute(db_queries[q].format(where), (*args, *sel_args))
+        return cur.rowcount
+
+    def episodes_set_finished(self, sel: Selection, finished: bool) -> int:
+        """Mark all Episodes in a Selection as listened to, or not, in a
+        single statement. Returns the number of Episodes changed."""
+        return self._bulk(Query.EpisodesSetFinished, (finished, finished), sel)
+
+    def episodes_set_keep(self, sel: Selection, keep: bool) -> int:
+        """Set the keep flag of all Episodes in a Selection. Returns the
+        number of Episodes changed."""
+        return self._bulk(Query.EpisodesSetKeep, (keep, keep), sel)
+
+    def episodes_reset_pos(self, sel: Selection) -> int:
+        """Rewind all Episodes in a Selection to the start. Returns the
+        number of Episodes changed."""
+        return self._bulk(Query.EpisodesResetPos, (), sel)
+
+    def episode_list(self,
+                     sel: Selection,
+                     column: str = "published",
+                     descending: bool = True,
+                     limit: int = -1) -> list[tuple[int, str]]:
+        """Return the IDs and titles of the Episodes in a Selection, sorted
+        by one of the columns in LIST_ORDER, and by ID, in the same
+        direction, where it is the same. A negative limit returns all of
+        them. The default order follows an index, so only the Episodes
+        returned are read."""
+        if column not in LIST_ORDER:
+            raise ValueError(f"Cannot sort by {column}")
+        where, args = self._select(sel)
+        direction: Final[str] = "DESC" if descending else "ASC"
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute(db_queries[Query.EpisodeList].format(
+            where, f"{column} {direction}, id {direction}"), (*args, limit))
+        return cur.fetchall()
+
+    def episode_totals(self, sel: Optional[Selection] = None) -> dict[int, Totals]:
+        """Add up the Episodes in a Selection, or all of them, by Feed ID.
+        The totals of whole Feeds come from the feed_totals table, others
+        take a pass over the Episodes the Selection picks."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        if sel is None or sel == Selection():
+            cur.execute(db_queries[Query.FeedTotalsGet])
+        elif sel == Selection(feed_id=sel.feed_id):
+            cur.execute(db_queries[Query.FeedTotalsGetByFeed], (sel.feed_id, ))
+        else:
+            where, args = self._select(sel)
+            cur.execute(db_queries[Query.EpisodeTotals].format(where), args)
+        return {row[0]: Totals(episodes=row[1],
+                               unplayed=row[2],
+                               downloaded=row[3],
+                               duration=row[4],
+                               remaining=row[5]) for row in cur}
+
+    def episode_set_size(self, e: Episode, size: int) -> None:
+        """Record the space the file of an Episode takes up on disk."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute(db_queries[Query.EpisodeSetSize], (size, e.epid))
+        e.size = size
+
+    def episode_clear_sizes(self, ids: Sequence[int]) -> None:
+        """Record that the files of the given Episodes are gone."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.executemany(db_queries[Query.EpisodeSetSize], ((0, epid) for epid in ids))
+
+    def episode_check_sizes(self) -> int:
+        """Compare the recorded sizes of all downloaded Episodes with their
+        files, and fix those that are off, e.g. because the file has been
+        removed behind our back. Returns the number of Episodes fixed."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute(db_queries[Query.EpisodeCheckSize])
+        return cur.rowcount
+
+    def feed_set_quota(self, f: Feed, quota: int) -> None:
+        """Set how much space the downloads of a Feed may take up."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute(db_queries[Query.FeedSetQuota], (quota, f.fid))
+        f.quota = quota
+        self._feed_changed(f, cur)
+
+    def disk_usage(self) -> dict[int, tuple[int, int]]:
+        """Return the quota and the space taken up by downloads of every
+        Feed, by Feed ID."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute(db_queries[Query.DiskUsage])
+        return {row[0]: (row[1], row[2]) for row in cur}
+
+    def disk_candidates(self) -> list[tuple[int, int, str, int]]:
+        """Return the downloaded Episodes we may delete, oldest first, as
+        tuples of (id, feed_id, path, size)."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute(db_queries[Query.DiskCandidates])
+        return cur.fetchall()
+
+    def episode_get_files(self, f: Feed) -> list[tuple[int, str, int]]:
+        """Return the downloads of a Feed, as tuples of (Episode ID, path,
+        size)."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute(db_queries[Query.EpisodeGetFiles], (f.fid, ))
+        return cur.fetchall()
+
+    def feed_delete(self, f: Feed) -> dict[str, int]:
+        """Delete a Feed along with its Episodes and everything else we
+        store about it. Returns the number of rows deleted, by kind.
+
+        Each table is cleared with a single statement per Feed, dependent
+        rows first, to keep the foreign keys happy. The caller has to run
+        this inside a transaction, and to delete the downloads (see
+        episode_get_files) once it has been committed."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        counts: Final[dict[str, int]] = {}
+        for key, q in (("queued", Query.QueueDeleteByFeed),
+                       ("sessions", Query.SessionDeleteByFeed),
+                       ("listen_stats", Query.ListenStatsDeleteByFeed),
+                       ("texts", Query.TextDeleteByFeed),
+                       ("episodes", Query.EpisodeDeleteByFeed),
+                       ("pages", Query.PageDeleteByFeed),
+                       ("websub", Query.WebSubDelete),
+                       ("feeds", Query.FeedDelete)):
+            cur.execute(db_queries[q], (f.fid, ))
+            counts[key] = cur.rowcount
+        # The FeedCache notices the Feed is gone once its row is.
+        # Dropping it right away would lose the object if the transaction
+        # is rolled back.
+        return counts
+
+    def session_add(self, sessions: Iterable[tuple[int, int, int, int, int, int]]) -> None:
+        """Append listening sessions to the history, each given as a tuple
+        of (Episode ID, Feed ID, start, stop, position from, position to),
+        with the timestamps in seconds since the epoch."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.executemany(db_queries[Query.SessionAdd], sessions)
+
+    def session_iter(self, since: int, until: int) -> Iterator[tuple[int, int, int, int, int]]:
+        """Iterate over the listening sessions that started in the given
+        range of timestamps, in the order they started. Each one is a tuple
+        of (Feed ID, start, stop, position from, position to)."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute(db_queries[Query.SessionGetRange], (since, until))
+        while rows := cur.fetchmany(4096):
+            yield from rows
+
+    def listen_stats_get(self,
+                         period: str,
+                         since: int,
+                         until: int) -> list[tuple[int, int, int, int, int]]:
+        """Return the cached listening statistics of the periods that
+        start in the given range, as tuples of (start, Feed ID, sessions,
+        seconds, wall clock seconds)."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute(db_queries[Query.ListenStatsGet], (period, since, until))
+        return cur.fetchall()
+
+    def listen_stats_put(self,
+                         period: str,
+                         stats: Iterable[tuple[int, int, int, int, int]]) -> None:
+        """Cache listening statistics, given as listen_stats_get returns
+        them."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.executemany(db_queries[Query.ListenStatsAdd],
+                        ((period, *row) for row in stats))
+
+    def listen_stats_clear(self, period: str, starts: Iterable[int]) -> None:
+        """Drop the cached statistics of the given periods."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.executemany(db_queries[Query.ListenStatsClear],
+                        ((period, start) for start in starts))
+
+    def queue_get(self, cnt: int = -1) -> list[tuple[int, str]]:
+        """Return the first cnt Episodes in the queue, or all of them if
+        cnt is negative, as tuples of (Episode ID, rank)."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute(db_queries[Query.QueueGet], (cnt, ))
+        return cur.fetchall()
+
+    def queue_rank(self, epid: int) -> Optional[str]:
+        """Return the rank of an Episode in the queue, or None if it is not
+        queued."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute(db_queries[Query.QueueGetRank], (epid, ))
+        row: Final[Optional[tuple[str]]] = cur.fetchone()
+        return row[0] if row is not None else None
+
+    def queue_rank_after(self, rank: str) -> Optional[str]:
+        """Return the next rank in the queue after the given one, or None if
+        there is none."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute(db_queries[Query.QueueGetRankAfter], (rank, ))
+        row: Final[Optional[tuple[str]]] = cur.fetchone()
+        return row[0] if row is not None else None
+
+    def queue_rank_last(self) -> Optional[str]:
+        """Return the rank of the last Episode in the queue, or None if the
+        queue is empty."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute(db_queries[Query.QueueGetRankLast])
+        return cur.fetchone()[0]
+
+    def queue_set(self, epid: int, rank: str) -> None:
+        """Put an Episode in the queue at the given rank, or move it there
+        if it is queued already."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute(db_queries[Query.QueueSet], (epid, rank))
+
+    def queue_remove(self, epid: int) -> bool:
+        """Take an Episode out of the queue. Returns False if it was not
+        queued."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute(db_queries[Query.QueueRemove], (epid, ))
+        return cur.rowcount > 0
+
+    def queue_replace(self, queue: Iterable[tuple[int, str]]) -> None:
+        """Replace the queue as a whole, given as tuples of (Episode ID,
+        rank). Since the ranks are unique, this empties the queue first, so
+        new ranks cannot collide with old ones."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute(db_queries[Query.QueueClear])
+        cur.executemany(db_queries[Query.QueueSet], queue)
+
+    def _zdict(self, did: int) -> bytes:
+        """Return the compression dictionary with the given ID."""
+        zdict: Optional[bytes] = self.zdicts.get(did)
+        if zdict is None:
+            cur: Final[sqlite3.Cursor] = self.db.cursor()
+            cur.execute(db_queries[Query.DictGet], (did, ))
+            zdict = cur.fetchone()[0]
+            self.zdicts[did] = zdict
+        return zdict
+
+    def _zdict_current(self) -> int:
+        """Return the ID of the dictionary to compress new texts with."""
+        if self.zdict_cur is None:
+            cur: Final[sqlite3.Cursor] = self.db.cursor()
+            cur.execute(db_queries[Query.DictGetCurrent])
+            row = cur.fetchone()
+            self.zdict_cur = 0
+            if row is not None:
+                self.zdict_cur = row[0]
+                self.zdicts[row[0]] = row[1]
+        return self.zdict_cur
+
+    def _text_put(self, epid: int, text: str) -> None:
+        """Store the compressed description of an Episode."""
+        did: Final[int] = self._zdict_current()
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute(db_queries[Query.TextAdd],
+                    (epid,
+                     did,
+                     len(text.encode("utf-8")),
+                     compression.compress(text, self._zdict(did))))
+
+    def episode_get_description(self, epid: int) -> str:
+        """Load and decompress the description of an Episode. Returns an
+        empty string if the Episode has no description."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute(db_queries[Query.TextGet], (epid, ))
+        row = cur.fetchone()
+        if row is None:
+            return ""
+        return compression.decompress(row[1], self._zdict(row[0]))
+
+    def text_train(self, sample: int = 1000, batch: int = 500) -> int:
+        """Build a new compression dictionary from the most recent sample
+        descriptions, and recompress all descriptions with it, batch rows
+        per transaction. Returns the ID of the new dictionary, or the old
+        one if the sample had too little in common to build one."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute(db_queries[Query.TextGetSample], (sample, ))
+        texts: Final[list[str]] = [compression.decompress(body, self._zdict(did))
+                                   for did, body in cur.fetchall()]
+        zdict: Final[bytes] = compression.train(texts)
+        if zdict == b"":
+            return self._zdict_current()
+
+        with self:
+            cur.execute(db_queries[Query.DictAdd], (zdict, ))
+            did: Final[int] = cur.fetchone()[0]
+        self.zdicts[did] = zdict
+        self.zdict_cur = did
+
+        while True:
+            cur.execute(db_queries[Query.TextGetStale], (did, batch))
+            rows = cur.fetchall()
+            if len(rows) == 0:
+                break
+            with self:
+                cur.executemany(
+                    db_queries[Query.TextSetBody],
+                    ((did,
+                      compression.compress(compression.decompress(body, self._zdict(old)), zdict),
+                      epid)
+                     for epid, old, body in rows))
+        return did
+
+    def episode_known_urls(self, f: Feed, urls: Iterable[str]) -> set[str]:
+        """Return those of the given enclosure URLs that belong to an
+        Episode of the Feed already."""
+        wanted: Final[set[str]] = set(urls)
+        keys: Final[list[int]] = list({url_key(u) for u in wanted})
+        known: set[str] = set()
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i+500]
+            cur.execute(db_queries[Query.EpisodeGetByURLKeys].format(", ".join("?" * len(chunk))),
+                        (f.fid, *chunk))
+            # A key may belong to several URLs, the URL itself decides.
+            known.update(row[0] for row in cur if row[0] in wanted)
+        return known
+
+    def page_add(self, f: Feed, url: str, nxt: str) -> None:
+        """Remember that we have fetched the page at url of a paged Feed,
+        and the URL of the page after it, if any."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute(db_queries[Query.PageAdd], (f.fid, url, nxt))
+
+    def page_get_by_feed(self, f: Feed) -> dict[str, str]:
+        """Return the pages of a Feed we have fetched completely, mapped to
+        the URLs of the pages after them."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute(db_queries[Query.PageGetByFeed], (f.fid, ))
+        return dict(cur.fetchall())
+
+    def websub_discover(self, f: Feed, hub: str, topic: str) -> None:
+        """Record the WebSub hub a Feed advertises. If the hub or the topic
+        have changed, the old subscription is forgotten."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute(db_queries[Query.WebSubDiscover], (f.fid, hub, topic))
+
+    def websub_get_by_feed(self, fid: int) -> Optional[Subscription]:
+        """Return the WebSub Subscription of a Feed, if it has one."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute(db_queries[Query.WebSubGetByFeed], (fid, ))
+        row = cur.fetchone()
+        return subscription_from_row(row) if row is not None else None
+
+    def websub_get_due(self, expires: datetime, requested: datetime) -> list[Subscription]:
+        """Return the Subscriptions that expire before expires, and that
+        we have not asked the hub for since requested."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute(db_queries[Query.WebSubGetDue],
+                    (int(expires.timestamp()), int(requested.timestamp())))
+        return [subscription_from_row(row) for row in cur]
+
+    def websub_get_active(self, now: datetime) -> set[int]:
+        """Return the IDs of the Feeds a hub is pushing updates for."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute(db_queries[Query.WebSubGetActive], (int(now.timestamp()), ))
+        return {row[0] for row in cur}
+
+    def websub_set_requested(self, sub: Subscription, secret: str, stamp: datetime) -> None:
+        """Record that we have asked the hub for a Subscription."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute(db_queries[Query.WebSubSetRequested],
+                    (secret, int(stamp.timestamp()), sub.feed_id))
+        sub.secret = secret
+        sub.requested = stamp
+
+    def websub_set_expires(self, sub: Subscription, expires: datetime) -> None:
+        """Record the end of the lease the hub has granted us."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute(db_queries[Query.WebSubSetExpires],
+                    (int(expires.timestamp()), sub.feed_id))
+        sub.expires = expires
+
+    def stats(self) -> dict[str, int]:
+        """Return a few numbers about the database's contents."""
+        cur: Final[sqlite3.Cursor] = self.db.cursor()
+        cur.execute(db_queries[Query.Stats])
+        row = cur.fetchone()
+        return {
+            "feeds": row[0],
+            "episodes": row[1],
+            "finished": row[2],
+            "failing": row[3],
+            "text_raw": row[4],
+            "text_stored": row[5],
+            "downloads": row[6],
+            "size": os.stat(self.path).st_size,
+        }
 
 
 # Local Variables: #
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-19 23:02:51 krylon>
+#
+# /data/code/python/cephalopod/feedcache.py
+# created on 19. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/gpl-3.0
+
+"""
+cephalopod.feedcache
+
+(c) 2026 Benjamin Walkenhorst
+
+An identity map of the Feeds in a database. There are few Feeds, they
+are looked up all the time, and they rarely change, so the Database
+keeps them in memory, and all Database instances of a process that use
+the same file share one FeedCache. A Feed is represented by the same
+object, no matter how often or through which connection it is loaded.
+
+Each row of the feed table carries a version, which triggers stamp from
+a sequence whenever the row is inserted or updated, so changes made by
+other processes, or by SQL that goes around the Database methods, are
+noticed as well. The cache remembers the version of each Feed it holds.
+A lookup asks the database for the current version of the row, and only
+if it differs, the Feed is read again, and the fresh values are copied
+into the object already in the cache, so whoever holds on to it sees
+them, too. The Database's own changes go into the cache as they are
+made, so they never cause a Feed to be read again.
+"""
+
+from collections.abc import Iterable, Mapping, Sequence
+from dataclasses import fields
+from threading import Lock
+from types import MappingProxyType
+from typing import Final, Optional
+
+from cephalopod.cast import Feed
+
+_fields: Final[tuple[str, ...]] = tuple(f.name for f in fields(Feed))
+
+
+class FeedCache:
+    """FeedCache holds one Feed object per Feed ID."""
+
+    __slots__ = [
+        "lock",
+        "by_id",
+        "versions",
+    ]
+
+    lock: Lock
+    by_id: dict[int, Feed]
+    # The version of each Feed's row the Feed object reflects. Feeds that
+    # are missing here have to be read again.
+    versions: dict[int, int]
+
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.by_id = {}
+        self.versions = {}
+
+    def feeds(self) -> Mapping[int, Feed]:
+        """Return the cached Feeds by their IDs. The mapping is a copy, so
+        it does not change under the caller's feet, but it holds the Feed
+        objects themselves, which do."""
+        with self.lock:
+            return MappingProxyType(dict(self.by_id))
+
+    def invalidate(self) -> None:
+        """Have all Feeds read again, e.g. after a transaction has been
+        rolled back."""
+        with self.lock:
+            self.versions.clear()
+
+    def _merge(self, f: Feed, version: int) -> Feed:
+        """Put a freshly loaded Feed into the cache. If we already have an
+        object for it, copy the new values into that one and return it.
+        The caller must hold the lock."""
+        cached: Final[Optional[Feed]] = self.by_id.get(f.fid)
+        if cached is None:
+            cached = f
+            self.by_id[f.fid] = f
+        elif cached is not f:
+            for name in _fields:
+                setattr(cached, name, getattr(f, name))
+        self.versions[f.fid] = version
+        return cached
+
+    def put(self, f: Feed, version: int) -> Feed:
+        """Add a Feed to the cache, or update the one we have, with the
+        values of the given version of its row. Returns the Feed object
+        that represents it from now on."""
+        with self.lock:
+            return self._merge(f, version)
+
+    def changed(self, f: Feed, before: int, after: int) -> None:
+        """Take over a change to a Feed that turned the given version of
+        its row into another. If the cache did not hold the version
+        before the change, someone else has changed the Feed in the
+        meantime, and it has to be read again."""
+        with self.lock:
+            if self.versions.get(f.fid) == before:
+                self._merge(f, after)
+            else:
+                self.versions.pop(f.fid, None)
+
+    def remove(self, fid: int) -> None:
+        """Forget the Feed with the given ID."""
+        with self.lock:
+            self.by_id.pop(fid, None)
+            self.versions.pop(fid, None)
+
+    def get(self, fid: int, version: int) -> Optional[Feed]:
+        """Return the Feed with the given ID, if we have it in the given
+        version, or None if the caller has to load it."""
+        with self.lock:
+            if self.versions.get(fid) != version:
+                return None
+            return self.by_id[fid]
+
+    def all(self, versions: Sequence[tuple[int, int]]) -> Optional[list[Feed]]:
+        """Return all Feeds, given as pairs of ID and version, in the same
+        order, or None if the cache does not hold every one of them in
+        that version, or holds others."""
+        with self.lock:
+            if len(versions) != len(self.by_id):
+                return None
+            feeds: Final[list[Feed]] = []
+            for fid, version in versions:
+                if self.versions.get(fid) != version:
+                    return None
+                feeds.append(self.by_id[fid])
+            return feeds
+
+    def load(self, feeds: Iterable[tuple[Feed, int]]) -> list[Feed]:
+        """Replace the contents of the cache with all Feeds in the database,
+        given along with the versions of their rows, keeping the objects
+        of those Feeds we already have. Returns the Feeds in the order
+        given."""
+        with self.lock:
+            result: Final[list[Feed]] = [self._merge(f, v) for f, v in feeds]
+            for fid in set(self.by_id) - {f.fid for f in result}:
+                del self.by_id[fid]
+                self.versions.pop(fid, None)
+            return result
+
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
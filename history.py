@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-20 01:52:40 krylon>
+#
+# /data/code/python/cephalopod/history.py
+# created on 20. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/gpl-3.0
+
+"""
+cephalopod.history
+
+(c) 2026 Benjamin Walkenhorst
+
+Record the listening history. Each time an Episode is played, the
+player reports a session: when it started and stopped, and the span of
+the Episode it covered. Sessions are only ever appended, and they are
+collected in memory and written in batches, so a player that reports
+every few seconds does not cost a transaction each time.
+"""
+
+import logging
+from datetime import datetime, timedelta
+from threading import Lock
+from typing import Final, Optional
+
+from cephalopod import common
+from cephalopod.cast import Episode
+from cephalopod.database import Database
+from cephalopod.stats import Period, period_starts
+
+# How many sessions we collect before writing them.
+BATCH_SIZE: Final[int] = 64
+# How long a session may wait to be written, at most.
+FLUSH_INTERVAL: Final[timedelta] = timedelta(minutes=5)
+
+Session = tuple[int, int, int, int, int, int]
+
+
+class SessionLog:
+    """SessionLog collects listening sessions and writes them to the
+    database in batches."""
+
+    __slots__ = [
+        "log",
+        "lock",
+        "pending",
+        "last_flush",
+    ]
+
+    log: logging.Logger
+    lock: Lock
+    # Tuples of (Episode ID, Feed ID, start, stop, position from, position
+    # to), the timestamps in seconds since the epoch.
+    pending: list[Session]
+    last_flush: datetime
+
+    def __init__(self) -> None:
+        self.log = common.get_logger("SessionLog")
+        self.lock = Lock()
+        self.pending = []
+        self.last_flush = datetime.now()
+
+    def __len__(self) -> int:
+        with self.lock:
+            return len(self.pending)
+
+    def record(self,
+               e: Episode,
+               start: datetime,
+               stop: datetime,
+               pos_from: int,
+               pos_to: int) -> None:
+        """Add a session during which the Episode was played from pos_from
+        to pos_to, in seconds."""
+        with self.lock:
+            self.pending.append((e.epid,
+                                 e.feed_id,
+                                 int(start.timestamp()),
+                                 int(stop.timestamp()),
+                                 pos_from,
+                                 pos_to))
+
+    def is_due(self, now: Optional[datetime] = None) -> bool:
+        """Return True if the collected sessions should be written."""
+        if now is None:
+            now = datetime.now()
+        with self.lock:
+            return len(self.pending) >= BATCH_SIZE or \
+                (len(self.pending) > 0 and now - self.last_flush >= FLUSH_INTERVAL)
+
+    def flush(self, db: Database) -> int:
+        """Write the collected sessions in one transaction, and drop the
+        cached statistics of the periods they fall into. Returns the
+        number of sessions written. If writing fails, the sessions are
+        kept for the next attempt."""
+        with self.lock:
+            batch: Final[list[Session]] = self.pending
+            self.pending = []
+            self.last_flush = datetime.now()
+        if len(batch) == 0:
+            return 0
+        try:
+            with db:
+                db.session_add(batch)
+                for period in Period:
+                    db.listen_stats_clear(period.value,
+                                          period_starts((s[2] for s in batch), period))
+        except Exception:
+            with self.lock:
+                self.pending[:0] = batch
+            raise
+        self.log.debug("Recorded %d listening sessions", len(batch))
+        return len(batch)
+
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
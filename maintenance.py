@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-19 21:31:05 krylon>
+#
+# /data/code/python/cephalopod/maintenance.py
+# created on 19. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/gpl-3.0
+
+"""
+cephalopod.maintenance
+
+(c) 2026 Benjamin Walkenhorst
+
+Keep the database in shape. SQLite does not do this on its own: the
+statistics the query planner relies on are only gathered when we ask for
+them, the WAL is only checkpointed when a commit happens to push it past
+the autocheckpoint limit and never shrinks, and pages freed by deleting
+rows stay in the file.
+
+Maintenance runs three steps, each with a time budget. A step that runs
+out of time is interrupted and simply continues the next time, so
+maintenance never stalls a refresh or the GUI for long:
+
+- PRAGMA optimize, which runs ANALYZE where the statistics are stale,
+- a passive WAL checkpoint, followed by a truncating one if the WAL has
+  grown large and every reader has caught up,
+- an incremental vacuum, which returns free pages to the file system.
+  Databases created since auto_vacuum was enabled support this, older
+  ones have to be converted once by a full VACUUM.
+"""
+
+import logging
+import os
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Final
+
+from cephalopod import common, config
+from cephalopod.database import Database
+
+# How long each step may take, in seconds.
+OPTIMIZE_BUDGET: Final[float] = 2.0
+CHECKPOINT_BUDGET: Final[float] = 0.25
+VACUUM_BUDGET: Final[float] = 1.0
+# How many pages each incremental vacuum returns at most.
+VACUUM_STEP: Final[int] = 256
+# If the WAL is larger than this after a checkpoint, we truncate it.
+WAL_LIMIT: Final[int] = 16 << 20
+# Keep ANALYZE from reading entire tables, a sample is good enough.
+ANALYSIS_LIMIT: Final[int] = 1000
+# How many virtual machine instructions SQLite executes between checks of
+# the deadline.
+PROGRESS_STEPS: Final[int] = 1000
+
+AUTO_VACUUM_MODES: Final[tuple[str, ...]] = ("none", "full", "incremental")
+
+
+@dataclass(slots=True, kw_only=True)
+class Usage:
+    """Usage describes how the database file is used."""
+
+    page_size: int
+    pages: int
+    free_pages: int
+    wal_size: int
+    auto_vacuum: str
+
+    @property
+    def size(self) -> int:
+        """Return the size of the database file in bytes."""
+        return self.pages * self.page_size
+
+    @property
+    def fragmentation(self) -> float:
+        """Return the share of the file that is free pages."""
+        return self.free_pages / self.pages if self.pages > 0 else 0.0
+
+
+@dataclass(slots=True, kw_only=True)
+class Step:
+    """Step records how one step of the maintenance went."""
+
+    name: str
+    seconds: float
+    complete: bool
+
+
+@dataclass(slots=True, kw_only=True)
+class Report:
+    """Report describes the database before and after maintenance."""
+
+    before: Usage
+    after: Usage
+    steps: list[Step] = field(default_factory=list)
+
+    def lines(self) -> list[str]:
+        """Return the Report as human-readable lines of text."""
+        result: list[str] = []
+        for label, u in (("before", self.before), ("after", self.after)):
+            result.append(f"{label:<10} {u.pages:>9} pages {common.fmt_bytes(u.size):>11}, "
+                          f"{u.free_pages} free ({u.fragmentation:.1%}), "
+                          f"WAL {common.fmt_bytes(u.wal_size)}")
+        for s in self.steps:
+            result.append(f"{s.name:<10} {s.seconds * 1000:>9.1f} ms"
+                          f"{'' if s.complete else ', out of time'}")
+        return result
+
+
+class Maintenance:
+    """Maintenance optimizes, checkpoints and vacuums a database."""
+
+    __slots__ = [
+        "log",
+        "db",
+    ]
+
+    log: logging.Logger
+    db: Database
+
+    def __init__(self, db: Database) -> None:
+        self.log = common.get_logger("Maintenance")
+        self.db = db
+
+    def _pragma(self, name: str) -> int:
+        cur: Final[sqlite3.Cursor] = self.db.db.execute(f"PRAGMA {name}")
+        return cur.fetchone()[0]
+
+    def usage(self) -> Usage:
+        """Find out how the database file is used."""
+        try:
+            wal: int = os.stat(self.db.path + "-wal").st_size
+        except FileNotFoundError:
+            wal = 0
+        mode: Final[int] = self._pragma("auto_vacuum")
+        return Usage(
+            page_size=self._pragma("page_size"),
+            pages=self._pragma("page_count"),
+            free_pages=self._pragma("freelist_count"),
+            wal_size=wal,
+            auto_vacuum=AUTO_VACUUM_MODES[mode] if 0 <= mode < 3 else str(mode),
+        )
+
+    def _timed(self, name: str, budget: float, work: Callable[[float], bool]) -> Step:
+        """Run a step, interrupting whatever SQLite is doing once its
+        budget is spent. work receives the deadline and returns False if
+        it stopped early."""
+        start: Final[float] = time.monotonic()
+        deadline: Final[float] = start + budget
+        self.db.db.set_progress_handler(lambda: time.monotonic() > deadline, PROGRESS_STEPS)
+        try:
+            complete = work(deadline)
+        except sqlite3.OperationalError as err:
+            if "interrupted" not in str(err):
+                raise
+            complete = False
+        finally:
+            self.db.db.set_progress_handler(None, 0)
+        step: Final[Step] = Step(name=name, seconds=time.monotonic() - start, complete=complete)
+        if not complete:
+            self.log.debug("Maintenance step %s ran out of time", name)
+        return step
+
+    def optimize(self, _deadline: float) -> bool:
+        """Update the statistics of the query planner where needed."""
+        self.db.db.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}").fetchall()
+        self.db.db.execute("PRAGMA optimize").fetchall()
+        return True
+
+    def checkpoint(self, deadline: float) -> bool:
+        """Copy the WAL back into the database, and truncate it if it has
+        grown large. The truncating checkpoint has to wait for readers to
+        finish and keeps writers out meanwhile, so it waits no longer than
+        the budget allows."""
+        busy, log, done = self.db.db.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+        if busy != 0 or log != done:
+            return False
+        try:
+            if os.stat(self.db.path + "-wal").st_size <= WAL_LIMIT:
+                return True
+        except FileNotFoundError:
+            return True
+        wait: Final[int] = max(1, int((deadline - time.monotonic()) * 1000))
+        self.db.db.execute(f"PRAGMA busy_timeout = {wait}").fetchall()
+        try:
+            busy, _, _ = self.db.db.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        finally:
+            timeout = int(config.get().busy_timeout * 1000)
+            self.db.db.execute(f"PRAGMA busy_timeout = {timeout}").fetchall()
+        return busy == 0
+
+    def vacuum(self, deadline: float) -> bool:
+        """Return free pages to the file system, a few at a time, until
+        there are none left or the time is up."""
+        if self._pragma("auto_vacuum") != 2:
+            return True
+        while self._pragma("freelist_count") > 0:
+            if time.monotonic() > deadline:
+                return False
+            # incremental_vacuum frees one page per step, and execute only
+            # takes the first one, executescript runs it to the end.
+            self.db.db.executescript(f"PRAGMA incremental_vacuum({VACUUM_STEP})")
+        return True
+
+    def run(self) -> Report:
+        """Run all steps of the maintenance and report what they did."""
+        before: Final[Usage] = self.usage()
+        steps: Final[list[Step]] = [
+            self._timed("optimize", OPTIMIZE_BUDGET, self.optimize),
+            self._timed("checkpoint", CHECKPOINT_BUDGET, self.checkpoint),
+            self._timed("vacuum", VACUUM_BUDGET, self.vacuum),
+        ]
+        report: Final[Report] = Report(before=before, after=self.usage(), steps=steps)
+        self.log.info("Database maintenance took %.1f ms, freed %d pages, WAL is %s",
+                      sum(s.seconds for s in steps) * 1000,
+                      before.pages - report.after.pages,
+                      common.fmt_bytes(report.after.wal_size))
+        return report
+
+    def rebuild(self) -> Report:
+        """Rebuild the database file with a full VACUUM, and enable
+        incremental vacuuming while we are at it. This takes as long as it
+        takes and blocks everyone else meanwhile, so it only happens when
+        the user asks for it."""
+        before: Final[Usage] = self.usage()
+        start: Final[float] = time.monotonic()
+        self.db.db.execute("PRAGMA auto_vacuum = INCREMENTAL").fetchall()
+        self.db.db.execute("VACUUM")
+        step: Final[Step] = Step(name="rebuild", seconds=time.monotonic() - start, complete=True)
+        return Report(before=before, after=self.usage(), steps=[step])
+
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-19 11:02:17 krylon>
+#
+# /data/code/python/cephalopod/model.py
+# created on 19. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/gpl-3.0
+
+"""
+cephalopod.model
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+from collections import OrderedDict
+from collections.abc import Mapping
+from enum import Enum, IntEnum, IntFlag, auto
+from typing import Callable, Final, Optional
+
+import gi  # type: ignore
+
+from cephalopod import common, config
+from cephalopod.cast import Episode, Feed
+from cephalopod.database import Database
+from cephalopod.snapshot import EpisodeKeys
+
+gi.require_version("Gtk", "3.0")
+
+from gi.repository import \
+    GObject as gobject  # noqa: E402 pylint: disable-msg=C0413,C0411 # type: ignore
+from gi.repository import \
+    Gtk as gtk  # noqa: E402 pylint: disable-msg=C0413,C0411 # type: ignore
+
+# How many titles we load from the database in one go when we hit a row that
+# is not cached.
+PAGE_SIZE: Final[int] = 128
+
+
+class Column(IntEnum):
+    """The columns of the EpisodeModel. The hidden columns hold raw values
+    the view uses for sorting and filtering, the display columns format them
+    using cell data functions."""
+    ID = 0
+    Feed = 1
+    Number = 2
+    Published = 3
+    Title = 4
+    Duration = 5
+    Position = 6
+    Flags = 7
+    FeedID = 8
+
+
+COLUMN_TYPES: Final[tuple] = (
+    gobject.TYPE_INT,     # Episode ID
+    gobject.TYPE_STRING,  # Feed name
+    gobject.TYPE_INT,     # Episode number
+    gobject.TYPE_INT64,   # Date published, seconds since the epoch
+    gobject.TYPE_STRING,  # Episode Title
+    gobject.TYPE_INT,     # Duration in seconds, <= 0 if unknown
+    gobject.TYPE_INT,     # Playback position in seconds
+    gobject.TYPE_INT,     # Flags
+    gobject.TYPE_INT,     # Feed ID
+)
+
+
+class Flag(IntFlag):
+    """Precomputed per-Episode flags used for filtering."""
+    Finished = auto()
+    Keep = auto()
+    Downloaded = auto()
+    Started = auto()
+
+
+class View(Enum):
+    """The subsets of Episodes the episode list can display."""
+    All = auto()
+    Unplayed = auto()
+    Started = auto()
+    Downloaded = auto()
+    Kept = auto()
+
+
+class EpisodeModel(gobject.GObject, gtk.TreeModel):  # pylint: disable-msg=R0902
+    """EpisodeModel is a flat, lazy TreeModel for the episode list.
+
+    Instead of copying the entire library into a ListStore, it holds the
+    Episode IDs and the numeric keys we sort and filter by in compact arrays.
+    The titles of the rows that are actually displayed are loaded from the
+    database in pages and kept in a bounded LRU cache.
+
+    The model is meant to be wrapped in a TreeModelFilter (see is_visible)
+    and a TreeModelSort, so switching views and sorting never touch the
+    database.
+
+    The iterators we hand out store the row index plus one in their
+    user_data field, so that row 0 does not end up as a NULL pointer."""
+
+    def __init__(self, get_db: Callable[[], Database]) -> None:
+        super().__init__()
+        self.log = common.get_logger("EpisodeModel")
+        self.get_db: Final[Callable[[], Database]] = get_db
+        self.keys: EpisodeKeys = EpisodeKeys()
+        self.titles: OrderedDict[int, str] = OrderedDict()
+        self.cache_size: Final[int] = config.get().title_cache
+        self.feeds: Mapping[int, Feed] = {}
+        self.feed_titles: dict[int, str] = {}
+        self.view: View = View.All
+        self.feed_id: Optional[int] = None
+        self.stamp: int = 1
+
+    def set_keys(self, keys: EpisodeKeys) -> None:
+        """Replace the Episode keys, e.g. after loading them with fetch_keys.
+
+        Since this replaces all rows at once without emitting a signal for
+        each of them, the caller should detach the model from its view while
+        doing so."""
+        self.keys = keys
+        self.stamp += 1
+        self.log.debug("Set keys for %d episodes", len(keys))
+
+    def set_titles(self, titles: dict[int, str]) -> None:
+        """Prime the title cache, e.g. from a snapshot."""
+        self.titles = OrderedDict(titles)
+
+    def set_feed_titles(self, titles: dict[int, str]) -> None:
+        """Set the mapping of Feed IDs to titles displayed in the Feed column
+        until set_feeds is called, e.g. from a snapshot."""
+        self.feed_titles = titles
+
+    def set_feeds(self, feeds: Mapping[int, Feed]) -> None:
+        """Set the Feeds whose titles are displayed in the Feed column. This
+        is meant to be the mapping returned by Database.feed_map, which
+        holds the Feed objects themselves, so renamed Feeds show, but
+        Feeds added later only show once it is set again."""
+        self.feeds = feeds
+        self.feed_titles = {}
+
+    def set_view(self, view: View, feed_id: Optional[int] = None) -> None:
+        """Set the subset of Episodes is_visible reports as visible.
+        The caller has to refilter the TreeModelFilter afterwards."""
+        self.view = view
+        self.feed_id = feed_id
+
+    def is_visible(self, it: gtk.TreeIter) -> bool:
+        """Return True if the row at the given iterator belongs to the
+        current view. Suitable as the visible function of a TreeModelFilter."""
+        idx: Final[int] = it.user_data - 1
+        if self.feed_id is not None and self.keys.feed_ids[idx] != self.feed_id:
+            return False
+
+        flags: Final[int] = self.keys.flags[idx]
+        match self.view:
+            case View.Unplayed:
+                return not flags & Flag.Finished
+            case View.Started:
+                return bool(flags & Flag.Started) and not flags & Flag.Finished
+            case View.Downloaded:
+                return bool(flags & Flag.Downloaded)
+            case View.Kept:
+                return bool(flags & Flag.Keep)
+        return True
+
+    def invalidate(self, epid: int) -> None:
+        """Drop the cached title for the given Episode, so it is reloaded from
+        the database next time it is displayed."""
+        self.titles.pop(epid, None)
+
+    def _feed_title(self, fid: int) -> str:
+        f: Final[Optional[Feed]] = self.feeds.get(fid)
+        return f.title if f is not None else self.feed_titles.get(fid, "")
+
+    def _title(self, idx: int) -> str:
+        """Return the title of the Episode at index idx, loading it from
+        the database if necessary."""
+        epid: Final[int] = self.keys.ids[idx]
+        try:
+            self.titles.move_to_end(epid)
+            return self.titles[epid]
+        except KeyError:
+            pass
+
+        # Load the requested row and a page of rows around it, since the
+        # view is going to ask for those rows very soon, as well.
+        lo: Final[int] = max(0, idx - PAGE_SIZE // 4)
+        hi: Final[int] = min(len(self.keys), lo + PAGE_SIZE)
+        missing: Final[list[int]] = [i for i in self.keys.ids[lo:hi] if i not in self.titles]
+        episodes: Final[list[Episode]] = self.get_db().episode_get_by_ids(missing)
+        for e in episodes:
+            self.titles[e.epid] = e.title
+
+        while len(self.titles) > self.cache_size:
+            self.titles.popitem(last=False)
+
+        # If the Episode was deleted after we loaded the keys, we display
+        # an empty title rather than crash.
+        return self.titles.get(epid, "")
+
+    def _iter(self, idx: int) -> gtk.TreeIter:
+        it = gtk.TreeIter()
+        it.stamp = self.stamp
+        it.user_data = idx + 1
+        return it
+
+    # TreeModel interface
+
+    def do_get_flags(self) -> gtk.TreeModelFlags:  # pylint: disable-msg=W0221
+        return gtk.TreeModelFlags.LIST_ONLY
+
+    def do_get_n_columns(self) -> int:  # pylint: disable-msg=W0221
+        return len(COLUMN_TYPES)
+
+    def do_get_column_type(self, col: int):  # pylint: disable-msg=W0221
+        return COLUMN_TYPES[col]
+
+    def do_get_iter(self, path: gtk.TreePath):  # pylint: disable-msg=W0221
+        idx: Final[int] = path.get_indices()[0]
+        if idx < len(self.keys):
+            return (True, self._iter(idx))
+        return (False, None)
+
+    def do_get_path(self, it: gtk.TreeIter) -> gtk.TreePath:  # pylint: disable-msg=W0221
+        return gtk.TreePath((it.user_data - 1, ))
+
+    def do_get_value(self, it: gtk.TreeIter, col: int):  # pylint: disable-msg=W0221,R0911
+        idx: Final[int] = it.user_data - 1
+        match col:
+            case Column.ID:
+                return self.keys.ids[idx]
+            case Column.Feed:
+                return self._feed_title(self.keys.feed_ids[idx])
+            case Column.Number:
+                return self.keys.numbers[idx]
+            case Column.Published:
+                return self.keys.published[idx]
+            case Column.Title:
+                return self._title(idx)
+            case Column.Duration:
+                return self.keys.durations[idx]
+            case Column.Position:
+                return self.keys.positions[idx]
+            case Column.Flags:
+                return self.keys.flags[idx]
+            case Column.FeedID:
+                return self.keys.feed_ids[idx]
+        raise ValueError(f"Invalid column {col}")
+
+    def do_iter_next(self, it: gtk.TreeIter) -> bool:  # pylint: disable-msg=W0221
+        idx: Final[int] = it.user_data
+        if idx < len(self.keys):
+            it.user_data = idx + 1
+            return True
+        return False
+
+    def do_iter_previous(self, it: gtk.TreeIter) -> bool:  # pylint: disable-msg=W0221
+        idx: Final[int] = it.user_data - 1
+        if idx > 0:
+            it.user_data = idx
+            return True
+        return False
+
+    def do_iter_children(self, parent: Optional[gtk.TreeIter]):  # pylint: disable-msg=W0221
+        if parent is None and len(self.keys) > 0:
+            return (True, self._iter(0))
+        return (False, None)
+
+    def do_iter_has_child(self, _it: gtk.TreeIter) -> bool:  # pylint: disable-msg=W0221
+        return False
+
+    def do_iter_n_children(self, it: Optional[gtk.TreeIter]) -> int:  # pylint: disable-msg=W0221
+        if it is None:
+            return len(self.keys)
+        return 0
+
+    def do_iter_nth_child(self,  # pylint: disable-msg=W0221
+                          parent: Optional[gtk.TreeIter],
+                          n: int):
+        if parent is None and n < len(self.keys):
+            return (True, self._iter(n))
+        return (False, None)
+
+    def do_iter_parent(self, _child: gtk.TreeIter):  # pylint: disable-msg=W0221
+        return (False, None)
+
+
+def fetch_keys(db: Database) -> EpisodeKeys:
+    """Load the keys of all Episodes from the database.
+
+    This does not touch any GTK objects, so it can be run in a background
+    thread, as long as that thread uses its own Database."""
+    keys: Final[EpisodeKeys] = EpisodeKeys()
+
+    for row in db.episode_get_keys():
+        keys.ids.append(row[0])
+        keys.feed_ids.append(row[1])
+        keys.numbers.append(row[2])
+        keys.published.append(row[3])
+        keys.positions.append(row[4])
+        keys.durations.append(row[5])
+        keys.flags.append(make_flags(row[6], row[7], row[8], row[4] > 0))
+
+    return keys
+
+
+def make_flags(finished: bool, keep: bool, downloaded: bool, started: bool) -> int:
+    """Combine the filter flags for a single Episode."""
+    flags: int = 0
+    if finished:
+        flags |= Flag.Finished
+    if keep:
+        flags |= Flag.Keep
+    if downloaded:
+        flags |= Flag.Downloaded
+    if started:
+        flags |= Flag.Started
+    return flags
+
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-19 17:41:05 krylon>
+#
+# /data/code/python/cephalopod/opml.py
+# created on 19. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/gpl-3.0
+
+"""
+cephalopod.opml
+
+(c) 2026 Benjamin Walkenhorst
+
+Read and write subscription lists in OPML, the format every other
+podcatcher imports and exports. Both directions work incrementally, so
+the size of the file does not matter.
+"""
+
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from typing import IO, Final, Iterable, Iterator, Union
+from xml.sax.saxutils import escape, quoteattr
+
+from cephalopod import common
+from cephalopod.cast import Feed
+
+
+def read(src: Union[str, IO[bytes]]) -> Iterator[tuple[str, str]]:
+    """Read an OPML file and yield the URL and title of every feed listed
+    in it. Outlines may be nested in folders, outlines without an xmlUrl
+    are skipped."""
+    # The elements we are inside of. Once an element ends, we detach it
+    # from its parent, so the tree never holds more than the path to the
+    # element we are looking at, no matter how large the file is.
+    path: Final[list[ET.Element]] = []
+    for event, elem in ET.iterparse(src, events=("start", "end")):
+        if event == "start":
+            path.append(elem)
+            continue
+        path.pop()
+        if path:
+            path[-1].remove(elem)
+        if elem.tag != "outline":
+            continue
+        url = elem.get("xmlUrl", "").strip()
+        if url != "":
+            yield url, elem.get("text", elem.get("title", ""))
+
+
+def urls(path: str) -> Iterator[str]:
+    """Yield the feed URLs listed in a file, which is either an OPML file
+    or a plain text file listing one URL per line."""
+    with open(path, "rb") as fh:
+        if fh.read(256).lstrip(b"\xef\xbb\xbf \t\r\n").startswith(b"<"):
+            fh.seek(0)
+            yield from (url for url, _title in read(fh))
+            return
+        fh.seek(0)
+        for line in fh:
+            url = str(line, "utf-8").strip()
+            if url != "" and not url.startswith("#"):
+                yield url
+
+
+def write(feeds: Iterable[Feed], fh: IO[str]) -> int:
+    """Write an OPML file listing the given Feeds and return the number of
+    Feeds written."""
+    now: Final[str] = datetime.now(timezone.utc).strftime("%a, %d %b %Y %H:%M:%S GMT")
+    fh.write('<?xml version="1.0" encoding="utf-8"?>\n')
+    fh.write('<opml version="2.0">\n')
+    fh.write("  <head>\n")
+    fh.write(f"    <title>{escape(common.APP_NAME)} subscriptions</title>\n")
+    fh.write(f"    <dateCreated>{now}</dateCreated>\n")
+    fh.write("  </head>\n")
+    fh.write("  <body>\n")
+    cnt: int = 0
+    for f in feeds:
+        fh.write(f'    <outline type="rss" text={quoteattr(f.title)} '
+                 f'title={quoteattr(f.title)} xmlUrl={quoteattr(f.feed_url)} '
+                 f'htmlUrl={quoteattr(f.homepage)}/>\n')
+        cnt += 1
+    fh.write("  </body>\n")
+    fh.write("</opml>\n")
+    return cnt
+
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-19 18:20:44 krylon>
+#
+# /data/code/python/cephalopod/paging.py
+# created on 19. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/gpl-3.0
+
+"""
+cephalopod.paging
+
+(c) 2026 Benjamin Walkenhorst
+
+Find the pages of paged and archived feeds (RFC 5005). Many podcast
+feeds only list the most recent episodes and link to the rest of the
+back catalogue in further documents.
+
+Paged feeds link to the next page of older entries with rel="next",
+archived feeds with rel="prev-archive". Following these links is
+inherently sequential, but if the feed also links to its first and last
+page, and those only differ in a page number, we can compute the URLs of
+all pages in between and fetch them at the same time.
+"""
+
+from typing import Final, Optional
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+# The link relations that point to older entries.
+OLDER_RELS: Final[tuple[str, ...]] = ("next", "prev-archive")
+# Guard against absurd page counts.
+MAX_PAGES: Final[int] = 1000
+
+
+def links(d) -> dict[str, str]:
+    """Return the absolute URLs of the feed-level links of a parsed
+    document, by relation."""
+    base: Final[str] = d.get("headers", {}).get("content-location", "")
+    result: dict[str, str] = {}
+    for lnk in d["feed"].get("links", []):
+        if "href" in lnk and "rel" in lnk:
+            result.setdefault(lnk["rel"], urljoin(base, lnk["href"]))
+    return result
+
+
+def older(d) -> Optional[str]:
+    """Return the URL of the page with the next older entries, if any."""
+    lnk: Final[dict[str, str]] = links(d)
+    for rel in OLDER_RELS:
+        if rel in lnk:
+            return lnk[rel]
+    return None
+
+
+def _page_number(url: str) -> tuple[str, Optional[str], int]:
+    """Split a URL into the URL without its query, the name of the query
+    parameter that looks like a page number, and its value."""
+    parts = urlsplit(url)
+    base: Final[str] = urlunsplit(parts._replace(query="", fragment=""))
+    for key, value in parse_qsl(parts.query):
+        if value.isdigit():
+            return base, key, int(value)
+    return base, None, 0
+
+
+def numbered_pages(d) -> list[str]:
+    """If the first and the last page of a paged feed only differ in a page
+    number, return the URLs of all pages from the first to the last.
+    Otherwise, return an empty list."""
+    lnk: Final[dict[str, str]] = links(d)
+    if "last" not in lnk:
+        return []
+    first: Final[str] = lnk.get("first", lnk.get("self", ""))
+    fbase, fkey, fnum = _page_number(first)
+    lbase, lkey, lnum = _page_number(lnk["last"])
+    if lkey is None or fbase != lbase or (fkey is not None and fkey != lkey):
+        return []
+    # The first page often has no page number at all, then we start at
+    # 1 (or 0, if that is where the last page is).
+    lo: Final[int] = fnum if fkey is not None else min(1, lnum)
+    if lnum < lo or lnum - lo > MAX_PAGES:
+        return []
+
+    parts = urlsplit(lnk["last"])
+    query: Final[list[tuple[str, str]]] = parse_qsl(parts.query)
+    pages: list[str] = []
+    for n in range(lo, lnum + 1):
+        q = [(k, str(n) if k == lkey else v) for k, v in query]
+        pages.append(urlunsplit(parts._replace(query=urlencode(q))))
+    return pages
+
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-20 02:48:19 krylon>
+#
+# /data/code/python/cephalopod/playqueue.py
+# created on 20. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/gpl-3.0
+
+"""
+cephalopod.playqueue
+
+(c) 2026 Benjamin Walkenhorst
+
+The queue of Episodes to listen to next.
+
+Rather than numbering the Episodes in the queue, which would mean
+renumbering every Episode behind the one that is moved, each Episode has
+a rank, a string of base-62 digits, and the queue is ordered by rank.
+Between any two ranks there is another one, so adding, moving or
+removing an Episode changes exactly one row.
+
+Ranks read as fractions: "V" is about one half, "V1" a tiny bit more.
+None of them ends in "0", so there is room below each one, too. Moving
+Episodes to the same spot over and over makes the ranks there longer,
+so once one has grown past RANK_MAX digits, rebalance spreads the ranks
+out evenly again. The daemon does that when it is idle.
+"""
+
+import logging
+from typing import Final, Optional
+
+from cephalopod import common
+from cephalopod.database import Database
+
+# The digits of a rank, in the order of their ASCII codes, so SQLite
+# sorts ranks the same way Python does.
+DIGITS: Final[str] = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+BASE: Final[int] = len(DIGITS)
+# Ranks longer than this get the queue rebalanced.
+RANK_MAX: Final[int] = 8
+
+
+def rank_between(lo: str, hi: Optional[str]) -> str:
+    """Return a rank that sorts after lo and before hi. An empty lo means
+    the start of the queue, None for hi its end.
+
+    At either end of the queue, the new rank is one step away from its
+    neighbour rather than halfway to the end, so adding Episodes at the
+    end over and over uses up a digit only every 61 times."""
+    if hi is not None:
+        if lo >= hi:
+            raise ValueError(f"Rank {lo!r} is not less than {hi!r}")
+        # Skip the digits lo and hi have in common, with lo padded with
+        # zeros.
+        n: int = 0
+        while n < len(hi) and (lo[n] if n < len(lo) else DIGITS[0]) == hi[n]:
+            n += 1
+        if n > 0:
+            return hi[:n] + rank_between(lo[n:], hi[n:])
+
+    a: Final[int] = DIGITS.index(lo[0]) if lo != "" else 0
+    b: Final[int] = DIGITS.index(hi[0]) if hi is not None else BASE
+    if b - a > 1:
+        if hi is None and lo != "":
+            return DIGITS[a + 1]
+        if lo == "" and hi is not None:
+            return DIGITS[b - 1]
+        return DIGITS[(a + b) // 2]
+    # The first digits are adjacent. If hi has more digits, its first one
+    # on its own sorts between the two. Otherwise we keep the first digit
+    # of lo and look for a rank after the rest of it, starting over at
+    # the far end of the next digit if we are at either end of the queue.
+    if hi is not None and len(hi) > 1:
+        return hi[0]
+    if lo == "":
+        return DIGITS[0] + DIGITS[-1]
+    if hi is None and len(lo) == 1:
+        return lo + DIGITS[1]
+    return DIGITS[a] + rank_between(lo[1:], None)
+
+
+def rank_spread(cnt: int) -> list[str]:
+    """Return cnt ranks, spread evenly and as short as possible."""
+    width: int = 1
+    while BASE ** width <= cnt:
+        width += 1
+    step: Final[int] = BASE ** width // (cnt + 1)
+    ranks: Final[list[str]] = []
+    for i in range(1, cnt + 1):
+        n = i * step
+        digits: list[str] = []
+        for _ in range(width):
+            n, d = divmod(n, BASE)
+            digits.append(DIGITS[d])
+        ranks.append("".join(reversed(digits)).rstrip(DIGITS[0]))
+    return ranks
+
+
+class PlayQueue:
+    """PlayQueue keeps the Episodes the user wants to listen to next, in
+    order. Each method runs in a transaction of its own."""
+
+    __slots__ = [
+        "log",
+        "db",
+    ]
+
+    log: logging.Logger
+    db: Database
+
+    def __init__(self, db: Database) -> None:
+        self.log = common.get_logger("PlayQueue")
+        self.db = db
+
+    def next(self, cnt: int = 10) -> list[int]:
+        """Return the IDs of the first cnt Episodes in the queue."""
+        return [epid for epid, _ in self.db.queue_get(cnt)]
+
+    def add(self, epid: int) -> str:
+        """Add an Episode to the end of the queue, or move it there if it
+        is queued already. Returns its new rank."""
+        with self.db:
+            last: Final[Optional[str]] = self.db.queue_rank_last()
+            if last is not None and self.db.queue_rank(epid) == last:
+                return last
+            rank: Final[str] = rank_between(last or "", None)
+            self.db.queue_set(epid, rank)
+        return rank
+
+    def move(self, epid: int, after: Optional[int] = None) -> str:
+        """Put an Episode right behind the Episode after, or at the start
+        of the queue if after is None, whether it is queued already or
+        not. Returns its new rank."""
+        if after == epid:
+            raise ValueError(f"Cannot move episode {epid} behind itself")
+        with self.db:
+            lo: str = ""
+            if after is not None:
+                rank = self.db.queue_rank(after)
+                if rank is None:
+                    raise ValueError(f"Episode {after} is not in the queue")
+                lo = rank
+            hi: Final[Optional[str]] = self.db.queue_rank_after(lo)
+            if hi is not None and self.db.queue_rank(epid) == hi:
+                return hi
+            new: Final[str] = rank_between(lo, hi)
+            self.db.queue_set(epid, new)
+        if len(new) > RANK_MAX:
+            self.log.debug("Rank %s of episode %d is getting long", new, epid)
+        return new
+
+    def remove(self, epid: int) -> bool:
+        """Take an Episode out of the queue. Returns False if it was not
+        in it."""
+        with self.db:
+            return self.db.queue_remove(epid)
+
+    def rebalance(self, force: bool = False) -> int:
+        """Give the Episodes in the queue evenly spread ranks again, if
+        any rank has grown longer than RANK_MAX, or if force is True.
+        Returns the number of Episodes that got a new rank."""
+        with self.db:
+            rows: Final[list[tuple[int, str]]] = self.db.queue_get()
+            if not force and all(len(rank) <= RANK_MAX for _, rank in rows):
+                return 0
+            self.db.queue_replace(zip((epid for epid, _ in rows), rank_spread(len(rows))))
+        self.log.info("Rebalanced the queue of %d episodes", len(rows))
+        return len(rows)
+
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-19 15:47:55 krylon>
+#
+# /data/code/python/cephalopod/probe.py
+# created on 19. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/gpl-3.0
+
+"""
+cephalopod.probe
+
+(c) 2026 Benjamin Walkenhorst
+
+Find out how long an Episode is without downloading it, by reading only
+the headers at the start (and, for MP4 files, the end) of the enclosure
+with HTTP Range requests.
+"""
+
+import logging
+import re
+import struct
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+from typing import Callable, Final, Optional
+
+from cephalopod import common
+from cephalopod.cast import Episode
+from cephalopod.database import Database
+from cephalopod.scheduler import FetchScheduler
+
+# How many bytes we read from the start of a file at first.
+HEAD_SIZE: Final[int] = 16 * 1024
+# How many probes run concurrently.
+PROBE_CNT: Final[int] = 4
+# How many Episodes we probe in one go.
+BATCH_SIZE: Final[int] = 64
+PROBE_TIMEOUT: Final[float] = 15.0
+# How many seconds we leave an Episode alone after failing to reach the
+# server it lives on.
+PROBE_RETRY: Final[float] = 3600.0
+
+# Fetch is called with an offset and a length and returns the data at that
+# position, which may be shorter than requested at the end of the file, or
+# empty if we cannot get there without downloading everything before it.
+Fetch = Callable[[int, int], bytes]
+
+# Bitrates in kbit/s, indexed by [MPEG-1?][layer][bitrate index]
+_MP3_BITRATES: Final[dict[tuple[bool, int], tuple[int, ...]]] = {
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+# Sample rates, indexed by the version bits of the frame header
+_MP3_SAMPLERATES: Final[dict[int, tuple[int, int, int]]] = {
+    3: (44100, 48000, 32000),  # MPEG-1
+    2: (22050, 24000, 16000),  # MPEG-2
+    0: (11025, 12000, 8000),   # MPEG-2.5
+}
+
+_duration_pat: Final[re.Pattern] = re.compile(r"^(?:(?:(\d+):)?(\d+):)?(\d+)(?:\.\d*)?$")
+
+
+def parse_itunes_duration(s: str) -> int:
+    """Parse the value of an itunes:duration element, which is either a
+    number of seconds, or MM:SS, or HH:MM:SS. Return 0 if the value cannot
+    be parsed."""
+    m = _duration_pat.match(s.strip())
+    if m is None:
+        return 0
+    hours, minutes, seconds = (int(x) if x is not None else 0 for x in m.groups())
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def _id3_size(head: bytes) -> int:
+    """Return the size of the ID3v2 tag at the start of head, including its
+    header, or 0 if there is none."""
+    if len(head) < 10 or head[:3] != b"ID3":
+        return 0
+    size: Final[int] = (head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9]
+    footer: Final[int] = 10 if head[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def mp3_duration(fetch: Fetch, size: int) -> Optional[float]:
+    """Compute the duration of an MP3 file of the given size from its
+    first frame, using the Xing/Info or VBRI header if there is one, or
+    assuming a constant bitrate otherwise."""
+    head: bytes = fetch(0, HEAD_SIZE)
+    start: Final[int] = _id3_size(head)
+    if start > 0:
+        head = fetch(start, HEAD_SIZE)
+
+    # Find the first frame header
+    for i in range(len(head) - 4):
+        if head[i] != 0xFF or head[i + 1] & 0xE0 != 0xE0:
+            continue
+        version: int = (head[i + 1] >> 3) & 3
+        layer: int = 4 - ((head[i + 1] >> 1) & 3)
+        br_idx: int = head[i + 2] >> 4
+        sr_idx: int = (head[i + 2] >> 2) & 3
+        if version == 1 or layer == 4 or br_idx in (0, 15) or sr_idx == 3:
+            continue
+        break
+    else:
+        return None
+
+    mpeg1: Final[bool] = version == 3
+    mono: Final[bool] = (head[i + 3] >> 6) == 3
+    rate: Final[int] = _MP3_SAMPLERATES[version][sr_idx]
+    bitrate: Final[int] = _MP3_BITRATES[(mpeg1, layer)][br_idx] * 1000
+    samples: Final[int] = 384 if layer == 1 else (1152 if mpeg1 or layer == 2 else 576)
+
+    # The Xing header follows the side information, the VBRI header is
+    # always 32 bytes after the frame header.
+    side: Final[int] = (17 if mono else 32) if mpeg1 else (9 if mono else 17)
+    xing: Final[int] = i + 4 + side
+    if head[xing:xing+4] in (b"Xing", b"Info"):
+        flags: Final[int] = struct.unpack_from(">I", head, xing + 4)[0]
+        if flags & 1:
+            frames = struct.unpack_from(">I", head, xing + 8)[0]
+            return frames * samples / rate
+    vbri: Final[int] = i + 4 + 32
+    if head[vbri:vbri+4] == b"VBRI":
+        frames = struct.unpack_from(">I", head, vbri + 14)[0]
+        return frames * samples / rate
+
+    if size <= 0:
+        return None
+    audio: int = size - start - i
+    if size >= 128 and fetch(size - 128, 128)[:3] == b"TAG":
+        audio -= 128
+    return audio * 8 / bitrate
+
+
+def mp4_duration(fetch: Fetch, size: int) -> Optional[float]:
+    """Compute the duration of an MP4/M4A file from the mvhd atom, which
+    lives in the moov atom, which may be at the start or at the end of the
+    file. We walk the top-level atoms, skipping the (large) mdat atom, and
+    only read the first few KB of moov."""
+    offset: int = 0
+    data: bytes = fetch(0, HEAD_SIZE)
+    base: int = 0  # The file offset of data[0]
+
+    while True:
+        if offset + 8 > base + len(data):
+            if size > 0 and offset + 8 > size:
+                return None
+            base, data = offset, fetch(offset, HEAD_SIZE)
+            if len(data) < 8:
+                return None
+        rel: int = offset - base
+        length, kind = struct.unpack_from(">I4s", data, rel)
+        hdr: int = 8
+        if length == 1:
+            if rel + 16 > len(data):
+                base, data = offset, fetch(offset, HEAD_SIZE)
+                continue
+            length = struct.unpack_from(">Q", data, rel + 8)[0]
+            hdr = 16
+        elif length == 0:
+            length = (size - offset) if size > 0 else 0
+
+        if kind == b"moov":
+            if rel + HEAD_SIZE // 2 > len(data):
+                base, data = offset, fetch(offset, HEAD_SIZE)
+                rel = 0
+            pos: int = data.find(b"mvhd", rel + hdr)
+            if pos < 0:
+                return None
+            version: int = data[pos + 4]
+            if version == 1:
+                timescale, duration = struct.unpack_from(">IQ", data, pos + 4 + 4 + 16)
+            else:
+                timescale, duration = struct.unpack_from(">II", data, pos + 4 + 4 + 8)
+            return duration / timescale if timescale > 0 else None
+
+        if length < hdr:
+            return None
+        offset += length
+
+
+def fetch_range(url: str, offset: int, length: int) -> tuple[bytes, int, bool]:
+    """Fetch length bytes at offset from url. Returns the data, the total
+    size of the resource, which is -1 if the server did not tell us, and
+    whether the server honoured the Range header.
+
+    If it did not, it sends the whole file, and we read no further than
+    the first length bytes: the data is the start of the file if offset
+    is 0, and empty otherwise."""
+    req = urllib.request.Request(url, headers={
+        "Range": f"bytes={offset}-{offset+length-1}",
+        "User-Agent": f"{common.APP_NAME}/{common.APP_VERSION}",
+    })
+    with urllib.request.urlopen(req, timeout=PROBE_TIMEOUT) as res:
+        if res.status == 206:
+            tail = res.headers.get("Content-Range", "").rsplit("/", 1)[-1]
+            return res.read(length), int(tail) if tail.isdigit() else -1, True
+        clen = res.headers.get("Content-Length", "")
+        total: Final[int] = int(clen) if clen.isdigit() else -1
+        return (res.read(length) if offset == 0 else b""), total, False
+
+
+def probe_url(url: str, mime: str, sched: Optional[FetchScheduler] = None) -> Optional[int]:
+    """Determine the duration of the media file at url in seconds. If sched
+    is given, each request waits for a slot on the server's host."""
+
+    def get(offset: int, length: int) -> tuple[bytes, int, bool]:
+        with sched.slot(url) if sched is not None else nullcontext():
+            return fetch_range(url, offset, length)
+
+    head, size, ranged = get(0, HEAD_SIZE)
+
+    def fetch(offset: int, length: int) -> bytes:
+        # Both parsers start by reading the head, which we already have.
+        # If the server does not support ranges, the head is all we get,
+        # the parsers give up on anything beyond it.
+        if offset + length <= len(head) or not ranged:
+            return head[offset:offset+length]
+        return get(offset, length)[0]
+
+    seconds: Optional[float]
+    if "mp4" in mime or "m4a" in mime or head[4:8] == b"ftyp":
+        seconds = mp4_duration(fetch, size)
+    else:
+        seconds = mp3_duration(fetch, size)
+    return round(seconds) if seconds is not None else None
+
+
+class Prober:
+    """Prober determines the duration of Episodes we do not know the
+    duration of, yet, in a bounded pool of threads. Its requests count
+    against the per-host limits of the FetchScheduler."""
+
+    __slots__ = [
+        "log",
+        "db",
+        "sched",
+        "pool",
+        "retry",
+    ]
+
+    log: logging.Logger
+    db: Database
+    sched: FetchScheduler
+    pool: ThreadPoolExecutor
+    # The Episodes whose server we could not reach, by ID, with the
+    # monotonic time until which we leave them alone.
+    retry: dict[int, float]
+
+    def __init__(self, db: Database, sched: FetchScheduler, workers: int = PROBE_CNT) -> None:
+        self.log = common.get_logger("Prober")
+        self.db = db
+        self.sched = sched
+        self.pool = ThreadPoolExecutor(workers, thread_name_prefix="probe")
+        self.retry = {}
+
+    def close(self) -> None:
+        """Shut down the pool of threads."""
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+    def run(self, limit: int = BATCH_SIZE) -> int:
+        """Probe up to limit Episodes and store the results.
+        Returns the number of Episodes whose duration we found out.
+
+        An Episode is marked as failed only if we got its file and could
+        not make sense of it. If we could not get the file, we try again
+        after PROBE_RETRY seconds."""
+        now: Final[float] = time.monotonic()
+        self.retry = {epid: t for epid, t in self.retry.items() if t > now}
+        # The Episodes we wait for come first, more often than not, so
+        # fetch enough to fill the batch without them.
+        episodes: Final[list[Episode]] = \
+            [e for e in self.db.episode_get_no_duration(limit + len(self.retry))
+             if e.epid not in self.retry][:limit]
+        if len(episodes) == 0:
+            return 0
+
+        futures = {self.pool.submit(probe_url, e.url, e.mime_type, self.sched): e
+                   for e in episodes}
+        results: list[tuple[int, int]] = []
+        for fut in as_completed(futures):
+            e = futures[fut]
+            try:
+                seconds = fut.result()
+            except OSError as err:
+                # urllib.error.URLError is an OSError, too.
+                self.log.info("Cannot fetch %s (%s), try again later: %s", e.title, e.url, err)
+                self.retry[e.epid] = time.monotonic() + PROBE_RETRY
+                continue
+            except Exception as err:  # pylint: disable-msg=W0718
+                self.log.error("Cannot probe %s (%s): %s", e.title, e.url, err)
+                seconds = None
+            results.append((e.epid, seconds if seconds is not None and seconds > 0 else -1))
+
+        with self.db:
+            self.db.episode_set_durations(results)
+        found: Final[int] = sum(1 for r in results if r[1] > 0)
+        self.log.debug("Probed %d episodes, found %d durations", len(results), found)
+        return found
+
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
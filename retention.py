@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-19 20:21:07 krylon>
+#
+# /data/code/python/cephalopod/retention.py
+# created on 19. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/gpl-3.0
+
+"""
+cephalopod.retention
+
+(c) 2026 Benjamin Walkenhorst
+
+Keep the downloads within their disk quotas. Each Feed may have a quota
+of its own, and there is a global one for all downloads together. When a
+quota is exceeded, we delete the files of Episodes that have been
+listened to and that are not marked to be kept, oldest first, until the
+downloads fit again.
+
+The database knows how much space each download takes up, so finding out
+whether there is anything to do costs a single query, and we never have
+to walk the download folder.
+"""
+
+import logging
+import os
+from collections import defaultdict
+from typing import Final
+
+from cephalopod import common
+from cephalopod.database import Database
+
+# How many files we delete before recording it in the database.
+BATCH_SIZE: Final[int] = 256
+
+
+class Retention:
+    """Retention deletes finished downloads to keep them within their
+    quotas."""
+
+    __slots__ = [
+        "log",
+        "db",
+        "quota",
+    ]
+
+    log: logging.Logger
+    db: Database
+    quota: int
+
+    def __init__(self, db: Database, quota: int = 0) -> None:
+        """Create a Retention engine. quota is the number of bytes all
+        downloads together may take up, 0 means no limit."""
+        self.log = common.get_logger("Retention")
+        self.db = db
+        self.quota = quota
+
+    def plan(self) -> list[tuple[int, str, int]]:
+        """Return the downloads to delete, as tuples of (Episode ID, path,
+        size)."""
+        usage: Final[dict[int, tuple[int, int]]] = self.db.disk_usage()
+        over: Final[dict[int, int]] = {fid: used - quota
+                                       for fid, (quota, used) in usage.items()
+                                       if 0 < quota < used}
+        total_over: int = sum(used for _, used in usage.values()) - self.quota \
+            if self.quota > 0 else 0
+        if len(over) == 0 and total_over <= 0:
+            return []
+
+        doomed: list[tuple[int, str, int]] = []
+        rest: list[tuple[int, str, int]] = []
+        # Feeds over their own quota go first, whatever they free up counts
+        # against the global quota as well.
+        for epid, fid, path, size in self.db.disk_candidates():
+            if over.get(fid, 0) > 0:
+                over[fid] -= size
+                total_over -= size
+                doomed.append((epid, path, size))
+            else:
+                rest.append((epid, path, size))
+        for epid, path, size in rest:
+            if total_over <= 0:
+                break
+            total_over -= size
+            doomed.append((epid, path, size))
+
+        if any(v > 0 for v in over.values()) or total_over > 0:
+            self.log.info("Cannot get downloads below their quota, "
+                          "the rest is unplayed or kept.")
+        return doomed
+
+    def run(self) -> tuple[int, int]:
+        """Delete downloads until all quotas are met, as far as possible.
+        Returns the number of files deleted and the bytes freed."""
+        doomed: Final[list[tuple[int, str, int]]] = self.plan()
+        files: int = 0
+        freed: int = 0
+        for i in range(0, len(doomed), BATCH_SIZE):
+            deleted: list[int] = []
+            for epid, size in unlink_batch(self.log, doomed[i:i+BATCH_SIZE]):
+                deleted.append(epid)
+                freed += size
+            with self.db:
+                self.db.episode_clear_sizes(deleted)
+            files += len(deleted)
+        if files > 0:
+            self.log.info("Deleted %d downloads, freed %s",
+                          files,
+                          common.fmt_bytes(freed))
+        return files, freed
+
+
+def unlink_batch(log: logging.Logger,
+                 batch: list[tuple[int, str, int]]) -> list[tuple[int, int]]:
+    """Delete a batch of files, and return the Episode IDs and the sizes
+    of those that are gone now. Files are grouped by folder, so each folder
+    is only looked up once."""
+    folders: Final[dict[str, list[tuple[int, str, int]]]] = defaultdict(list)
+    for epid, path, size in batch:
+        folders[os.path.dirname(path)].append((epid, os.path.basename(path), size))
+
+    gone: Final[list[tuple[int, int]]] = []
+    for folder, entries in folders.items():
+        try:
+            dfd = os.open(folder, os.O_RDONLY | getattr(os, "O_DIRECTORY", 0))
+        except FileNotFoundError:
+            # The whole folder is gone, and the files with it.
+            gone.extend((epid, size) for epid, _, size in entries)
+            continue
+        try:
+            for epid, name, size in entries:
+                try:
+                    os.unlink(name, dir_fd=dfd)
+                except FileNotFoundError:
+                    pass
+                except OSError as err:
+                    log.error("Cannot delete %s: %s", os.path.join(folder, name), err)
+                    continue
+                gone.append((epid, size))
+        finally:
+            os.close(dfd)
+    return gone
+
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-19 16:32:18 krylon>
+#
+# /data/code/python/cephalopod/scheduler.py
+# created on 19. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/gpl-3.0
+
+"""
+cephalopod.scheduler
+
+(c) 2026 Benjamin Walkenhorst
+
+Decide which queued feed a fetch worker gets next. Feeds are grouped by
+the host they live on, and hosts take turns, so a refresh of many feeds
+from one server neither hammers that server nor keeps the feeds from
+everywhere else waiting. Each host has a limit on concurrent requests and
+a token bucket limiting the rate of requests, and a host that told us to
+back off (HTTP 429 or 503 with Retry-After) is left alone until then.
+"""
+
+import time
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from threading import Condition
+from typing import Any, Final, Iterator, Optional
+from urllib.parse import urlsplit
+
+from cephalopod.cast import Feed
+
+# How many requests we send to a single host at the same time.
+HOST_CONCURRENCY: Final[int] = 2
+# How many requests per second we send to a single host in the long run,
+# and how many we may send in a burst.
+HOST_RATE: Final[float] = 1.0
+HOST_BURST: Final[float] = 4.0
+# If a host asks us to wait longer than this, we do not keep its feeds
+# queued, but give up on them for the current refresh.
+MAX_HOLD: Final[float] = 300.0
+
+
+def host_of(url: str) -> str:
+    """Return the name of the host a URL points to."""
+    return (urlsplit(url).hostname or "").lower()
+
+
+class TokenBucket:
+    """A token bucket that fills up at rate tokens per second, holding up
+    to burst tokens."""
+
+    __slots__ = [
+        "rate",
+        "burst",
+        "tokens",
+        "stamp",
+    ]
+
+    rate: float
+    burst: float
+    tokens: float
+    stamp: float
+
+    def __init__(self, rate: float = HOST_RATE, burst: float = HOST_BURST) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = time.monotonic()
+
+    def delay(self, now: float) -> float:
+        """Return how many seconds from now until a token is available."""
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        return 0.0 if self.tokens >= 1.0 else (1.0 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        """Take a token. delay must have returned 0 right before."""
+        self.tokens -= 1.0
+
+
+class Host:
+    """The queues and the limits of a single host.
+
+    Each host has two lanes, one for Feeds the user is waiting for, and one
+    for the bulk of a regular refresh. The urgent lane is always served
+    first."""
+
+    __slots__ = [
+        "name",
+        "urgent",
+        "bulk",
+        "active",
+        "bucket",
+        "blocked_until",
+    ]
+
+    name: str
+    urgent: deque[Feed]
+    bulk: deque[Feed]
+    active: int
+    bucket: TokenBucket
+    blocked_until: float
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.urgent = deque()
+        self.bulk = deque()
+        self.active = 0
+        self.bucket = TokenBucket()
+        self.blocked_until = 0.0
+
+    def delay(self, now: float) -> Optional[float]:
+        """Return how many seconds from now until we may send the next
+        request to this host, or None if that depends on a running request
+        finishing (or nothing is queued)."""
+        if not (self.urgent or self.bulk) or self.active >= HOST_CONCURRENCY:
+            return None
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        return self.bucket.delay(now)
+
+    def drain(self) -> list[Feed]:
+        """Remove all queued Feeds and return them."""
+        feeds: Final[list[Feed]] = [*self.urgent, *self.bulk]
+        self.urgent.clear()
+        self.bulk.clear()
+        return feeds
+
+
+class FetchScheduler:
+    """FetchScheduler is a queue of Feeds that hands them out to the fetch
+    workers one host at a time, in turns, urgent Feeds first.
+
+    Each queued Feed has a Future that is resolved once the Feed has been
+    fetched and processed. Queueing a Feed that is already queued (or being
+    fetched) returns the Future it already has.
+
+    Hosts are remembered after their queue has run empty, so their token
+    buckets and Retry-After blocks carry over to the next refresh."""
+
+    __slots__ = [
+        "lock",
+        "hosts",
+        "turn",
+        "futures",
+        "urgent",
+    ]
+
+    lock: Condition
+    hosts: dict[str, Host]
+    turn: deque[str]
+    futures: dict[int, Future]
+    urgent: set[int]
+
+    def __init__(self) -> None:
+        self.lock = Condition()
+        self.hosts = {}
+        self.turn = deque()
+        self.futures = {}
+        self.urgent = set()
+
+    def __len__(self) -> int:
+        """Return the number of Feeds queued or being fetched."""
+        with self.lock:
+            return len(self.futures)
+
+    def put(self, feed: Feed, urgent: bool = False) -> Optional[Future]:
+        """Queue a Feed and return its Future.
+
+        If the Feed is queued already, it is moved to the urgent lane if
+        urgent is True. Returns None if the Feed's host has asked us to stay
+        away for longer than MAX_HOLD, in which case the Feed is not
+        queued."""
+        name: Final[str] = host_of(feed.feed_url)
+        with self.lock:
+            host = self.hosts.get(name)
+            if host is None:
+                host = Host(name)
+                self.hosts[name] = host
+                self.turn.append(name)
+
+            fut = self.futures.get(feed.fid)
+            if fut is not None:
+                if urgent and feed.fid not in self.urgent:
+                    self.urgent.add(feed.fid)
+                    for queued in host.bulk:
+                        if queued.fid == feed.fid:
+                            host.bulk.remove(queued)
+                            host.urgent.append(queued)
+                            self.lock.notify()
+                            break
+                return fut
+
+            if host.blocked_until - time.monotonic() > MAX_HOLD:
+                return None
+            fut = Future()
+            fut.set_running_or_notify_cancel()
+            self.futures[feed.fid] = fut
+            if urgent:
+                self.urgent.add(feed.fid)
+                host.urgent.append(feed)
+            else:
+                host.bulk.append(feed)
+            self.lock.notify_all()
+            return fut
+
+    def _pick(self, now: float) -> tuple[Optional[Feed], float]:
+        """Pick the next Feed to fetch, if any is ready. Otherwise, return
+        the number of seconds until one might be."""
+        wait: float = float("inf")
+        for lane in ("urgent", "bulk"):
+            for name in self.turn:
+                host = self.hosts[name]
+                if not getattr(host, lane):
+                    continue
+                delay = host.delay(now)
+                if delay is None:
+                    continue
+                if delay > 0:
+                    wait = min(wait, delay)
+                    continue
+                host.bucket.take()
+                host.active += 1
+                # The host goes to the back of the line.
+                self.turn.remove(name)
+                self.turn.append(name)
+                return getattr(host, lane).popleft(), 0.0
+        return None, wait
+
+    def get(self, timeout: float) -> Optional[Feed]:
+        """Get the next Feed to fetch, waiting up to timeout seconds for
+        one to become available. Returns None if there is none.
+
+        The caller must call done once it is finished with the Feed."""
+        deadline: Final[float] = time.monotonic() + timeout
+        with self.lock:
+            while True:
+                now = time.monotonic()
+                if now >= deadline:
+                    return None
+                feed, wait = self._pick(now)
+                if feed is not None:
+                    return feed
+                self.lock.wait(min(wait, deadline - now))
+
+    def done(self, feed: Feed, result: Any = None, err: Optional[BaseException] = None) -> None:
+        """Tell the scheduler that we are done fetching a Feed, and resolve
+        its Future with the given result or exception."""
+        with self.lock:
+            self.hosts[host_of(feed.feed_url)].active -= 1
+            fut: Final[Optional[Future]] = self.futures.pop(feed.fid, None)
+            self.urgent.discard(feed.fid)
+            self.lock.notify_all()
+        if fut is not None:
+            if err is not None:
+                fut.set_exception(err)
+            else:
+                fut.set_result(result)
+
+    def hold(self, feed: Feed, delay: float, err: BaseException) -> bool:
+        """Leave the host of a Feed alone for delay seconds, because it told
+        us so, and tell the scheduler we are done with the Feed.
+
+        If the delay is short, the Feed is queued again to be fetched once
+        it has passed, and hold returns True. Otherwise, the Feed and all
+        other Feeds queued for the same host are failed with err, and hold
+        returns False."""
+        with self.lock:
+            host = self.hosts[host_of(feed.feed_url)]
+            host.active -= 1
+            host.blocked_until = max(host.blocked_until, time.monotonic() + delay)
+            if delay <= MAX_HOLD:
+                (host.urgent if feed.fid in self.urgent else host.bulk).appendleft(feed)
+                self.lock.notify_all()
+                return True
+            dropped: Final[list[Future]] = []
+            for f in [feed, *host.drain()]:
+                dropped.append(self.futures.pop(f.fid))
+                self.urgent.discard(f.fid)
+            self.lock.notify_all()
+        for fut in dropped:
+            fut.set_exception(err)
+        return False
+
+    @contextmanager
+    def slot(self, url: str) -> Iterator[None]:
+        """Wait until the host of url may be sent another request, and
+        count the request against the host's limits for as long as the
+        context is active. This is for requests that are not about queued
+        Feeds, e.g. fetching feeds we have not subscribed to, yet. They
+        still should not hammer the server, nor ignore it when it asked us
+        to back off. If the server does so by raising RateLimited in the
+        context, the host is left alone for as long as it asked."""
+        # client imports us, so we can only import from it once it is loaded.
+        from cephalopod.client import RateLimited  # pylint: disable-msg=C0415
+        name: Final[str] = host_of(url)
+        with self.lock:
+            host = self.hosts.get(name)
+            if host is None:
+                host = Host(name)
+                self.hosts[name] = host
+                self.turn.append(name)
+            while True:
+                now = time.monotonic()
+                if host.active < HOST_CONCURRENCY:
+                    wait = max(host.blocked_until - now, host.bucket.delay(now))
+                    if wait <= 0:
+                        break
+                    self.lock.wait(wait)
+                else:
+                    self.lock.wait()
+            host.bucket.take()
+            host.active += 1
+        try:
+            yield
+        except RateLimited as e:
+            with self.lock:
+                host.blocked_until = max(host.blocked_until, time.monotonic() + e.delay)
+            raise
+        finally:
+            with self.lock:
+                host.active -= 1
+                self.lock.notify_all()
+
+    def join(self) -> None:
+        """Wait until all queued Feeds have been processed."""
+        with self.lock:
+            while self.futures:
+                self.lock.wait()
+
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-19 12:20:48 krylon>
+#
+# /data/code/python/cephalopod/snapshot.py
+# created on 19. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/gpl-3.0
+
+"""
+cephalopod.snapshot
+
+(c) 2026 Benjamin Walkenhorst
+
+Persist the state of the GUI in a compact binary file, so the next start
+can display the window right away and reconcile against the database
+afterwards.
+
+The file consists of a short uncompressed header, followed by the
+zlib-compressed payload. Integers are stored in native byte order,
+since the snapshot never leaves the machine it was written on.
+"""
+
+import logging
+import os
+import struct
+import sys
+import zlib
+from array import array
+from dataclasses import dataclass, field
+from typing import Final, Optional
+
+from cephalopod import common
+
+MAGIC: Final[bytes] = b"CPHS"
+VERSION: Final[int] = 1
+
+_header: Final[struct.Struct] = struct.Struct("=4sHB")
+_layout: Final[struct.Struct] = struct.Struct("=9q")
+_count: Final[struct.Struct] = struct.Struct("=Q")
+_feed: Final[struct.Struct] = struct.Struct("=qqI")
+_title: Final[struct.Struct] = struct.Struct("=qI")
+
+
+@dataclass(slots=True, kw_only=True)
+class EpisodeKeys:  # pylint: disable-msg=R0902
+    """The numeric keys of all Episodes, used for sorting and filtering,
+    stored column by column in compact arrays."""
+
+    ids: array = field(default_factory=lambda: array("q"))
+    feed_ids: array = field(default_factory=lambda: array("q"))
+    numbers: array = field(default_factory=lambda: array("i"))
+    published: array = field(default_factory=lambda: array("q"))
+    positions: array = field(default_factory=lambda: array("i"))
+    durations: array = field(default_factory=lambda: array("i"))
+    flags: array = field(default_factory=lambda: array("B"))
+
+    def columns(self) -> tuple[array, ...]:
+        """Return all arrays, in a fixed order."""
+        return (self.ids,
+                self.feed_ids,
+                self.numbers,
+                self.published,
+                self.positions,
+                self.durations,
+                self.flags)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+@dataclass(slots=True, kw_only=True)
+class Layout:  # pylint: disable-msg=R0902
+    """The size and position of the main window and the state of the
+    episode list."""
+
+    width: int = 800
+    height: int = 600
+    x: int = -1
+    y: int = -1
+    page: int = 0
+    view: int = 0
+    feed_id: int = -1
+    sort_column: int = -1
+    sort_order: int = 0
+
+
+@dataclass(slots=True, kw_only=True)
+class Snapshot:
+    """Snapshot is what the GUI needs to display its window before it
+    has talked to the database."""
+
+    layout: Layout = field(default_factory=Layout)
+    # Tuples of (Feed ID, title, refresh timestamp)
+    feeds: list[tuple[int, str, int]] = field(default_factory=list)
+    keys: EpisodeKeys = field(default_factory=EpisodeKeys)
+    titles: dict[int, str] = field(default_factory=dict)
+
+
+def encode(snap: Snapshot) -> bytes:
+    """Serialize a Snapshot."""
+    payload = bytearray()
+    lay: Final[Layout] = snap.layout
+    payload += _layout.pack(lay.width, lay.height, lay.x, lay.y, lay.page, lay.view,
+                            lay.feed_id, lay.sort_column, lay.sort_order)
+
+    payload += _count.pack(len(snap.feeds))
+    for fid, title, stamp in snap.feeds:
+        raw = title.encode("utf-8")
+        payload += _feed.pack(fid, stamp, len(raw))
+        payload += raw
+
+    payload += _count.pack(len(snap.keys))
+    for col in snap.keys.columns():
+        assert len(col) == len(snap.keys)
+        payload += col.tobytes()
+
+    payload += _count.pack(len(snap.titles))
+    for epid, title in snap.titles.items():
+        raw = title.encode("utf-8")
+        payload += _title.pack(epid, len(raw))
+        payload += raw
+
+    flag: Final[int] = 1 if sys.byteorder == "little" else 0
+    return _header.pack(MAGIC, VERSION, flag) + zlib.compress(payload, 1)
+
+
+def decode(raw: bytes) -> Snapshot:
+    """Deserialize a Snapshot. Raises ValueError if the data is not a valid
+    snapshot or was written by a different version or platform."""
+    magic, version, flag = _header.unpack_from(raw)
+    if magic != MAGIC:
+        raise ValueError("Not a snapshot file")
+    if version != VERSION or flag != (1 if sys.byteorder == "little" else 0):
+        raise ValueError(f"Incompatible snapshot version {version}")
+
+    try:
+        data: Final[memoryview] = memoryview(zlib.decompress(raw[_header.size:]))
+    except zlib.error as err:
+        raise ValueError(f"Corrupt snapshot: {err}") from err
+
+    w, h, x, y, page, view, fid, scol, sorder = _layout.unpack_from(data)
+    snap = Snapshot(layout=Layout(width=w,
+                                  height=h,
+                                  x=x,
+                                  y=y,
+                                  page=page,
+                                  view=view,
+                                  feed_id=fid,
+                                  sort_column=scol,
+                                  sort_order=sorder))
+    offset: int = _layout.size
+
+    try:
+        (cnt, ) = _count.unpack_from(data, offset)
+        offset += _count.size
+        for _ in range(cnt):
+            fid, stamp, length = _feed.unpack_from(data, offset)
+            offset += _feed.size
+            snap.feeds.append((fid, str(data[offset:offset+length], "utf-8"), stamp))
+            offset += length
+
+        (cnt, ) = _count.unpack_from(data, offset)
+        offset += _count.size
+        for col in snap.keys.columns():
+            size = cnt * col.itemsize
+            col.frombytes(data[offset:offset+size])
+            offset += size
+
+        (cnt, ) = _count.unpack_from(data, offset)
+        offset += _count.size
+        for _ in range(cnt):
+            epid, length = _title.unpack_from(data, offset)
+            offset += _title.size
+            snap.titles[epid] = str(data[offset:offset+length], "utf-8")
+            offset += length
+    except (struct.error, ValueError, UnicodeDecodeError) as err:
+        raise ValueError(f"Corrupt snapshot: {err}") from err
+
+    return snap
+
+
+def save(snap: Snapshot, path: str = "") -> None:
+    """Write a Snapshot to disk. The file is replaced atomically, so a crash
+    while saving leaves the previous snapshot intact."""
+    if path == "":
+        path = common.path.window()
+    tmp: Final[str] = path + ".tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(encode(snap))
+    os.replace(tmp, path)
+
+
+def load(path: str = "", log: Optional[logging.Logger] = None) -> Optional[Snapshot]:
+    """Load a Snapshot from disk. If there is no snapshot, or it cannot be
+    used, return None."""
+    if path == "":
+        path = common.path.window()
+    try:
+        with open(path, "rb") as fh:
+            return decode(fh.read())
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, struct.error) as err:
+        if log is not None:
+            log.error("Cannot load snapshot from %s: %s", path, err)
+        return None
+
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-20 01:37:12 krylon>
+#
+# /data/code/python/cephalopod/stats.py
+# created on 20. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/gpl-3.0
+
+"""
+cephalopod.stats
+
+(c) 2026 Benjamin Walkenhorst
+
+Add up the listening history by Feed and by day, week or month.
+
+The sessions of a range of periods are read in a single pass, in the
+order they started, so each one is assigned to its period by comparing
+its start to the end of the current period, rather than by converting
+every timestamp to a date.
+
+Once a period is over, its totals do not change any more, unless a
+session that started in it is recorded late, so we cache them in the
+listen_stats table. Each cached period has a row for Feed 0, which
+does not exist, so a period in which nothing was listened to counts as
+cached, too. The SessionLog drops the cached totals of the periods it
+adds sessions to.
+"""
+
+import logging
+from collections.abc import Iterable
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from enum import Enum
+from typing import Final, Optional
+
+from cephalopod import common
+from cephalopod.database import Database
+
+# The Feed ID of the row that marks a period as cached.
+MARKER: Final[int] = 0
+
+
+class Period(Enum):
+    """The lengths of time we add up the history by."""
+    Day = "day"
+    Week = "week"
+    Month = "month"
+
+
+def period_start(stamp: datetime, period: Period) -> datetime:
+    """Return the start of the period a point in time falls into, in
+    local time. Weeks start on Monday."""
+    day: Final[datetime] = stamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    match period:
+        case Period.Day:
+            return day
+        case Period.Week:
+            return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def period_next(start: datetime, period: Period) -> datetime:
+    """Return the start of the period after the one starting at start."""
+    match period:
+        case Period.Day:
+            return start + timedelta(days=1)
+        case Period.Week:
+            return start + timedelta(days=7)
+    if start.month == 12:
+        return start.replace(year=start.year + 1, month=1)
+    return start.replace(month=start.month + 1)
+
+
+def period_starts(stamps: Iterable[int], period: Period) -> set[int]:
+    """Return the starts of the periods the given timestamps fall into, as
+    timestamps."""
+    return {int(period_start(datetime.fromtimestamp(s), period).timestamp()) for s in stamps}
+
+
+@dataclass(slots=True, kw_only=True)
+class Listened:
+    """How much of a Feed was listened to in a period. seconds is the
+    span of the Episodes played, wall the time it took, which differs if
+    they were played faster or slower."""
+
+    sessions: int = 0
+    seconds: int = 0
+    wall: int = 0
+
+
+class ListeningStats:
+    """ListeningStats adds up the listening history."""
+
+    __slots__ = [
+        "log",
+        "db",
+    ]
+
+    log: logging.Logger
+    db: Database
+
+    def __init__(self, db: Database) -> None:
+        self.log = common.get_logger("ListeningStats")
+        self.db = db
+
+    def get(self,
+            period: Period,
+            since: datetime,
+            until: datetime,
+            now: Optional[datetime] = None) -> dict[datetime, dict[int, Listened]]:
+        """Return what was listened to in each period from the one since
+        falls into up to until, by Feed ID. Periods in which nothing was
+        listened to are included, with no Feeds."""
+        if now is None:
+            now = datetime.now()
+        starts: Final[list[datetime]] = []
+        start: datetime = period_start(since, period)
+        while start < until:
+            starts.append(start)
+            start = period_next(start, period)
+        if len(starts) == 0:
+            return {}
+        end: Final[datetime] = period_next(starts[-1], period)
+
+        result: Final[dict[datetime, dict[int, Listened]]] = {}
+        for stamp, fid, sessions, seconds, wall in self.db.listen_stats_get(
+                period.value, int(starts[0].timestamp()), int(end.timestamp())):
+            totals = result.setdefault(datetime.fromtimestamp(stamp), {})
+            if fid != MARKER:
+                totals[fid] = Listened(sessions=sessions, seconds=seconds, wall=wall)
+
+        missing: Final[list[datetime]] = [s for s in starts if s not in result]
+        if len(missing) > 0:
+            fresh = self._tally(period, missing[0], period_next(missing[-1], period))
+            closed: list[tuple[int, int, int, int, int]] = []
+            for s in missing:
+                totals = fresh.get(s, {})
+                result[s] = totals
+                if period_next(s, period) <= now:
+                    stamp = int(s.timestamp())
+                    closed.append((stamp, MARKER, 0, 0, 0))
+                    closed.extend((stamp, fid, t.sessions, t.seconds, t.wall)
+                                  for fid, t in totals.items())
+            if len(closed) > 0:
+                with self.db:
+                    self.db.listen_stats_put(period.value, closed)
+            self.log.debug("Tallied %d %ss, cached %d rows",
+                           len(missing), period.value, len(closed))
+
+        return {s: result[s] for s in starts}
+
+    def _tally(self,
+               period: Period,
+               since: datetime,
+               until: datetime) -> dict[datetime, dict[int, Listened]]:
+        """Add up the sessions that started between since and until, in a
+        single pass over them."""
+        result: Final[dict[datetime, dict[int, Listened]]] = {}
+        start: datetime = since
+        nxt: datetime = period_next(start, period)
+        boundary: int = int(nxt.timestamp())
+        totals: dict[int, Listened] = result.setdefault(start, {})
+        for fid, t_start, t_stop, pos_from, pos_to in self.db.session_iter(
+                int(since.timestamp()), int(until.timestamp())):
+            while t_start >= boundary:
+                start = nxt
+                nxt = period_next(start, period)
+                boundary = int(nxt.timestamp())
+                totals = result.setdefault(start, {})
+            t = totals.get(fid)
+            if t is None:
+                t = totals[fid] = Listened()
+            t.sessions += 1
+            t.seconds += max(pos_to - pos_from, 0)
+            t.wall += max(t_stop - t_start, 0)
+        return result
+
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-19 22:17:26 krylon>
+#
+# /data/code/python/cephalopod/test_backup.py
+# created on 19. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/gpl-3.0
+
+"""
+cephalopod.test_backup
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import gzip
+import os
+import sqlite3
+import unittest
+from datetime import datetime
+
+from cephalopod import backup, common
+from cephalopod.backup import Backup, BackupError, verify
+from cephalopod.cast import Feed
+from cephalopod.database import Database
+from cephalopod.test_client import TEST_ROOT
+
+
+class BackupTest(unittest.TestCase):
+    """Test backing up the database."""
+
+    folder: str
+    db: Database
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        stamp = datetime.now()
+        folder_name = \
+            stamp.strftime("cephalopod_test_backup_%Y%m%d_%H%M%S")
+        cls.folder = os.path.join(TEST_ROOT, folder_name)
+        common.set_basedir(cls.folder)
+        cls.db = Database()
+        with cls.db:
+            for i in range(100):
+                cls.db.feed_add(Feed(
+                    fid=0,
+                    feed_url=f"http://127.0.0.1/{i}.rss",
+                    homepage="",
+                    title=f"Feed {i}",
+                    description="x" * 1000,
+                    cover_url="",
+                    last_refresh=datetime.now(),
+                    autorefresh=True,
+                    folder=os.path.join(common.path.download(), str(i)),
+                ))
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        os.system(f"/bin/rm -rf {cls.folder}")
+
+    def feed_count(self, path: str) -> int:
+        """Count the Feeds in a copy of the database."""
+        conn = sqlite3.connect(path)
+        try:
+            return conn.execute("SELECT COUNT(*) FROM feed").fetchone()[0]
+        finally:
+            conn.close()
+
+    def test_01_backup(self) -> None:
+        """A backup is a complete, standalone copy of the database."""
+        pages = backup.PAGES_PER_STEP
+        backup.PAGES_PER_STEP = 4
+        try:
+            path = Backup(folder=os.path.join(self.__class__.folder, "b1")).run()
+        finally:
+            backup.PAGES_PER_STEP = pages
+        self.assertTrue(path.endswith(".db"))
+        self.assertFalse(os.path.exists(path + "-wal"))
+        self.assertEqual(self.feed_count(path), 100)
+        self.assertEqual(os.listdir(os.path.dirname(path)), [os.path.basename(path)])
+
+    def test_02_compress(self) -> None:
+        """A compressed backup can be checked and unpacked."""
+        path = Backup(folder=os.path.join(self.__class__.folder, "b2"), compress=True).run()
+        self.assertTrue(path.endswith(".db.gz"))
+        verify(path)
+        plain = path[:-3]
+        with gzip.open(path, "rb") as src, open(plain, "wb") as dst:
+            dst.write(src.read())
+        self.assertEqual(self.feed_count(plain), 100)
+
+    def test_03_rotate(self) -> None:
+        """Only the newest backups are kept."""
+        folder = os.path.join(self.__class__.folder, "b3")
+        os.makedirs(folder)
+        for day in range(1, 6):
+            with open(os.path.join(folder, f"cephalopod-202401{day:02d}-120000.db"), "wb"):
+                pass
+        with open(os.path.join(folder, "notes.txt"), "wb"):
+            pass
+        b = Backup(folder=folder, keep=3)
+        self.assertEqual(b.latest(), datetime(2024, 1, 5, 12))
+        path = b.run()
+        self.assertEqual(sorted(os.listdir(folder)),
+                         ["cephalopod-20240104-120000.db",
+                          "cephalopod-20240105-120000.db",
+                          os.path.basename(path),
+                          "notes.txt"])
+        self.assertGreater(b.latest(), datetime(2024, 1, 5, 12))  # type: ignore
+
+    def test_04_verify(self) -> None:
+        """Broken backups are recognized."""
+        folder = os.path.join(self.__class__.folder, "b4")
+        path = Backup(folder=folder).run()
+        with open(path, "r+b") as fh:
+            fh.seek(100)
+            fh.write(b"\xff" * 4096 * 3)
+        with self.assertRaises(BackupError):
+            verify(path)
+        broken = os.path.join(folder, "broken.db.gz")
+        with open(broken, "wb") as fh:
+            fh.write(b"not gzip at all")
+        with self.assertRaises(BackupError):
+            verify(broken)
+
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-19 23:51:32 krylon>
+#
+# /data/code/python/cephalopod/test_bulk.py
+# created on 19. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/gpl-3.0
+
+"""
+cephalopod.test_bulk
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import os
+import unittest
+from datetime import datetime, timedelta
+from typing import Final
+
+from cephalopod import common
+from cephalopod.cast import Episode, Feed
+from cephalopod.client import Client
+from cephalopod.database import Database, Selection, file_size
+from cephalopod.test_client import TEST_ROOT
+
+EPISODE_CNT: Final[int] = 10
+
+
+class BulkTest(unittest.TestCase):
+    """Test the set-based operations on Episodes and deleting Feeds."""
+
+    folder: str
+    db: Database
+    feeds: dict[str, Feed]
+    episodes: dict[str, list[Episode]]
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        stamp = datetime.now()
+        folder_name = \
+            stamp.strftime("cephalopod_test_bulk_%Y%m%d_%H%M%S")
+        cls.folder = os.path.join(TEST_ROOT, folder_name)
+        common.set_basedir(cls.folder)
+        cls.db = Database()
+        cls.feeds = {}
+        cls.episodes = {}
+        for name in ("alpha", "beta"):
+            cls.make_feed(name)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        os.system(f"/bin/rm -rf {cls.folder}")
+
+    @classmethod
+    def make_feed(cls, name: str) -> None:
+        """Create a Feed with a few Episodes, one a day, every other one
+        downloaded."""
+        f = Feed(
+            fid=0,
+            feed_url=f"http://127.0.0.1/{name}.rss",
+            homepage="",
+            title=name,
+            description="",
+            cover_url="",
+            last_refresh=datetime.now(),
+            autorefresh=True,
+            folder=os.path.join(common.path.download(), name),
+        )
+        os.makedirs(f.folder)
+        episodes: list[Episode] = []
+        with cls.db:
+            cls.db.feed_add(f)
+            for i in range(EPISODE_CNT):
+                ep = Episode(
+                    epid=0,
+                    feed_id=f.fid,
+                    number=i,
+                    title=f"{name} {i}",
+                    url=f"http://127.0.0.1/{name}/{i}.mp3",
+                    published=datetime(2026, 1, 1) + timedelta(days=i),
+                    link="",
+                    mime_type="audio/mpeg",
+                    cur_pos=0,
+                    finished=False,
+                    path=os.path.join(f.folder, f"{i}.mp3"),
+                    keep=False,
+                    description=f"The episode number {i} of {name}",
+                )
+                cls.db.episode_add(ep)
+                cls.db.episode_set_pos(ep, 60 * i)
+                if i % 2 == 0:
+                    with open(ep.path, "wb") as fh:
+                        fh.write(b"\0" * 4096)
+                    cls.db.episode_set_size(ep, file_size(ep.path))
+                episodes.append(ep)
+            cls.db.page_add(f, f"http://127.0.0.1/{name}.rss", "")
+        cls.feeds[name] = f
+        cls.episodes[name] = episodes
+
+    def fetch(self, name: str) -> list[Episode]:
+        """Load the Episodes of a Feed, in the order they were created."""
+        return sorted(self.__class__.db.episode_get_by_feed(self.__class__.feeds[name]),
+                      key=lambda e: e.number)
+
+    def test_01_by_feed(self) -> None:
+        """A Selection of a Feed changes its Episodes, and only those, and
+        only once."""
+        db = self.__class__.db
+        alpha = self.__class__.feeds["alpha"]
+        with db:
+            self.assertEqual(db.episodes_set_finished(Selection(feed_id=alpha.fid), True),
+                             EPISODE_CNT)
+            self.assertEqual(db.episodes_set_finished(Selection(feed_id=alpha.fid), True), 0)
+        self.assertTrue(all(e.finished for e in self.fetch("alpha")))
+        self.assertFalse(any(e.finished for e in self.fetch("beta")))
+
+    def test_02_by_ids(self) -> None:
+        """A Selection of IDs changes exactly those Episodes, and an empty
+        list changes none."""
+        db = self.__class__.db
+        beta = self.__class__.episodes["beta"]
+        ids = [beta[1].epid, beta[3].epid, beta[3].epid, 4711]
+        with db:
+            self.assertEqual(db.episodes_set_keep(Selection(ids=ids), True), 2)
+            self.assertEqual(db.episodes_set_keep(Selection(ids=[]), True), 0)
+        self.assertEqual([e.number for e in self.fetch("beta") if e.keep], [1, 3])
+
+    def test_03_predicate(self) -> None:
+        """The conditions of a Selection are combined."""
+        db = self.__class__.db
+        beta = self.__class__.feeds["beta"]
+        sel = Selection(feed_id=beta.fid,
+                        published_before=datetime(2026, 1, 6),
+                        downloaded=True)
+        with db:
+            self.assertEqual(db.episodes_reset_pos(sel), 2)
+            # Episode 0 started at position 0 already.
+            self.assertEqual(db.episodes_reset_pos(Selection(finished=False)), EPISODE_CNT - 3)
+        self.assertEqual([e.cur_pos for e in self.fetch("beta")], [0] * EPISODE_CNT)
+        self.assertEqual([e.cur_pos for e in self.fetch("alpha")],
+                         [60 * i for i in range(EPISODE_CNT)])
+
+    def test_04_feed_delete(self) -> None:
+        """Deleting a Feed takes its Episodes, descriptions, pages and
+        downloads with it, and leaves the other Feeds alone."""
+        db = self.__class__.db
+        alpha = self.__class__.feeds["alpha"]
+        before = db.stats()
+
+        # A failed transaction leaves everything in place.
+        with self.assertRaises(RuntimeError):
+            with db:
+                db.feed_delete(alpha)
+                raise RuntimeError("Never mind")
+        self.assertIs(db.feed_get_by_id(alpha.fid), alpha)
+        self.assertEqual(len(self.fetch("alpha")), EPISODE_CNT)
+
+        counts = Client().feed_delete(alpha)
+        self.assertEqual(counts["feeds"], 1)
+        self.assertEqual(counts["episodes"], EPISODE_CNT)
+        self.assertEqual(counts["texts"], EPISODE_CNT)
+        self.assertEqual(counts["pages"], 1)
+        self.assertEqual(counts["files"], EPISODE_CNT // 2)
+        self.assertEqual(counts["freed"], EPISODE_CNT // 2 * 4096)
+        self.assertFalse(os.path.exists(alpha.folder))
+
+        self.assertIsNone(db.feed_get_by_id(alpha.fid))
+        self.assertEqual(db.episode_get_by_feed(alpha), [])
+        self.assertEqual(db.page_get_by_feed(alpha), {})
+        after = db.stats()
+        self.assertEqual(before["feeds"] - after["feeds"], 1)
+        self.assertEqual(before["episodes"] - after["episodes"], EPISODE_CNT)
+        self.assertEqual(len(self.fetch("beta")), EPISODE_CNT)
+
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
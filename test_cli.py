@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-19 13:52:40 krylon>
+#
+# /data/code/python/cephalopod/test_cli.py
+# created on 19. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/gpl-3.0
+
+"""
+cephalopod.test_cli
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import json
+import os
+import subprocess
+import sys
+import unittest
+from typing import Final
+
+# Importing the command line client in a fresh interpreter must not take
+# longer than this many seconds.
+IMPORT_BUDGET: Final[float] = 0.5
+
+# These modules are expensive to load and not needed until later, if at all.
+HEAVY_MODULES: Final[tuple[str, ...]] = ("gi", "feedparser", "krylib")
+
+PROBE: Final[str] = f"""
+import json, sys, time
+t0 = time.perf_counter()
+import cephalopod.cli
+t1 = time.perf_counter()
+print(json.dumps({{"elapsed": t1 - t0,
+                  "loaded": [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+class CLITest(unittest.TestCase):
+    """Test the command line client."""
+
+    def test_01_import_time(self) -> None:
+        """Import the command line client in a fresh process and check it
+        stays within the time budget without pulling in heavy modules."""
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(p for p in sys.path if p != "")
+        res = subprocess.run([sys.executable, "-c", PROBE],
+                             capture_output=True,
+                             check=True,
+                             env=env,
+                             text=True)
+        result = json.loads(res.stdout)
+        self.assertEqual(result["loaded"], [])
+        self.assertLess(result["elapsed"], IMPORT_BUDGET)
+
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -19,18 +19,23 @@ cephalopod.test_client
 
 import os
 import unittest
-from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from datetime import datetime, timedelta
 from typing import Final
 
 import feedparser
 from krylib import isdir
 
 from cephalopod import common
-from cephalopod.cast import Episode, Feed
+from cephalopod import client as cl
+from cephalopod.cast import FAILURE_LIMIT, Episode, Feed
 from cephalopod.client import Client
 from cephalopod.test_example_feed import EXAMPLE_FEED
 
 TEST_FEED_URL: Final[str] = "http://feeds.feedburner.com/sternengeschichten"
+# Nothing listens on port 1, so connecting fails right away.
+DEAD_FEED_URL: Final[str] = "http://127.0.0.1:1/feed.rss"
 
 
 TEST_ROOT: str = "/tmp/"
@@ -41,6 +46,64 @@ if isdir("/data/ram"):
     TEST_ROOT = "/data/ram"
 
 
+def paged_feed(page: int, pages: int) -> bytes:
+    """Create page number page of a paged feed with the given number of
+    pages. Each page links to the next one, and lists two episodes."""
+    nxt = f'<atom:link rel="next" href="/paged.rss?p={page + 1}"/>' if page < pages else ""
+    items = "".join(f"""
+    <item>
+      <title>Episode {page}.{i}</title>
+      <pubDate>Fri, 22 Mar 2024 06:00:00 +0000</pubDate>
+      <enclosure url="http://127.0.0.1/paged/{page}/{i}.mp3" type="audio/mpeg" length="1"/>
+      <description>Page {page}, episode {i}</description>
+    </item>""" for i in range(2))
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom">
+  <channel>
+    <title>Paged Feed</title>
+    <link>http://127.0.0.1/</link>
+    <description>A feed with many pages</description>
+    {nxt}
+    {items}
+  </channel>
+</rss>""".encode("utf-8")
+
+
+class FeedHandler(BaseHTTPRequestHandler):
+    """Serve the example feed, with an ETag, and count the requests that
+    are answered with the full feed."""
+
+    etag: Final[str] = '"v1"'
+    served: int = 0
+    pages_served: int = 0
+
+    def do_GET(self) -> None:  # pylint: disable-msg=C0103
+        """Handle a GET request."""
+        if self.headers.get("If-None-Match") == self.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        if self.path.startswith("/paged.rss"):
+            page = int(self.path.split("=")[1]) if "=" in self.path else 1
+            self.__class__.pages_served += 1
+            body = paged_feed(page, 4)
+        else:
+            body = EXAMPLE_FEED.encode("utf-8")
+        if self.path != "/feed.rss" and not self.path.startswith("/paged.rss"):
+            # Every other feed needs a title of its own.
+            body = body.replace(b"Sternengeschichten", self.path.encode("utf-8"), 1)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/rss+xml")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", self.etag)
+        self.end_headers()
+        self.wfile.write(body)
+        self.__class__.served += 1
+
+    def log_message(self, *args) -> None:  # pylint: disable-msg=W0221
+        pass
+
+
 class ClientTest(unittest.TestCase):
     """Test the Database class. Duh."""
 
@@ -96,6 +159,144 @@ class ClientTest(unittest.TestCase):
             self.assertIsNotNone(episodes)
             self.assertEqual(len(episodes), 5)
 
+    def test_04_backoff(self) -> None:
+        """Check the retry delays grow, are jittered and are capped."""
+        for failures in range(1, FAILURE_LIMIT):
+            delay = min(cl.backoff_max, cl.backoff_base * 2 ** (failures - 1))
+            d = cl.backoff(failures)
+            self.assertGreaterEqual(d, delay / 2)
+            self.assertLessEqual(d, delay)
+        self.assertGreaterEqual(cl.backoff(FAILURE_LIMIT), cl.park_interval / 2)
+
+    def test_05_failing_feed(self) -> None:
+        """Refresh a feed that cannot be reached, and check it is backed
+        off and eventually parked."""
+        client = Client(1)
+        db = client.get_database()
+        feed = Feed(
+            fid=0,
+            feed_url=DEAD_FEED_URL,
+            homepage="",
+            title="Dead Feed",
+            description="",
+            cover_url="",
+            last_refresh=datetime.fromtimestamp(0),
+            autorefresh=True,
+            folder=os.path.join(self.folder, "dead"),
+        )
+        with db:
+            db.feed_add(feed)
+
+        def get_feed() -> Feed:
+            return [f for f in db.feed_get_all() if f.fid == feed.fid][0]
+
+        client.refresh()
+        f = get_feed()
+        self.assertEqual(f.failures, 1)
+        self.assertGreater(f.retry_after, datetime.now())
+        self.assertNotEqual(f.status(), "")
+
+        # The feed is backed off, so a regular refresh leaves it alone.
+        client.refresh()
+        self.assertEqual(get_feed().failures, 1)
+
+        with db:
+            db.feed_set_failure(f, FAILURE_LIMIT - 1, datetime.now() - timedelta(1), "")
+        client.refresh(True)
+        f = get_feed()
+        self.assertTrue(f.is_parked())
+        self.assertGreater(f.retry_after, datetime.now() + cl.park_interval / 3)
+
+        # Not even a forced refresh tries a parked feed before its time.
+        client.refresh(True)
+        self.assertEqual(get_feed().failures, FAILURE_LIMIT)
+
+        with db:
+            db.feed_set_timestamp(f, datetime.now())
+        self.assertEqual(get_feed().failures, 0)
+
+    def test_06_cache_headers(self) -> None:
+        """Parse the headers servers use to tell us when to come back."""
+        self.assertEqual(cl.parse_retry_after("120"), 120)
+        self.assertEqual(cl.parse_retry_after(None), cl.default_retry_after)
+        self.assertEqual(cl.parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"), 0)
+        self.assertEqual(cl.parse_retry_after("bogus"), cl.default_retry_after)
+        self.assertEqual(cl.parse_max_age("public, max-age=3600"), 3600)
+        self.assertEqual(cl.parse_max_age("no-cache, max-age=3600"), 0)
+        self.assertEqual(cl.parse_max_age(None), 0)
+
+    def test_07_add_and_revalidate(self) -> None:
+        """Adding a feed stores its episodes right away, and refreshing an
+        unchanged feed does not download it again."""
+        server = ThreadingHTTPServer(("127.0.0.1", 0), FeedHandler)
+        Thread(target=server.serve_forever, daemon=True).start()
+        client = Client(1)
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}/feed.rss"
+            feed = client.feed_add(url)
+            self.assertEqual(FeedHandler.served, 1)
+            self.assertEqual(feed.etag, FeedHandler.etag)
+            db = client.get_database()
+            self.assertEqual(len(db.episode_get_by_feed(feed)), 5)
+
+            new = client.refresh_feed(feed).result(10)
+            self.assertEqual(new, [])
+            self.assertEqual(FeedHandler.served, 1)
+        finally:
+            client.stop()
+            server.shutdown()
+            server.server_close()
+
+    def test_08_import(self) -> None:
+        """Import a list of feeds, some of which cannot be added."""
+        server = ThreadingHTTPServer(("127.0.0.1", 0), FeedHandler)
+        Thread(target=server.serve_forever, daemon=True).start()
+        client = Client(4)
+        try:
+            base = f"http://127.0.0.1:{server.server_address[1]}"
+            urls = [
+                f"{base}/a.rss",
+                f"{base}/b.rss",
+                f"{base}/a.rss",
+                "http://127.0.0.1:1/other.rss",
+            ]
+            added, failed = client.import_feeds(urls, batch_size=1)
+            self.assertEqual(sorted(f.feed_url for f in added), urls[:2])
+            self.assertEqual(list(failed), [urls[3]])
+
+            # Feeds we already have are skipped.
+            added, failed = client.import_feeds([urls[0], f"{base}/c.rss"])
+            self.assertEqual([f.feed_url for f in added], [f"{base}/c.rss"])
+            self.assertEqual(failed, {})
+            titles = {f.title for f in client.get_database().feed_get_all()}
+            self.assertTrue({"/a.rss", "/b.rss", "/c.rss"} <= titles)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_09_backfill(self) -> None:
+        """Fetch the older pages of a paged feed, once."""
+        server = ThreadingHTTPServer(("127.0.0.1", 0), FeedHandler)
+        Thread(target=server.serve_forever, daemon=True).start()
+        client = Client(1)
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}/paged.rss"
+            feed = client.feed_add(url)
+            db = client.get_database()
+            self.assertEqual(len(db.episode_get_by_feed(feed)), 2)
+
+            self.assertEqual(client.backfill(feed), 6)
+            self.assertEqual(len(db.episode_get_by_feed(feed)), 8)
+            self.assertEqual(len(db.page_get_by_feed(feed)), 3)
+
+            # The second time around, only the head page is fetched.
+            served = FeedHandler.pages_served
+            self.assertEqual(client.backfill(feed), 0)
+            self.assertEqual(FeedHandler.pages_served, served + 1)
+        finally:
+            server.shutdown()
+            server.server_close()
+
 
 # Local Variables: #
 # python-indent: 4 #
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-19 19:52:44 krylon>
+#
+# /data/code/python/cephalopod/test_compression.py
+# created on 19. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/gpl-3.0
+
+"""
+cephalopod.test_compression
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import unittest
+from typing import Final
+
+from cephalopod import compression
+
+BOILERPLATE: Final[str] = """
+<p>Wer den Podcast finanziell unterstützen möchte, kann das hier tun: Mit PayPal
+(https://www.paypal.me/florianfreistetter), Patreon (https://www.patreon.com/sternengeschichten)
+oder Steady (https://steadyhq.com/sternengeschichten).</p>
+<p>Mehr Sternengeschichten gibt es unter https://sternengeschichten.podigee.io/.</p>
+"""
+
+
+def description(n: int) -> str:
+    """Create the description of episode n, which is mostly boilerplate."""
+    return f"<p>In Folge {n} geht es um den Stern Nummer {n * 7919 % 1000}.</p>" + BOILERPLATE
+
+
+class CompressionTest(unittest.TestCase):
+    """Test compressing descriptions."""
+
+    def test_01_roundtrip(self) -> None:
+        """Texts survive compression, with and without a dictionary."""
+        zdict = compression.train(description(i) for i in range(10))
+        for text in ("", "ä" * 1000, description(42)):
+            for d in (b"", zdict):
+                with self.subTest(text=text[:10], zdict=len(d)):
+                    self.assertEqual(compression.decompress(compression.compress(text, d), d),
+                                     text)
+
+    def test_02_train(self) -> None:
+        """A dictionary built from the boilerplate shrinks new texts."""
+        zdict = compression.train(description(i) for i in range(50))
+        self.assertGreater(len(zdict), 0)
+        self.assertLessEqual(len(zdict), compression.DICT_SIZE)
+        text = description(1000)
+        plain = len(compression.compress(text))
+        trained = len(compression.compress(text, zdict))
+        self.assertLess(trained, plain // 2)
+
+    def test_03_train_nothing_in_common(self) -> None:
+        """Samples without common chunks yield an empty dictionary."""
+        self.assertEqual(compression.train([f"Text number {i} is unique." for i in range(5)]),
+                         b"")
+
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
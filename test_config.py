@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-19 21:12:40 krylon>
+#
+# /data/code/python/cephalopod/test_config.py
+# created on 19. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/gpl-3.0
+
+"""
+cephalopod.test_config
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import os
+import unittest
+from datetime import datetime, timedelta
+
+from cephalopod import common, config
+from cephalopod.database import Database
+from cephalopod.test_client import TEST_ROOT
+
+
+class ConfigTest(unittest.TestCase):
+    """Test loading the settings."""
+
+    folder: str
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        stamp = datetime.now()
+        folder_name = \
+            stamp.strftime("cephalopod_test_config_%Y%m%d_%H%M%S")
+        cls.folder = os.path.join(TEST_ROOT, folder_name)
+        common.set_basedir(cls.folder)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        os.system(f"/bin/rm -rf {cls.folder}")
+
+    def test_01_profiles(self) -> None:
+        """Without a file, the laptop profile applies, the others differ
+        from it where they should."""
+        laptop = config.load(os.path.join(self.__class__.folder, "missing.toml"))
+        self.assertEqual(laptop, config.parse({}))
+        self.assertEqual(laptop.profile, "laptop")
+        server = config.parse({"profile": "server"})
+        small = config.parse({"profile": "low-memory"})
+        self.assertGreater(server.cache_size, laptop.cache_size)
+        self.assertLess(small.cache_size, laptop.cache_size)
+        self.assertEqual(small.mmap_size, 0)
+        self.assertEqual(small.downloads, 1)
+        # The laptop profile keeps what we used before there were settings.
+        self.assertEqual(laptop.workers, min(32, (os.cpu_count() or 1) + 4))
+        self.assertEqual(laptop, config.Settings())
+        self.assertEqual(laptop.log_size, 256 << 20)
+        self.assertEqual(laptop.log_count, 4)
+
+    def test_02_overrides(self) -> None:
+        """Explicit settings win over the profile, sizes may have a
+        suffix."""
+        s = config.parse({
+            "profile": "low-memory",
+            "fetch": {"workers": 3, "refresh_interval": 15},
+            "database": {"cache_size": "8M", "synchronous": "full", "busy_timeout": 1},
+            "downloads": {"quota": "2G"},
+        })
+        self.assertEqual(s.workers, 3)
+        self.assertEqual(s.refresh_interval, timedelta(minutes=15))
+        self.assertEqual(s.cache_size, 8 << 20)
+        self.assertEqual(s.synchronous, "FULL")
+        self.assertEqual(s.busy_timeout, 1.0)
+        self.assertEqual(s.quota, 2 << 30)
+        # Whatever is not set comes from the profile.
+        self.assertEqual(s.title_cache, config.PROFILES["low-memory"]["title_cache"])
+
+    def test_03_invalid(self) -> None:
+        """Typos and nonsensical values are rejected."""
+        for doc in ({"profile": "desktop"},
+                    {"profile": ["server"]},
+                    {"profile": 5},
+                    {"fetch": {"worker": 4}},
+                    {"fetsh": {"workers": 4}},
+                    {"fetch": {"workers": 0}},
+                    {"fetch": {"workers": True}},
+                    {"database": {"cache_size": "lots"}},
+                    {"database": {"synchronous": "sometimes"}},
+                    {"database": 5}):
+            with self.subTest(doc=doc):
+                with self.assertRaises(config.ConfigError):
+                    config.parse(doc)
+
+        # Files that cannot be read or decoded, too.
+        garbled = os.path.join(self.__class__.folder, "garbled.toml")
+        with open(garbled, "wb") as fh:
+            fh.write(b'profile = "\xff\xfe"\n')
+        for path in (garbled, self.__class__.folder):
+            with self.subTest(path=path):
+                with self.assertRaises(config.ConfigError):
+                    config.load(path)
+
+    def test_04_reload(self) -> None:
+        """reload notices when the file changes, and keeps the old settings
+        when the new file is broken."""
+        path = common.path.config()
+        old = config.get()
+        self.assertIsNone(config.reload())
+
+        with open(path, "w", encoding="utf-8") as fh:
+            fh.write('profile = "server"\n[fetch]\nworkers = 5\n')
+        os.utime(path, (0, 1))
+        new = config.reload()
+        self.assertIsNotNone(new)
+        assert new is not None
+        self.assertEqual(new.workers, 5)
+        self.assertIs(config.get(), new)
+        self.assertNotEqual(new, old)
+
+        with open(path, "w", encoding="utf-8") as fh:
+            fh.write("[fetch\n")
+        os.utime(path, (0, 2))
+        with self.assertRaises(config.ConfigError):
+            config.reload()
+        self.assertIs(config.get(), new)
+        os.remove(path)
+        self.assertEqual(config.reload(), old)
+
+    def test_05_retune(self) -> None:
+        """A connection picks up reloaded settings when it is retuned, not
+        before."""
+        path = common.path.config()
+        db = Database(os.path.join(self.__class__.folder, "tune.db"))
+
+        def cache_size() -> int:
+            return db.db.execute("PRAGMA cache_size").fetchone()[0]
+
+        self.assertEqual(cache_size(), -(config.get().cache_size // 1024))
+        db.retune()
+        with open(path, "w", encoding="utf-8") as fh:
+            fh.write('[database]\ncache_size = "3M"\n')
+        os.utime(path, (0, 3))
+        self.assertIsNotNone(config.reload())
+        self.assertNotEqual(cache_size(), -3072)
+        db.retune()
+        self.assertEqual(cache_size(), -3072)
+        os.remove(path)
+        config.reload()
+
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-19 14:58:12 krylon>
+#
+# /data/code/python/cephalopod/test_daemon.py
+# created on 19. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/gpl-3.0
+
+"""
+cephalopod.test_daemon
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import os
+import time
+import unittest
+from datetime import datetime
+from threading import Thread
+
+from krylib import isdir
+
+from cephalopod import common, daemon
+from cephalopod.client import Client
+
+TEST_ROOT: str = "/tmp/"
+
+# On my main development machines, I have a RAM disk mounted at /data/ram.
+# If it's available, I'd rather use that than /tmp which might live on disk.
+if isdir("/data/ram"):
+    TEST_ROOT = "/data/ram"
+
+
+class DaemonTest(unittest.TestCase):
+    """Test the Daemon and its control socket."""
+
+    folder: str
+    daemon: daemon.Daemon
+    thread: Thread
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        stamp = datetime.now()
+        folder_name = \
+            stamp.strftime("cephalopod_test_daemon_%Y%m%d_%H%M%S")
+        cls.folder = os.path.join(TEST_ROOT,
+                                  folder_name)
+        common.set_basedir(cls.folder)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        os.system(f"/bin/rm -rf {cls.folder}")
+
+    def test_01_start(self) -> None:
+        """Start the daemon in a background thread."""
+        self.assertFalse(daemon.is_running())
+        self.__class__.daemon = daemon.Daemon(Client(2))
+        self.__class__.thread = Thread(target=self.__class__.daemon.run, daemon=True)
+        self.__class__.thread.start()
+        for _ in range(50):
+            if daemon.is_running():
+                break
+            time.sleep(0.1)
+        self.assertTrue(daemon.is_running())
+
+    def test_02_status(self) -> None:
+        """Ask the daemon for its status."""
+        status = daemon.call("status", timeout=5)
+        self.assertEqual(status["pid"], os.getpid())
+        self.assertEqual(status["feeds"], 0)
+        self.assertFalse(status["refreshing"])
+
+    def test_03_refresh(self) -> None:
+        """Refresh with no feeds to refresh."""
+        res = daemon.call("refresh", timeout=5)
+        self.assertEqual(res["refreshed"], 0)
+
+    def test_04_errors(self) -> None:
+        """Invalid commands must be reported as errors."""
+        with self.assertRaises(daemon.DaemonError):
+            daemon.call("frobnicate", timeout=5)
+        with self.assertRaises(daemon.DaemonError):
+            daemon.call("download", id=42, timeout=5)
+        with self.assertRaises(daemon.DaemonError):
+            daemon.call("refresh_feed", id=42, timeout=5)
+
+    def test_05_shutdown(self) -> None:
+        """Stop the daemon."""
+        self.__class__.daemon.shutdown()
+        self.__class__.thread.join(10)
+        self.assertFalse(self.__class__.thread.is_alive())
+        self.assertFalse(os.path.exists(common.path.socket()))
+
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -18,13 +18,14 @@ cephalopod.test_database
 """
 
 import os
+import sqlite3
 import unittest
 from datetime import datetime
 
 from krylib import isdir
 
 from cephalopod import common, database
-from cephalopod.cast import Feed
+from cephalopod.cast import Episode, Feed
 
 TEST_ROOT: str = "/tmp/"
 
@@ -95,6 +96,98 @@ class DatabaseTest(unittest.TestCase):
                 if c[1]:
                     self.fail(f"Adding podcast {c[0].title} to database should not have worked!")
 
+    def test_03_episode_dedupe(self) -> None:
+        """Find the Episodes we know by their URL, even if keys collide."""
+        db = self.__get_db()
+        f = db.feed_get_all()[0]
+        urls = [f"https://media.example.com/episode{i}.opus" for i in range(3)]
+        with db:
+            for i, url in enumerate(urls):
+                ep = Episode(
+                    epid=0,
+                    feed_id=f.fid,
+                    number=i,
+                    title=f"Episode {i}",
+                    url=url,
+                    published=datetime.now(),
+                    link="",
+                    mime_type="audio/ogg",
+                    cur_pos=0,
+                    finished=False,
+                    path=os.path.join(f.folder, f"episode{i}.opus"),
+                    keep=False,
+                    description="",
+                )
+                self.assertTrue(db.episode_add(ep))
+
+        unknown = "https://media.example.com/episode9.opus"
+        self.assertEqual(db.episode_known_urls(f, [urls[1], unknown]), {urls[1]})
+        self.assertEqual(db.episode_known_urls(f, []), set())
+
+        # Pretend the unknown URL hashes to the same key as a known one.
+        with db:
+            db.db.execute("UPDATE episode SET url_key = ? WHERE url = ?",
+                          (database.url_key(unknown), urls[2]))
+        self.assertEqual(db.episode_known_urls(f, [unknown]), set())
+
+    def test_04_descriptions(self) -> None:
+        """Descriptions are stored compressed and loaded on demand."""
+        db = self.__get_db()
+        f = db.feed_get_all()[0]
+        footer = "<p>Support this show at https://www.example.com/support, thank you!</p>"
+        with db:
+            for i in range(20):
+                ep = Episode(
+                    epid=0,
+                    feed_id=f.fid,
+                    number=100 + i,
+                    title=f"Described episode {i}",
+                    url=f"https://media.example.com/described{i}.opus",
+                    published=datetime.now(),
+                    link="",
+                    mime_type="audio/ogg",
+                    cur_pos=0,
+                    finished=False,
+                    path=os.path.join(f.folder, f"described{i}.opus"),
+                    keep=False,
+                    description=f"<p>Episode number {i}.</p>{footer}",
+                )
+                self.assertTrue(db.episode_add(ep))
+
+        loaded = db.episode_get_by_id(ep.epid)
+        assert loaded is not None
+        self.assertEqual(loaded.description, "")
+        self.assertEqual(db.episode_get_description(ep.epid), ep.description)
+        self.assertEqual(db.episode_get_description(1), "")
+
+        before = db.stats()
+        self.assertNotEqual(db.text_train(), 0)
+        after = db.stats()
+        self.assertEqual(before["text_raw"], after["text_raw"])
+        self.assertLess(after["text_stored"], before["text_stored"])
+        self.assertEqual(db.episode_get_description(ep.epid), ep.description)
+
+    def test_05_failed_migration(self) -> None:
+        """A migration that fails reports its own error and leaves the
+        database as it was."""
+        path = os.path.join(self.__class__.folder, "broken.db")
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE feed (id INTEGER PRIMARY KEY)")
+        conn.execute("PRAGMA user_version = 5")
+        conn.close()
+
+        with self.assertRaises(sqlite3.OperationalError):
+            database.Database(path)
+
+        conn = sqlite3.connect(path)
+        try:
+            self.assertEqual(conn.execute("PRAGMA user_version").fetchone()[0], 5)
+            tables = [row[0] for row in
+                      conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+            self.assertEqual(tables, ["feed"])
+        finally:
+            conn.close()
+
 
 # Local Variables: #
 # python-indent: 4 #
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-19 23:24:10 krylon>
+#
+# /data/code/python/cephalopod/test_feedcache.py
+# created on 19. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/gpl-3.0
+
+"""
+cephalopod.test_feedcache
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import os
+import sqlite3
+import unittest
+from datetime import datetime
+
+from cephalopod import common
+from cephalopod.cast import Feed
+from cephalopod.database import Database
+from cephalopod.feedcache import FeedCache
+from cephalopod.test_client import TEST_ROOT
+
+
+def make_feed(name: str, fid: int = 0) -> Feed:
+    """Create a Feed that is not in the database, yet."""
+    return Feed(
+        fid=fid,
+        feed_url=f"http://127.0.0.1/{name}.rss",
+        homepage="",
+        title=name,
+        description="",
+        cover_url="",
+        last_refresh=datetime.now(),
+        autorefresh=True,
+        folder=os.path.join(common.path.download(), name),
+    )
+
+
+class FeedCacheTest(unittest.TestCase):
+    """Test the identity map of Feeds."""
+
+    folder: str
+    db: Database
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        stamp = datetime.now()
+        folder_name = \
+            stamp.strftime("cephalopod_test_feedcache_%Y%m%d_%H%M%S")
+        cls.folder = os.path.join(TEST_ROOT, folder_name)
+        common.set_basedir(cls.folder)
+        cls.db = Database()
+        with cls.db:
+            for name in ("alpha", "beta", "gamma"):
+                cls.db.feed_add(make_feed(name))
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        os.system(f"/bin/rm -rf {cls.folder}")
+
+    def other_conn(self) -> sqlite3.Connection:
+        """Open a connection that goes around the Database, like another
+        process would."""
+        conn = sqlite3.connect(common.path.db())
+        conn.isolation_level = None
+        return conn
+
+    def test_01_identity(self) -> None:
+        """Each Feed is the same object, through all connections, and
+        lookups do not read the Feeds again."""
+        db = self.__class__.db
+        feeds = db.feed_get_all()
+        self.assertEqual([f.title for f in feeds], ["alpha", "beta", "gamma"])
+
+        statements: list[str] = []
+        db.db.set_trace_callback(statements.append)
+        try:
+            again = db.feed_get_all()
+            by_id = db.feed_get_by_id(feeds[1].fid)
+            by_title = db.feed_get_by_title("gamma")
+            self.assertIsNone(db.feed_get_by_id(4711))
+        finally:
+            db.db.set_trace_callback(None)
+        self.assertTrue(all(a is b for a, b in zip(feeds, again)))
+        self.assertIs(by_id, feeds[1])
+        self.assertIs(by_title, feeds[2])
+        self.assertFalse(any("FROM feed\n" in s for s in statements), statements)
+
+        self.assertIs(Database().feed_get_by_id(feeds[0].fid), feeds[0])
+        self.assertIs(db.feed_map()[feeds[0].fid], feeds[0])
+
+    def test_02_outside_changes(self) -> None:
+        """Changes made around the Database are picked up, and end up in the
+        objects we already have."""
+        db = self.__class__.db
+        beta = db.feed_get_by_title("beta")
+        assert beta is not None
+        conn = self.other_conn()
+        conn.execute("UPDATE feed SET title = 'delta', autorefresh = 0 WHERE id = ?",
+                     (beta.fid, ))
+        conn.close()
+
+        self.assertIs(db.feed_get_by_id(beta.fid), beta)
+        self.assertEqual(beta.title, "delta")
+        self.assertFalse(beta.autorefresh)
+        self.assertIsNone(db.feed_get_by_title("beta"))
+        self.assertIs(db.feed_get_by_title("delta"), beta)
+        self.assertNotIn(beta, db.feed_get_autorefresh())
+
+    def test_03_delete(self) -> None:
+        """Feeds deleted elsewhere disappear from the cache."""
+        db = self.__class__.db
+        with db:
+            f = make_feed("epsilon")
+            db.feed_add(f)
+        self.assertIs(db.feed_get_by_id(f.fid), f)
+        conn = self.other_conn()
+        conn.execute("DELETE FROM feed WHERE id = ?", (f.fid, ))
+        conn.close()
+        self.assertNotIn(f.fid, [x.fid for x in db.feed_get_all()])
+        self.assertIsNone(db.feed_get_by_id(f.fid))
+        self.assertIsNone(db.feed_get_by_title("epsilon"))
+
+    def test_04_rollback(self) -> None:
+        """Changes that are rolled back do not linger in the cache."""
+        db = self.__class__.db
+        alpha = db.feed_get_by_title("alpha")
+        assert alpha is not None
+        with self.assertRaises(RuntimeError):
+            with db:
+                db.feed_set_autorefresh(alpha, False)
+                raise RuntimeError("Never mind")
+        self.assertFalse(alpha.autorefresh)
+        self.assertIs(db.feed_get_by_id(alpha.fid), alpha)
+        self.assertTrue(alpha.autorefresh)
+
+    def test_05_versions(self) -> None:
+        """The cache hands out a Feed only in the version it holds, and
+        takes over changes only on top of that version."""
+        cache = FeedCache()
+        one = make_feed("one", 1)
+        two = make_feed("two", 2)
+        cache.load([(one, 3), (two, 5)])
+        self.assertIs(cache.get(1, 3), one)
+        self.assertIsNone(cache.get(1, 4))
+        self.assertEqual(cache.all([(1, 3), (2, 5)]), [one, two])
+        self.assertIsNone(cache.all([(1, 3)]))
+        self.assertIsNone(cache.all([(1, 3), (2, 6)]))
+
+        cache.changed(make_feed("uno", 1), 3, 7)
+        self.assertEqual(one.title, "uno")
+        self.assertIs(cache.get(1, 7), one)
+        # A change on top of a version we never saw, we missed one.
+        cache.changed(make_feed("dos", 2), 4, 8)
+        self.assertEqual(two.title, "two")
+        self.assertIsNone(cache.get(2, 5))
+        self.assertIsNone(cache.get(2, 8))
+
+    def test_06_own_changes(self) -> None:
+        """Our own changes go into the cache right away, and a change made
+        elsewhere has only the Feed it concerns read again."""
+        db = self.__class__.db
+        feeds = db.feed_get_all()
+        statements: list[str] = []
+        db.db.set_trace_callback(statements.append)
+        try:
+            with db:
+                for f in feeds:
+                    db.feed_set_validators(f, '"abc"', "")
+                    db.feed_set_failure(f, 1, datetime.now(), "Boom")
+                    db.feed_set_timestamp(f, datetime.now())
+            again = db.feed_get_all()
+            by_id = [db.feed_get_by_id(f.fid) for f in feeds]
+        finally:
+            db.db.set_trace_callback(None)
+        self.assertTrue(all(a is b for a, b in zip(feeds, again)))
+        self.assertTrue(all(a is b for a, b in zip(feeds, by_id)))
+        self.assertFalse(any("FROM feed\n" in s for s in statements), statements)
+
+        conn = self.other_conn()
+        conn.execute("UPDATE feed SET etag = 'other' WHERE id = ?", (feeds[0].fid, ))
+        conn.close()
+        statements.clear()
+        db.db.set_trace_callback(statements.append)
+        try:
+            self.assertIs(db.feed_get_by_id(feeds[1].fid), feeds[1])
+            self.assertIs(db.feed_get_by_id(feeds[0].fid), feeds[0])
+        finally:
+            db.db.set_trace_callback(None)
+        self.assertEqual(feeds[0].etag, "other")
+        self.assertEqual(feeds[1].etag, '"abc"')
+        self.assertEqual(sum("FROM feed\n" in s for s in statements), 1, statements)
+
+        # The mapping does not change under the caller's feet.
+        mapping = db.feed_map()
+        with db:
+            f = make_feed("zeta")
+            f.title = feeds[0].title
+            db.feed_add(f)
+        self.assertNotIn(f.fid, mapping)
+        self.assertIs(db.feed_map()[f.fid], f)
+        with self.assertRaises(TypeError):
+            mapping[f.fid] = f  # type: ignore
+        # Titles need not be unique, the oldest Feed wins.
+        self.assertIs(db.feed_get_by_title(f.title), feeds[0])
+
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
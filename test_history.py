@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-20 02:14:27 krylon>
+#
+# /data/code/python/cephalopod/test_history.py
+# created on 20. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/gpl-3.0
+
+"""
+cephalopod.test_history
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import os
+import unittest
+from datetime import datetime, timedelta
+from typing import Final
+
+from cephalopod import common
+from cephalopod.cast import Episode, Feed
+from cephalopod.database import Database
+from cephalopod.history import BATCH_SIZE, FLUSH_INTERVAL, SessionLog
+from cephalopod.stats import (ListeningStats, Period, period_next,
+                              period_start)
+from cephalopod.test_client import TEST_ROOT
+
+# A Monday
+WEEK: Final[datetime] = datetime(2026, 3, 2)
+
+
+class HistoryTest(unittest.TestCase):
+    """Test the listening history and the statistics drawn from it."""
+
+    folder: str
+    db: Database
+    feeds: list[Feed]
+    episodes: list[Episode]
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        stamp = datetime.now()
+        folder_name = \
+            stamp.strftime("cephalopod_test_history_%Y%m%d_%H%M%S")
+        cls.folder = os.path.join(TEST_ROOT, folder_name)
+        common.set_basedir(cls.folder)
+        cls.db = Database()
+        cls.feeds = []
+        cls.episodes = []
+        with cls.db:
+            for name in ("alpha", "beta"):
+                f = Feed(
+                    fid=0,
+                    feed_url=f"http://127.0.0.1/{name}.rss",
+                    homepage="",
+                    title=name,
+                    description="",
+                    cover_url="",
+                    last_refresh=datetime.now(),
+                    autorefresh=True,
+                    folder=os.path.join(common.path.download(), name),
+                )
+                cls.db.feed_add(f)
+                cls.feeds.append(f)
+                ep = Episode(
+                    epid=0,
+                    feed_id=f.fid,
+                    number=1,
+                    title=f"{name} 1",
+                    url=f"http://127.0.0.1/{name}/1.mp3",
+                    published=WEEK,
+                    link="",
+                    mime_type="audio/mpeg",
+                    cur_pos=0,
+                    finished=False,
+                    path=os.path.join(f.folder, "1.mp3"),
+                    keep=False,
+                    description="",
+                )
+                cls.db.episode_add(ep)
+                cls.episodes.append(ep)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        os.system(f"/bin/rm -rf {cls.folder}")
+
+    def test_01_periods(self) -> None:
+        """Periods start and end where they should."""
+        stamp = datetime(2026, 12, 31, 23, 59)
+        self.assertEqual(period_start(stamp, Period.Day), datetime(2026, 12, 31))
+        self.assertEqual(period_start(stamp, Period.Week), datetime(2026, 12, 28))
+        self.assertEqual(period_start(stamp, Period.Month), datetime(2026, 12, 1))
+        self.assertEqual(period_next(datetime(2026, 12, 1), Period.Month), datetime(2027, 1, 1))
+        self.assertEqual(period_next(datetime(2026, 12, 28), Period.Week), datetime(2027, 1, 4))
+
+    def test_02_batches(self) -> None:
+        """Sessions are written once enough of them have piled up."""
+        db = self.__class__.db
+        alpha, beta = self.__class__.episodes
+        log = SessionLog()
+        # Every day of two weeks, half an hour of alpha at twice the speed,
+        # and on Mondays an hour of beta.
+        for day in range(14):
+            start = WEEK + timedelta(days=day, hours=20)
+            log.record(alpha, start, start + timedelta(minutes=15), 0, 1800)
+            if day % 7 == 0:
+                log.record(beta, start, start + timedelta(hours=1), 600, 4200)
+        self.assertFalse(log.is_due(WEEK))
+        self.assertTrue(log.is_due(datetime.now() + FLUSH_INTERVAL))
+        self.assertEqual(log.flush(db), 16)
+        self.assertEqual(log.flush(db), 0)
+
+        for _ in range(BATCH_SIZE - 1):
+            log.record(alpha, WEEK + timedelta(days=30), WEEK + timedelta(days=30), 0, 0)
+        self.assertFalse(log.is_due(WEEK))
+        log.record(alpha, WEEK + timedelta(days=30), WEEK + timedelta(days=30), 0, 0)
+        self.assertTrue(log.is_due(WEEK))
+        self.assertEqual(log.flush(db), BATCH_SIZE)
+
+    def test_03_stats(self) -> None:
+        """The statistics add up the sessions by period and Feed, and are
+        served from the cache once the period is over."""
+        db = self.__class__.db
+        alpha, beta = self.__class__.feeds
+        stats = ListeningStats(db)
+        until = WEEK + timedelta(days=14)
+        weeks = stats.get(Period.Week, WEEK + timedelta(days=3), until)
+        self.assertEqual(list(weeks), [WEEK, WEEK + timedelta(days=7)])
+        for totals in weeks.values():
+            self.assertEqual(totals[alpha.fid].sessions, 7)
+            self.assertEqual(totals[alpha.fid].seconds, 7 * 1800)
+            self.assertEqual(totals[alpha.fid].wall, 7 * 900)
+            self.assertEqual(totals[beta.fid].seconds, 3600)
+
+        days = stats.get(Period.Day, WEEK - timedelta(days=1), WEEK + timedelta(days=2))
+        self.assertEqual(days[WEEK - timedelta(days=1)], {})
+        self.assertEqual(set(days[WEEK]), {alpha.fid, beta.fid})
+        self.assertEqual(set(days[WEEK + timedelta(days=1)]), {alpha.fid})
+
+        statements: list[str] = []
+        db.db.set_trace_callback(statements.append)
+        try:
+            again = stats.get(Period.Week, WEEK, until)
+        finally:
+            db.db.set_trace_callback(None)
+        self.assertEqual(again, weeks)
+        self.assertFalse(any("listen_session" in s for s in statements), statements)
+
+        # A week that is not over yet is not cached.
+        now = WEEK + timedelta(days=10)
+        current = stats.get(Period.Week, now, now, now=now)
+        self.assertEqual(current[WEEK + timedelta(days=7)], weeks[WEEK + timedelta(days=7)])
+
+    def test_04_late_session(self) -> None:
+        """A session recorded after its period has been cached is counted."""
+        db = self.__class__.db
+        alpha = self.__class__.feeds[0]
+        stats = ListeningStats(db)
+        log = SessionLog()
+        log.record(self.__class__.episodes[0],
+                   WEEK + timedelta(days=1),
+                   WEEK + timedelta(days=1, minutes=10),
+                   1800,
+                   2400)
+        log.flush(db)
+        weeks = stats.get(Period.Week, WEEK, WEEK + timedelta(days=1))
+        self.assertEqual(weeks[WEEK][alpha.fid].sessions, 8)
+        self.assertEqual(weeks[WEEK][alpha.fid].seconds, 7 * 1800 + 600)
+
+    def test_05_feed_delete(self) -> None:
+        """Deleting a Feed deletes its history, too."""
+        db = self.__class__.db
+        alpha, beta = self.__class__.feeds
+        with db:
+            counts = db.feed_delete(alpha)
+        self.assertEqual(counts["sessions"], 14 + BATCH_SIZE + 1)
+        self.assertGreater(counts["listen_stats"], 0)
+        weeks = ListeningStats(db).get(Period.Week, WEEK, WEEK + timedelta(days=1))
+        self.assertEqual(set(weeks[WEEK]), {beta.fid})
+
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
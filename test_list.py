@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-20 00:58:03 krylon>
+#
+# /data/code/python/cephalopod/test_list.py
+# created on 20. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/gpl-3.0
+
+"""
+cephalopod.test_list
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import os
+import random
+import unittest
+from datetime import datetime, timedelta
+from typing import Final
+
+from cephalopod import common
+from cephalopod.cast import Episode, Feed
+from cephalopod.database import LIST_ORDER, Database, Selection, Totals
+from cephalopod.test_client import TEST_ROOT
+
+FEED_CNT: Final[int] = 5
+EPISODE_CNT: Final[int] = 400
+
+
+class ListTest(unittest.TestCase):
+    """Test listing Episodes and adding them up by Feed."""
+
+    folder: str
+    db: Database
+    feeds: list[Feed]
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        stamp = datetime.now()
+        folder_name = \
+            stamp.strftime("cephalopod_test_list_%Y%m%d_%H%M%S")
+        cls.folder = os.path.join(TEST_ROOT, folder_name)
+        common.set_basedir(cls.folder)
+        cls.db = Database()
+        cls.feeds = []
+        rnd: Final[random.Random] = random.Random(23)
+        with cls.db:
+            for i in range(FEED_CNT):
+                f = Feed(
+                    fid=0,
+                    feed_url=f"http://127.0.0.1/{i}.rss",
+                    homepage="",
+                    title=f"Feed {i}",
+                    description="",
+                    cover_url="",
+                    last_refresh=datetime.now(),
+                    autorefresh=True,
+                    folder=os.path.join(common.path.download(), str(i)),
+                )
+                cls.db.feed_add(f)
+                cls.feeds.append(f)
+            for i in range(EPISODE_CNT):
+                cls.db.episode_add(cls.make_episode(
+                    rnd.choice(cls.feeds),
+                    i,
+                    datetime(2020, 1, 1) + timedelta(hours=rnd.randint(0, 50_000)),
+                    rnd.choice((0, 1200, 3600))))
+            cls.db.db.execute("UPDATE episode SET finished = 1 WHERE id % 3 = 0")
+            cls.db.db.execute("UPDATE episode SET size = 1000, cur_pos = 600 WHERE id % 4 = 0")
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        os.system(f"/bin/rm -rf {cls.folder}")
+
+    @staticmethod
+    def make_episode(f: Feed, num: int, published: datetime, duration: int) -> Episode:
+        """Create an Episode that is not in the database, yet."""
+        return Episode(
+            epid=0,
+            feed_id=f.fid,
+            number=num,
+            # Some titles occur more than once.
+            title=f"Episode {num % (EPISODE_CNT // 2)}",
+            url=f"http://127.0.0.1/{f.fid}/{num}.mp3",
+            published=published,
+            link="",
+            mime_type="audio/mpeg",
+            cur_pos=0,
+            finished=False,
+            path=os.path.join(f.folder, f"{num}.mp3"),
+            keep=False,
+            description="",
+            duration=duration,
+        )
+
+    def expect_totals(self, sel: Selection) -> dict[int, Totals]:
+        """Add up the Episodes in a Selection the slow way."""
+        db = self.__class__.db
+        totals: dict[int, Totals] = {}
+        for e in db.episode_get_all():
+            if sel.feed_id is not None and e.feed_id != sel.feed_id:
+                continue
+            if sel.finished is not None and e.finished != sel.finished:
+                continue
+            t = totals.setdefault(e.feed_id, Totals())
+            t.episodes += 1
+            t.unplayed += not e.finished
+            t.downloaded += e.size > 0
+            t.duration += max(e.duration, 0)
+            if not e.finished:
+                t.remaining += max(e.duration - e.cur_pos, 0)
+        return totals
+
+    def check_totals(self) -> None:
+        """Compare the totals of all Feeds, of one Feed, and of a Selection
+        that has to go through the Episodes with those added up the slow
+        way."""
+        db = self.__class__.db
+        fid = self.__class__.feeds[0].fid
+        for sel in (Selection(), Selection(feed_id=fid), Selection(finished=False)):
+            with self.subTest(sel=sel):
+                self.assertEqual(db.episode_totals(sel), self.expect_totals(sel))
+
+    def test_01_sort(self) -> None:
+        """The list is sorted like the Episodes from the database sorted in
+        Python, ties broken by ID."""
+        db = self.__class__.db
+        episodes = db.episode_get_all()
+        for column in LIST_ORDER:
+            for desc in (True, False):
+                with self.subTest(column=column, descending=desc):
+                    expect = sorted(episodes,
+                                    key=lambda e, c=column: (getattr(e, c), e.epid),
+                                    reverse=desc)
+                    self.assertEqual(db.episode_list(Selection(), column, desc),
+                                     [(e.epid, e.title) for e in expect])
+        self.assertEqual(len(db.episode_list(Selection(), limit=10)), 10)
+        with self.assertRaises(ValueError):
+            db.episode_list(Selection(), "url")
+
+    def test_02_select(self) -> None:
+        """Filters pick the same Episodes as filtering in Python."""
+        db = self.__class__.db
+        fid = self.__class__.feeds[1].fid
+        cutoff = datetime(2022, 1, 1)
+        sel = Selection(feed_id=fid, published_before=cutoff, finished=False, downloaded=True)
+        expect = sorted(e.epid for e in db.episode_get_by_feed(fid)
+                        if e.published < cutoff and not e.finished and e.size > 0)
+        self.assertGreater(len(expect), 0)
+        self.assertEqual(sorted(i for i, _ in db.episode_list(sel)), expect)
+
+        ids = [expect[0], expect[-1], 4711]
+        self.assertEqual([i for i, _ in db.episode_list(Selection(ids=ids), "number", False)],
+                         expect[::len(expect)-1])
+
+    def test_03_totals(self) -> None:
+        """The totals kept by the database add up."""
+        self.check_totals()
+
+    def test_04_current(self) -> None:
+        """The totals follow the Episodes as they are added, changed and
+        deleted, and rolled back."""
+        db = self.__class__.db
+        f = self.__class__.feeds[0]
+        e = self.make_episode(f, EPISODE_CNT, datetime(2030, 1, 1), 60)
+        with db:
+            db.episode_add(e)
+            db.episode_set_pos(e, 30)
+            db.episode_set_size(e, 1000)
+            db.episode_set_durations([(e.epid, -1)])
+        self.assertEqual(db.episode_list(Selection(), limit=1), [(e.epid, e.title)])
+        self.check_totals()
+
+        with db:
+            db.episodes_set_finished(Selection(feed_id=f.fid), True)
+        self.assertEqual(db.episode_totals(Selection(feed_id=f.fid))[f.fid].unplayed, 0)
+        with db:
+            db.episodes_set_finished(
+                Selection(feed_id=f.fid, published_before=datetime(2022, 1, 1)), False)
+            db.episodes_reset_pos(Selection(ids=[e.epid]))
+        self.check_totals()
+
+        before = db.episode_totals()
+        with self.assertRaises(RuntimeError):
+            with db:
+                db.episodes_set_finished(Selection(), False)
+                raise RuntimeError("Never mind")
+        self.assertEqual(db.episode_totals(), before)
+
+    def test_05_remove_feed(self) -> None:
+        """Deleting a Feed drops its totals."""
+        db = self.__class__.db
+        f = self.__class__.feeds[-1]
+        with db:
+            db.feed_delete(f)
+        self.assertNotIn(f.fid, db.episode_totals())
+        self.assertEqual(db.episode_totals(Selection(feed_id=f.fid)), {})
+        self.assertEqual(db.episode_list(Selection(feed_id=f.fid)), [])
+        self.check_totals()
+
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
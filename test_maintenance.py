@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-19 21:44:17 krylon>
+#
+# /data/code/python/cephalopod/test_maintenance.py
+# created on 19. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/gpl-3.0
+
+"""
+cephalopod.test_maintenance
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import os
+import unittest
+from datetime import datetime, timedelta
+
+from cephalopod import common, maintenance
+from cephalopod.cast import Episode, Feed
+from cephalopod.database import Database
+from cephalopod.maintenance import Maintenance
+from cephalopod.test_client import TEST_ROOT
+
+
+class MaintenanceTest(unittest.TestCase):
+    """Test maintaining the database."""
+
+    folder: str
+    db: Database
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        stamp = datetime.now()
+        folder_name = \
+            stamp.strftime("cephalopod_test_maintenance_%Y%m%d_%H%M%S")
+        cls.folder = os.path.join(TEST_ROOT, folder_name)
+        common.set_basedir(cls.folder)
+        cls.db = Database()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        os.system(f"/bin/rm -rf {cls.folder}")
+
+    def fill(self, name: str, cnt: int) -> None:
+        """Add a Feed with cnt Episodes, and delete them again, so the
+        database has free pages."""
+        db = self.__class__.db
+        f = Feed(
+            fid=0,
+            feed_url=f"http://127.0.0.1/{name}.rss",
+            homepage="",
+            title=name,
+            description="",
+            cover_url="",
+            last_refresh=datetime.now(),
+            autorefresh=True,
+            folder=os.path.join(common.path.download(), name),
+        )
+        with db:
+            db.feed_add(f)
+            for i in range(cnt):
+                db.episode_add(Episode(
+                    epid=0,
+                    feed_id=f.fid,
+                    number=i,
+                    title=f"{name} {i} " + os.urandom(32).hex(),
+                    url=f"http://127.0.0.1/{name}/{i}.mp3",
+                    published=datetime(2024, 1, 1) + timedelta(hours=i),
+                    link="",
+                    mime_type="audio/mpeg",
+                    cur_pos=0,
+                    finished=False,
+                    path=os.path.join(f.folder, f"{i}.mp3"),
+                    keep=False,
+                    description=os.urandom(256).hex(),
+                ))
+        with db:
+            db.db.execute("DELETE FROM episode_text")
+            db.db.execute("DELETE FROM episode WHERE feed_id = ?", (f.fid, ))
+
+    def test_01_run(self) -> None:
+        """A new database is vacuumed incrementally, and maintenance returns
+        its free pages."""
+        m = Maintenance(self.__class__.db)
+        self.assertEqual(m.usage().auto_vacuum, "incremental")
+        self.fill("alpha", 2000)
+        before = m.usage()
+        self.assertGreater(before.free_pages, 0)
+        self.assertGreater(before.fragmentation, 0.0)
+
+        report = m.run()
+        self.assertEqual([s.name for s in report.steps], ["optimize", "checkpoint", "vacuum"])
+        self.assertTrue(all(s.complete for s in report.steps))
+        self.assertEqual(report.after.free_pages, 0)
+        self.assertLess(report.after.pages, before.pages)
+        self.assertEqual(len(report.lines()), 5)
+
+    def test_02_budget(self) -> None:
+        """A step that runs out of time stops, and carries on next time."""
+        m = Maintenance(self.__class__.db)
+        self.fill("beta", 2000)
+        budget = maintenance.VACUUM_BUDGET
+        step = maintenance.VACUUM_STEP
+        maintenance.VACUUM_BUDGET = 0.0
+        maintenance.VACUUM_STEP = 1
+        try:
+            report = m.run()
+        finally:
+            maintenance.VACUUM_BUDGET = budget
+            maintenance.VACUUM_STEP = step
+        self.assertFalse(report.steps[-1].complete)
+        self.assertGreater(report.after.free_pages, 0)
+        self.assertEqual(m.run().after.free_pages, 0)
+
+    def test_03_rebuild(self) -> None:
+        """A database without auto_vacuum is converted by a rebuild."""
+        db = self.__class__.db
+        db.db.execute("PRAGMA auto_vacuum = NONE")
+        db.db.execute("VACUUM")
+        m = Maintenance(db)
+        self.assertEqual(m.usage().auto_vacuum, "none")
+        self.fill("gamma", 500)
+        self.assertTrue(m.run().steps[-1].complete)
+        self.assertGreater(m.usage().free_pages, 0)
+
+        report = m.rebuild()
+        self.assertEqual(report.after.auto_vacuum, "incremental")
+        self.assertEqual(report.after.free_pages, 0)
+
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
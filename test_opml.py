@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-19 17:58:21 krylon>
+#
+# /data/code/python/cephalopod/test_opml.py
+# created on 19. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/gpl-3.0
+
+"""
+cephalopod.test_opml
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import io
+import os
+import tempfile
+import tracemalloc
+import unittest
+from datetime import datetime
+from typing import Final
+
+from cephalopod import opml
+from cephalopod.cast import Feed
+
+EXAMPLE_OPML: Final[str] = """<?xml version="1.0" encoding="utf-8"?>
+<opml version="1.0">
+  <head><title>Subscriptions</title></head>
+  <body>
+    <outline text="Science">
+      <outline type="rss" text="Sternengeschichten"
+               xmlUrl="http://feeds.feedburner.com/sternengeschichten"/>
+      <outline type="rss" title="Methodisch inkorrekt"
+               xmlUrl=" https://minkorrekt.de/feed/m4a/ "/>
+    </outline>
+    <outline text="Not a feed"/>
+    <outline type="rss" text="Logbuch &amp; Netzpolitik"
+             xmlUrl="https://logbuch-netzpolitik.de/feed/m4a"/>
+  </body>
+</opml>
+"""
+
+
+class OPMLTest(unittest.TestCase):
+    """Test reading and writing OPML files."""
+
+    def test_01_read(self) -> None:
+        """Read feeds from nested outlines."""
+        feeds = list(opml.read(io.BytesIO(EXAMPLE_OPML.encode("utf-8"))))
+        self.assertEqual(feeds, [
+            ("http://feeds.feedburner.com/sternengeschichten", "Sternengeschichten"),
+            ("https://minkorrekt.de/feed/m4a/", "Methodisch inkorrekt"),
+            ("https://logbuch-netzpolitik.de/feed/m4a", "Logbuch & Netzpolitik"),
+        ])
+
+    def test_02_roundtrip(self) -> None:
+        """Write a list of feeds and read it back."""
+        feeds = [Feed(
+            fid=i,
+            feed_url=f"https://example.com/feed?id={i}&format=<mp3>",
+            homepage="https://example.com/",
+            title=f"Podcast \"{i}\" & friends",
+            description="",
+            cover_url="",
+            last_refresh=datetime.fromtimestamp(0),
+            autorefresh=True,
+            folder=f"/tmp/{i}",
+        ) for i in range(100)]
+        buf = io.StringIO()
+        self.assertEqual(opml.write(iter(feeds), buf), 100)
+        result = list(opml.read(io.BytesIO(buf.getvalue().encode("utf-8"))))
+        self.assertEqual(result, [(f.feed_url, f.title) for f in feeds])
+
+    def test_03_urls(self) -> None:
+        """Read URLs from OPML files and plain lists alike."""
+        with tempfile.TemporaryDirectory() as folder:
+            plain = os.path.join(folder, "feeds.txt")
+            with open(plain, "w", encoding="utf-8") as fh:
+                fh.write("# My feeds\n"
+                         "https://a.example.com/feed\n\n"
+                         "  https://b.example.com/feed\n")
+            self.assertEqual(list(opml.urls(plain)),
+                             ["https://a.example.com/feed", "https://b.example.com/feed"])
+
+            xml = os.path.join(folder, "feeds.opml")
+            with open(xml, "w", encoding="utf-8") as fh:
+                fh.write(EXAMPLE_OPML)
+            self.assertEqual(len(list(opml.urls(xml))), 3)
+
+    def test_04_large(self) -> None:
+        """Reading a large file does not keep the outlines we are done
+        with around."""
+        cnt: Final[int] = 50_000
+        doc = io.BytesIO(("<opml version=\"2.0\"><body><outline text=\"Folder\">"
+                          + "".join(f'<outline type="rss" text="Feed {i}" '
+                                    f'xmlUrl="https://example.com/{i}.rss"/>'
+                                    for i in range(cnt))
+                          + "</outline></body></opml>").encode("utf-8"))
+        tracemalloc.start()
+        try:
+            self.assertEqual(sum(1 for _ in opml.read(doc)), cnt)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        # All the outlines would take several MB.
+        self.assertLess(peak, 1 << 20)
+
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
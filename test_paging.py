@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-19 18:47:13 krylon>
+#
+# /data/code/python/cephalopod/test_paging.py
+# created on 19. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/gpl-3.0
+
+"""
+cephalopod.test_paging
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import unittest
+
+import feedparser
+
+from cephalopod import paging
+from cephalopod.test_example_feed import EXAMPLE_FEED
+
+
+def links_feed(*links: tuple[str, str]) -> str:
+    """Create an empty feed with the given links."""
+    atom = "".join(f'<atom:link rel="{rel}" href="{href}"/>' for rel, href in links)
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom">
+  <channel><title>Test</title>{atom}</channel>
+</rss>"""
+
+
+class PagingTest(unittest.TestCase):
+    """Test finding the pages of paged feeds."""
+
+    def test_01_example(self) -> None:
+        """Find the page links in the example feed."""
+        d = feedparser.parse(EXAMPLE_FEED)
+        lnk = paging.links(d)
+        self.assertEqual(lnk["first"],
+                         "https://sternengeschichten.podigee.io/feeds/scienceblogs/mp3")
+        self.assertIsNone(paging.older(d))
+        self.assertEqual(paging.numbered_pages(d),
+                         ["https://sternengeschichten.podigee.io/feeds/scienceblogs/mp3?page=1"])
+
+    def test_02_numbered(self) -> None:
+        """Compute the pages between the first and the last."""
+        d = feedparser.parse(links_feed(
+            ("first", "https://example.com/feed?format=mp3&page=2"),
+            ("last", "https://example.com/feed?format=mp3&page=5"),
+            ("next", "https://example.com/feed?format=mp3&page=3"),
+        ))
+        self.assertEqual(paging.numbered_pages(d),
+                         [f"https://example.com/feed?format=mp3&page={i}" for i in range(2, 6)])
+        self.assertEqual(paging.older(d), "https://example.com/feed?format=mp3&page=3")
+
+    def test_03_unnumbered(self) -> None:
+        """Pages that do not differ in a number must be followed one by one."""
+        d = feedparser.parse(links_feed(
+            ("first", "https://example.com/feed"),
+            ("last", "https://example.com/archive/2019.xml"),
+            ("prev-archive", "https://example.com/archive/2023.xml"),
+        ))
+        self.assertEqual(paging.numbered_pages(d), [])
+        self.assertEqual(paging.older(d), "https://example.com/archive/2023.xml")
+
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-20 03:12:40 krylon>
+#
+# /data/code/python/cephalopod/test_playqueue.py
+# created on 20. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/gpl-3.0
+
+"""
+cephalopod.test_playqueue
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import os
+import random
+import unittest
+from datetime import datetime, timedelta
+from typing import Final, Optional
+
+from cephalopod import common
+from cephalopod.cast import Episode, Feed
+from cephalopod.database import Database
+from cephalopod.playqueue import (BASE, DIGITS, RANK_MAX, PlayQueue,
+                                  rank_between, rank_spread)
+from cephalopod.test_client import TEST_ROOT
+
+EPISODE_CNT: Final[int] = 20
+
+
+class PlayQueueTest(unittest.TestCase):
+    """Test the queue of Episodes to listen to next."""
+
+    folder: str
+    db: Database
+    feeds: list[Feed]
+    episodes: list[Episode]
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        stamp = datetime.now()
+        folder_name = \
+            stamp.strftime("cephalopod_test_playqueue_%Y%m%d_%H%M%S")
+        cls.folder = os.path.join(TEST_ROOT, folder_name)
+        common.set_basedir(cls.folder)
+        cls.db = Database()
+        cls.feeds = []
+        cls.episodes = []
+        with cls.db:
+            for name in ("alpha", "beta"):
+                f = Feed(
+                    fid=0,
+                    feed_url=f"http://127.0.0.1/{name}.rss",
+                    homepage="",
+                    title=name,
+                    description="",
+                    cover_url="",
+                    last_refresh=datetime.now(),
+                    autorefresh=True,
+                    folder=os.path.join(common.path.download(), name),
+                )
+                cls.db.feed_add(f)
+                cls.feeds.append(f)
+                for i in range(EPISODE_CNT // 2):
+                    ep = Episode(
+                        epid=0,
+                        feed_id=f.fid,
+                        number=i,
+                        title=f"{name} {i}",
+                        url=f"http://127.0.0.1/{name}/{i}.mp3",
+                        published=datetime(2026, 1, 1) + timedelta(days=i),
+                        link="",
+                        mime_type="audio/mpeg",
+                        cur_pos=0,
+                        finished=False,
+                        path=os.path.join(f.folder, f"{i}.mp3"),
+                        keep=False,
+                        description="",
+                    )
+                    cls.db.episode_add(ep)
+                    cls.episodes.append(ep)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        os.system(f"/bin/rm -rf {cls.folder}")
+
+    def test_01_rank_between(self) -> None:
+        """New ranks always fit between their neighbours, and never end in
+        the lowest digit."""
+        rnd: Final[random.Random] = random.Random(17)
+        ranks: Final[list[str]] = []
+        for _ in range(2000):
+            idx = rnd.randint(0, len(ranks))
+            lo = ranks[idx - 1] if idx > 0 else ""
+            hi: Optional[str] = ranks[idx] if idx < len(ranks) else None
+            rank = rank_between(lo, hi)
+            self.assertLess(lo, rank)
+            if hi is not None:
+                self.assertLess(rank, hi)
+            self.assertNotEqual(rank[-1], DIGITS[0])
+            ranks.insert(idx, rank)
+        self.assertEqual(ranks, sorted(set(ranks)))
+
+        with self.assertRaises(ValueError):
+            rank_between("V", "V")
+
+    def test_02_rank_growth(self) -> None:
+        """Adding at either end uses up a digit only every so often."""
+        last: str = ""
+        first: Optional[str] = None
+        for _ in range(1000):
+            last = rank_between(last, None)
+            first = rank_between("", first)
+        self.assertLessEqual(len(last), 1000 // (BASE - 1) + 2)
+        assert first is not None
+        self.assertLessEqual(len(first), 1000 // (BASE - 1) + 2)
+
+    def test_03_rank_spread(self) -> None:
+        """Spread ranks are ordered, unique and short."""
+        for cnt in (0, 1, 61, 62, 1000, 5000):
+            with self.subTest(cnt=cnt):
+                ranks = rank_spread(cnt)
+                self.assertEqual(len(ranks), cnt)
+                self.assertEqual(ranks, sorted(set(ranks)))
+                self.assertTrue(all(r[-1] != DIGITS[0] for r in ranks))
+                self.assertLessEqual(max((len(r) for r in ranks), default=0),
+                                     1 if cnt < BASE else 3)
+
+    def test_04_order(self) -> None:
+        """Episodes come out of the queue in the order they were put in,
+        and moving or removing one changes one row."""
+        db = self.__class__.db
+        pq = PlayQueue(db)
+        eps = [e.epid for e in self.__class__.episodes]
+        for epid in eps[:5]:
+            pq.add(epid)
+        self.assertEqual(pq.next(), eps[:5])
+        self.assertEqual(pq.next(2), eps[:2])
+
+        for op, expect in ((lambda: pq.move(eps[4]), [4, 0, 1, 2, 3]),
+                           (lambda: pq.move(eps[0], eps[2]), [4, 1, 2, 0, 3]),
+                           (lambda: pq.move(eps[5], eps[1]), [4, 1, 5, 2, 0, 3]),
+                           (lambda: pq.add(eps[4]), [1, 5, 2, 0, 3, 4]),
+                           (lambda: pq.remove(eps[2]), [1, 5, 0, 3, 4])):
+            before = db.db.total_changes
+            op()
+            self.assertEqual(db.db.total_changes - before, 1)
+            self.assertEqual(pq.next(), [eps[i] for i in expect])
+
+        # Putting an Episode where it is already changes nothing.
+        before = db.db.total_changes
+        rank = db.queue_rank(eps[4])
+        self.assertEqual(pq.add(eps[4]), rank)
+        self.assertEqual(pq.move(eps[5], eps[1]), db.queue_rank(eps[5]))
+        self.assertEqual(db.db.total_changes, before)
+
+        self.assertFalse(pq.remove(eps[2]))
+        with self.assertRaises(ValueError):
+            pq.move(eps[1], eps[1])
+        with self.assertRaises(ValueError):
+            pq.move(eps[1], eps[2])
+
+    def test_05_rebalance(self) -> None:
+        """Moving Episodes to the same spot over and over makes the ranks
+        longer, until rebalancing spreads them out again."""
+        db = self.__class__.db
+        pq = PlayQueue(db)
+        self.assertEqual(pq.rebalance(), 0)
+        eps = [e.epid for e in self.__class__.episodes]
+        for epid in eps:
+            pq.add(epid)
+        # Squeeze Episodes in right behind the first one, alternating
+        # between two of them, so the gap keeps getting narrower.
+        for i in range(BASE * RANK_MAX):
+            pq.move(eps[1 + i % 2], eps[0])
+        order = pq.next(-1)
+        self.assertEqual(order[:3], [eps[0], eps[2], eps[1]])
+        self.assertGreater(max(len(r) for _, r in db.queue_get()), RANK_MAX)
+
+        self.assertEqual(pq.rebalance(), len(eps))
+        self.assertEqual(pq.next(-1), order)
+        self.assertLessEqual(max(len(r) for _, r in db.queue_get()), 1)
+        self.assertEqual(pq.rebalance(), 0)
+
+    def test_06_feed_delete(self) -> None:
+        """Deleting a Feed takes its Episodes out of the queue."""
+        db = self.__class__.db
+        alpha, beta = self.__class__.feeds
+        queued = PlayQueue(db).next(-1)
+        with db:
+            counts = db.feed_delete(alpha)
+        self.assertEqual(counts["queued"], EPISODE_CNT // 2)
+        remaining = [e.epid for e in self.__class__.episodes if e.feed_id == beta.fid]
+        self.assertEqual(PlayQueue(db).next(-1), [i for i in queued if i in remaining])
+
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
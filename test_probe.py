@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-19 15:58:12 krylon>
+#
+# /data/code/python/cephalopod/test_probe.py
+# created on 19. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/gpl-3.0
+
+"""
+cephalopod.test_probe
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import os
+import re
+import socket
+import struct
+import unittest
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Event, Thread
+from typing import Final
+
+from cephalopod import common, probe
+from cephalopod.cast import Episode, Feed
+from cephalopod.database import Database
+from cephalopod.scheduler import FetchScheduler
+from cephalopod.test_client import TEST_ROOT
+
+# MPEG-1 Layer III, 128 kbit/s, 44.1 kHz, stereo
+MP3_FRAME: Final[bytes] = b"\xff\xfb\x90\x00"
+
+
+class FakeFile:
+    """A media file in memory that counts how much of it has been read."""
+
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+        self.read = 0
+
+    def fetch(self, offset: int, length: int) -> bytes:
+        """Return length bytes at offset."""
+        chunk = self.data[offset:offset+length]
+        self.read += len(chunk)
+        return chunk
+
+
+class MediaHandler(BaseHTTPRequestHandler):
+    """Serve a media file, honouring Range requests or not, and count the
+    requests and the bytes sent."""
+
+    data: bytes = b""
+    ranges: bool = True
+    requests: int = 0
+    sent: int = 0
+    done: Event = Event()
+
+    def do_GET(self) -> None:  # pylint: disable-msg=C0103
+        """Handle a GET request."""
+        cls = self.__class__
+        cls.requests += 1
+        m = re.match(r"bytes=(\d+)-(\d+)", self.headers.get("Range", ""))
+        if cls.ranges and m is not None:
+            lo, hi = int(m[1]), min(int(m[2]), len(cls.data) - 1)
+            body = cls.data[lo:hi+1]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {lo}-{hi}/{len(cls.data)}")
+        else:
+            body = cls.data
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            for i in range(0, len(body), 4096):
+                self.wfile.write(body[i:i+4096])
+                cls.sent += min(4096, len(body) - i)
+        except OSError:
+            # The client hung up.
+            pass
+        cls.done.set()
+
+    def log_message(self, *args) -> None:  # pylint: disable-msg=W0221
+        pass
+
+
+def id3_tag(size: int) -> bytes:
+    """Create an empty ID3v2 tag of the given size, excluding its header."""
+    syncsafe = bytes((size >> s) & 0x7F for s in (21, 14, 7, 0))
+    return b"ID3\x04\x00\x00" + syncsafe + bytes(size)
+
+
+def mp4_atom(kind: bytes, payload: bytes) -> bytes:
+    """Create an MP4 atom."""
+    return struct.pack(">I4s", len(payload) + 8, kind) + payload
+
+
+def mp4_moov(timescale: int, duration: int) -> bytes:
+    """Create a moov atom containing a version 0 mvhd atom."""
+    mvhd = struct.pack(">B3xIIII", 0, 0, 0, timescale, duration) + bytes(80)
+    return mp4_atom(b"moov", mp4_atom(b"mvhd", mvhd))
+
+
+class ProbeTest(unittest.TestCase):
+    """Test finding out the duration of media files from their headers."""
+
+    def test_01_itunes_duration(self) -> None:
+        """Parse the various formats of itunes:duration."""
+        cases = (
+            ("538", 538),
+            ("08:58", 538),
+            ("1:02:03", 3723),
+            (" 42 ", 42),
+            ("12.5", 12),
+            ("", 0),
+            ("eine Stunde", 0),
+        )
+        for s, expected in cases:
+            with self.subTest(s=s):
+                self.assertEqual(probe.parse_itunes_duration(s), expected)
+
+    def test_02_mp3_xing(self) -> None:
+        """Read the frame count from a Xing header behind an ID3 tag."""
+        xing = b"Xing" + struct.pack(">II", 1, 1000)
+        data = id3_tag(500) + MP3_FRAME + bytes(32) + xing + bytes(1 << 20)
+        f = FakeFile(data)
+        seconds = probe.mp3_duration(f.fetch, len(data))
+        self.assertIsNotNone(seconds)
+        self.assertAlmostEqual(seconds, 1000 * 1152 / 44100)  # type: ignore
+        self.assertLess(f.read, 4 * probe.HEAD_SIZE)
+
+    def test_03_mp3_cbr(self) -> None:
+        """Estimate the duration of a constant bitrate file from its size."""
+        audio = MP3_FRAME + bytes(10 * 16000 - 4)
+        data = id3_tag(100) + audio + b"TAG" + bytes(125)
+        f = FakeFile(data)
+        seconds = probe.mp3_duration(f.fetch, len(data))
+        self.assertAlmostEqual(seconds, 10.0)  # type: ignore
+        self.assertLess(f.read, 4 * probe.HEAD_SIZE)
+
+    def test_04_mp3_garbage(self) -> None:
+        """Data without a frame header has no duration."""
+        data = bytes(range(128)) * 64
+        self.assertIsNone(probe.mp3_duration(FakeFile(data).fetch, len(data)))
+
+    def test_05_mp4(self) -> None:
+        """Find the mvhd atom in front of and behind the media data."""
+        ftyp = mp4_atom(b"ftyp", b"M4A \x00\x00\x00\x00")
+        mdat = mp4_atom(b"mdat", bytes(1 << 20))
+        moov = mp4_moov(1000, 3600 * 1000)
+        for name, data in (("front", ftyp + moov + mdat), ("back", ftyp + mdat + moov)):
+            with self.subTest(layout=name):
+                f = FakeFile(data)
+                seconds = probe.mp4_duration(f.fetch, len(data))
+                self.assertAlmostEqual(seconds, 3600.0)  # type: ignore
+                self.assertLess(f.read, 4 * probe.HEAD_SIZE)
+
+    def test_06_mp4_truncated(self) -> None:
+        """A file without a moov atom has no duration."""
+        data = mp4_atom(b"ftyp", b"M4A \x00\x00\x00\x00") + mp4_atom(b"mdat", bytes(1024))
+        self.assertIsNone(probe.mp4_duration(FakeFile(data).fetch, len(data)))
+
+    def test_07_no_ranges(self) -> None:
+        """A server that ignores Range requests is asked once, and only the
+        start of the file is read. If that is not enough, we give up rather
+        than download the file."""
+        ftyp = mp4_atom(b"ftyp", b"M4A \x00\x00\x00\x00")
+        mdat = mp4_atom(b"mdat", bytes(16 << 20))
+        moov = mp4_moov(1000, 3600 * 1000)
+        server = ThreadingHTTPServer(("127.0.0.1", 0), MediaHandler)
+        Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}/episode.m4a"
+        try:
+            for ranges, data, expected in ((True, ftyp + mdat + moov, 3600),
+                                           (False, ftyp + moov + mdat, 3600),
+                                           (False, ftyp + mdat + moov, None)):
+                with self.subTest(ranges=ranges, moov_first=data[24:28] == b"moov"):
+                    MediaHandler.data = data
+                    MediaHandler.ranges = ranges
+                    MediaHandler.requests = 0
+                    MediaHandler.sent = 0
+                    MediaHandler.done.clear()
+                    self.assertEqual(probe.probe_url(url, "audio/mp4"), expected)
+                    if not ranges:
+                        self.assertTrue(MediaHandler.done.wait(10))
+                        self.assertEqual(MediaHandler.requests, 1)
+                        # Whatever the socket buffers took, it is nowhere
+                        # near the entire file.
+                        self.assertLess(MediaHandler.sent, len(data) // 2)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_08_prober(self) -> None:
+        """Episodes whose file makes no sense are marked as failed, those
+        we cannot fetch are left alone and tried again later."""
+        folder = os.path.join(
+            TEST_ROOT,
+            datetime.now().strftime("cephalopod_test_probe_%Y%m%d_%H%M%S"))
+        common.set_basedir(folder)
+        # A port nobody listens on.
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            closed: Final[int] = sock.getsockname()[1]
+        server = ThreadingHTTPServer(("127.0.0.1", 0), MediaHandler)
+        Thread(target=server.serve_forever, daemon=True).start()
+        MediaHandler.data = b"This is not an MP3 file." * 1024
+        MediaHandler.ranges = True
+        db = Database()
+        prober = probe.Prober(db, FetchScheduler())
+        try:
+            f = Feed(fid=0, feed_url="http://127.0.0.1/feed.rss", homepage="",
+                     title="Feed", description="", cover_url="",
+                     last_refresh=datetime.now(), autorefresh=True,
+                     folder=common.path.download())
+            episodes: Final[list[Episode]] = []
+            with db:
+                db.feed_add(f)
+                for port in (server.server_address[1], closed):
+                    e = Episode(epid=0, feed_id=f.fid, number=port, title=f"Port {port}",
+                                url=f"http://127.0.0.1:{port}/{port}.mp3",
+                                published=datetime.now(), link="", mime_type="audio/mpeg",
+                                cur_pos=0, finished=False,
+                                path=os.path.join(f.folder, f"{port}.mp3"), keep=False,
+                                description="")
+                    db.episode_add(e)
+                    episodes.append(e)
+
+            self.assertEqual(prober.run(), 0)
+            durations = {e.epid: e.duration for e in db.episode_get_all()}
+            self.assertEqual(durations[episodes[0].epid], -1)
+            self.assertEqual(durations[episodes[1].epid], 0)
+            self.assertIn(episodes[1].epid, prober.retry)
+            # The unreachable Episode waits for its turn.
+            MediaHandler.requests = 0
+            self.assertEqual(prober.run(), 0)
+            self.assertEqual(MediaHandler.requests, 0)
+            self.assertEqual([e.epid for e in db.episode_get_no_duration()], [episodes[1].epid])
+        finally:
+            prober.close()
+            server.shutdown()
+            server.server_close()
+            os.system(f"/bin/rm -rf {folder}")
+
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
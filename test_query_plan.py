@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-19 22:41:09 krylon>
+#
+# /data/code/python/cephalopod/test_query_plan.py
+# created on 19. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/gpl-3.0
+
+"""
+cephalopod.test_query_plan
+
+(c) 2026 Benjamin Walkenhorst
+
+Make sure none of our queries scans a table or sorts its results in a
+temporary B-tree, unless it is listed below with the reason why that is
+fine. A new query, or a change to the schema, that turns an index lookup
+into a scan makes this test fail.
+"""
+
+import os
+import random
+import unittest
+from datetime import datetime
+from typing import Final
+
+from cephalopod import common
+from cephalopod.database import Database, Query, db_queries
+from cephalopod.test_client import TEST_ROOT
+
+FEED_CNT: Final[int] = 200
+EPISODE_CNT: Final[int] = 50_000
+
+# The steps of a query plan that are fine, by query.
+WHITELIST: Final[dict[Query, set[str]]] = {
+    # These return every Feed there is, and there are few of them.
+    Query.FeedGetAll: {"SCAN feed"},
+    Query.FeedGetVersions: {"SCAN feed"},
+    Query.FeedTotalsGet: {"SCAN feed_totals"},
+    Query.DiskUsage: {"SCAN f"},
+    # These return every Episode, in the order of the index they scan.
+    Query.EpisodeGetAll: {"SCAN episode USING INDEX episode_published_idx"},
+    Query.EpisodeGetKeys: {"SCAN episode USING INDEX episode_published_idx"},
+    # These scan a partial index that only holds the rows they want.
+    Query.EpisodeGetNoDuration: {"SCAN episode USING INDEX episode_no_duration_idx"},
+    Query.DiskCandidates: {"SCAN episode USING INDEX episode_disk_idx"},
+    # These stop after a few rows, in the order of the primary key.
+    Query.TextGetSample: {"SCAN episode_text"},
+    Query.DictGetCurrent: {"SCAN text_dict"},
+    # The head of the queue, in the order of the index on its ranks.
+    Query.QueueGet: {"SCAN play_queue USING COVERING INDEX play_queue_rank_idx"},
+    # Rebalancing rewrites the entire queue, which is short.
+    Query.QueueClear: {"SCAN play_queue"},
+    # Grouping in a temporary B-tree is cheaper than visiting the rows in
+    # the order of episode_feed_idx, see the query.
+    Query.EpisodeTotals: {"USE TEMP B-TREE FOR GROUP BY"},
+    # Counting rows takes a scan, SQLite picks the smallest index for it.
+    Query.Stats: {
+        "SCAN CONSTANT ROW",
+        "SCAN feed",
+        "SCAN feed USING COVERING INDEX feed_auto_idx",
+        "SCAN episode USING COVERING INDEX episode_keep_idx",
+        "SCAN episode USING COVERING INDEX episode_finished_idx",
+        "SCAN episode_text",
+    },
+}
+
+
+def normalize(step: str) -> str:
+    """Remove the differences between the output of SQLite versions."""
+    return step.replace("SCAN TABLE ", "SCAN ").replace("SEARCH TABLE ", "SEARCH ")
+
+
+class QueryPlanTest(unittest.TestCase):
+    """Check the query plans of all queries against a large database."""
+
+    folder: str
+    db: Database
+    plans: dict[Query, list[str]]
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        stamp = datetime.now()
+        folder_name = \
+            stamp.strftime("cephalopod_test_query_plan_%Y%m%d_%H%M%S")
+        cls.folder = os.path.join(TEST_ROOT, folder_name)
+        common.set_basedir(cls.folder)
+        cls.db = Database()
+        cls.seed(cls.db)
+
+        cls.plans = {}
+        for q, sql in db_queries.items():
+            # The bulk updates and the episode list get the conditions of a
+            # typical Selection, the list its default order, queries with a
+            # variable number of parameters get three.
+            sql = sql.replace("AND ({})", "AND (feed_id = ? AND published < ?)")
+            sql = sql.replace("ORDER BY {}", "ORDER BY published DESC, id DESC")
+            sql = sql.replace("WHERE {}", "WHERE feed_id = ? AND published < ?")
+            sql = sql.replace("{}", "?, ?, ?")
+            cur = cls.db.db.execute("EXPLAIN QUERY PLAN " + sql, [1] * sql.count("?"))
+            cls.plans[q] = [normalize(row[3]) for row in cur.fetchall()]
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        os.system(f"/bin/rm -rf {cls.folder}")
+
+    @staticmethod
+    def seed(db: Database) -> None:
+        """Fill the database with plenty of rows, and gather statistics
+        about them, as maintenance does."""
+        rnd: Final[random.Random] = random.Random(42)
+        with db:
+            db.db.executemany(
+                """
+INSERT INTO feed (id, feed_url, title, folder, autorefresh) VALUES (?, ?, ?, ?, ?)
+                """,
+                ((i, f"http://127.0.0.1/{i}.rss", f"Feed {i}", f"/tmp/{i}", i % 5 != 0)
+                 for i in range(1, FEED_CNT + 1)))
+            db.db.executemany(
+                """
+INSERT INTO episode (feed_id, title, url, published, path, url_key, duration, finished,
+                     keep, size)
+             VALUES (      ?,     ?,   ?,         ?,    ?,       ?,        ?,        ?,
+                        ?,    ?)
+                """,
+                ((rnd.randint(1, FEED_CNT),
+                  f"Episode {i}",
+                  f"http://127.0.0.1/{i}.mp3",
+                  rnd.randint(0, 2_000_000_000),
+                  f"/tmp/{i}.mp3",
+                  rnd.getrandbits(63),
+                  rnd.choice((0, 1800, 3600)),
+                  rnd.random() < 0.7,
+                  rnd.random() < 0.05,
+                  rnd.choice((0, 0, 0, 50_000_000)))
+                 for i in range(EPISODE_CNT)))
+            db.db.executemany(
+                "INSERT INTO websub (feed_id, hub, topic, expires) VALUES (?, ?, ?, ?)",
+                ((i, "http://127.0.0.1/hub", f"http://127.0.0.1/{i}.rss", i)
+                 for i in range(1, FEED_CNT // 2)))
+            db.db.executemany("INSERT INTO text_dict (data) VALUES (?)", [(b"dict", )] * 3)
+            db.db.executemany(
+                "INSERT INTO episode_text (episode_id, dict_id, size, body) VALUES (?, ?, ?, ?)",
+                ((i, i % 4, 4, b"text") for i in range(1, EPISODE_CNT // 2)))
+        db.db.execute("ANALYZE")
+
+    def test_01_no_scans(self) -> None:
+        """No query scans a table, unless it is whitelisted."""
+        for q, plan in self.__class__.plans.items():
+            allowed = WHITELIST.get(q, set())
+            with self.subTest(query=q.name):
+                scans = [s for s in plan if s.startswith("SCAN") and s not in allowed]
+                self.assertEqual(scans, [], f"{q.name} scans: {plan}")
+
+    def test_02_no_temp_btree(self) -> None:
+        """No query sorts or groups in a temporary B-tree, unless it is
+        whitelisted."""
+        for q, plan in self.__class__.plans.items():
+            allowed = WHITELIST.get(q, set())
+            with self.subTest(query=q.name):
+                sorts = [s for s in plan if "TEMP B-TREE" in s and s not in allowed]
+                self.assertEqual(sorts, [], f"{q.name} sorts: {plan}")
+
+    def test_03_whitelist_current(self) -> None:
+        """Whitelisted steps still occur, so the whitelist does not
+        silently cover a query that has been fixed or removed."""
+        plans = self.__class__.plans
+        for q, allowed in WHITELIST.items():
+            with self.subTest(query=q.name):
+                self.assertIn(q, plans)
+                self.assertEqual(allowed - set(plans[q]), set())
+
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
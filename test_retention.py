@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-19 20:38:51 krylon>
+#
+# /data/code/python/cephalopod/test_retention.py
+# created on 19. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/gpl-3.0
+
+"""
+cephalopod.test_retention
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import os
+import unittest
+from datetime import datetime, timedelta
+from typing import Final
+
+from cephalopod import common
+from cephalopod.cast import Episode, Feed
+from cephalopod.database import Database, file_size
+from cephalopod.retention import Retention
+from cephalopod.test_client import TEST_ROOT
+
+# The size of each download, in blocks of 4 KiB, so it does not depend
+# on how the file system rounds.
+FILE_SIZE: Final[int] = 64 * 4096
+
+
+class RetentionTest(unittest.TestCase):
+    """Test enforcing the download quotas."""
+
+    folder: str
+    db: Database
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        stamp = datetime.now()
+        folder_name = \
+            stamp.strftime("cephalopod_test_retention_%Y%m%d_%H%M%S")
+        cls.folder = os.path.join(TEST_ROOT, folder_name)
+        common.set_basedir(cls.folder)
+        cls.db = Database()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        os.system(f"/bin/rm -rf {cls.folder}")
+
+    def make_feed(self, name: str, cnt: int) -> tuple[Feed, list[Episode]]:
+        """Create a Feed with cnt downloaded Episodes, the oldest first."""
+        db = self.__class__.db
+        f = Feed(
+            fid=0,
+            feed_url=f"http://127.0.0.1/{name}.rss",
+            homepage="",
+            title=name,
+            description="",
+            cover_url="",
+            last_refresh=datetime.now(),
+            autorefresh=True,
+            folder=os.path.join(common.path.download(), name),
+        )
+        os.makedirs(f.folder)
+        episodes: list[Episode] = []
+        start = datetime(2024, 1, 1)
+        with db:
+            db.feed_add(f)
+            for i in range(cnt):
+                ep = Episode(
+                    epid=0,
+                    feed_id=f.fid,
+                    number=i,
+                    title=f"{name} {i}",
+                    url=f"http://127.0.0.1/{name}/{i}.mp3",
+                    published=start + timedelta(days=i),
+                    link="",
+                    mime_type="audio/mpeg",
+                    cur_pos=0,
+                    finished=False,
+                    path=os.path.join(f.folder, f"{i}.mp3"),
+                    keep=False,
+                    description="",
+                )
+                db.episode_add(ep)
+                with open(ep.path, "wb") as fh:
+                    fh.write(os.urandom(FILE_SIZE))
+                db.episode_set_size(ep, file_size(ep.path))
+                episodes.append(ep)
+        return f, episodes
+
+    def present(self, episodes: list[Episode]) -> list[int]:
+        """Return the numbers of the Episodes whose files still exist."""
+        return [e.number for e in episodes if os.path.exists(e.path)]
+
+    def test_01_feed_quota(self) -> None:
+        """A Feed over its quota loses its oldest finished downloads, but
+        not those that are unplayed or kept."""
+        db = self.__class__.db
+        f, episodes = self.make_feed("alpha", 6)
+        size = episodes[0].size
+        self.assertGreaterEqual(size, FILE_SIZE)
+        with db:
+            db.feed_set_quota(f, 2 * size)
+            for e in episodes[:5]:
+                db.episode_set_finished(e, True)
+            db.episode_set_keep(episodes[0], True)
+
+        files, freed = Retention(db).run()
+        # Episode 0 is kept, 5 is unplayed, the two of them fill the quota.
+        self.assertEqual(files, 4)
+        self.assertEqual(freed, 4 * size)
+        self.assertEqual(self.present(episodes), [0, 5])
+        self.assertEqual(db.disk_usage()[f.fid], (2 * size, 2 * size))
+        self.assertEqual(Retention(db).run(), (0, 0))
+
+    def test_02_global_quota(self) -> None:
+        """The global quota deletes the oldest finished downloads of all
+        Feeds."""
+        db = self.__class__.db
+        _, beta = self.make_feed("beta", 3)
+        size = beta[0].size
+        with db:
+            for e in beta:
+                db.episode_set_finished(e, True)
+        used = db.stats()["downloads"]
+        self.assertEqual(used, 5 * size)
+
+        files, _ = Retention(db, 4 * size).run()
+        self.assertEqual(files, 1)
+        self.assertEqual(self.present(beta), [1, 2])
+
+    def test_03_check_sizes(self) -> None:
+        """Files removed behind our back are noticed."""
+        db = self.__class__.db
+        _, gamma = self.make_feed("gamma", 2)
+        os.remove(gamma[1].path)
+        with db:
+            self.assertEqual(db.episode_check_sizes(), 1)
+        self.assertEqual(db.episode_get_by_id(gamma[1].epid).size, 0)  # type: ignore
+        self.assertEqual(db.episode_get_by_id(gamma[0].epid).size, gamma[0].size)  # type: ignore
+
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-19 16:58:40 krylon>
+#
+# /data/code/python/cephalopod/test_scheduler.py
+# created on 19. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/gpl-3.0
+
+"""
+cephalopod.test_scheduler
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import time
+import unittest
+from datetime import datetime
+
+from cephalopod import scheduler
+from cephalopod.cast import Feed
+from cephalopod.client import RateLimited
+
+
+def make_feed(fid: int, host: str) -> Feed:
+    """Create a Feed living on the given host."""
+    return Feed(
+        fid=fid,
+        feed_url=f"https://{host}/feed/{fid}.rss",
+        homepage="",
+        title=f"Feed {fid}",
+        description="",
+        cover_url="",
+        last_refresh=datetime.fromtimestamp(0),
+        autorefresh=True,
+        folder=f"/tmp/feed{fid}",
+    )
+
+
+class SchedulerTest(unittest.TestCase):
+    """Test the per-host fetch scheduler."""
+
+    def test_01_token_bucket(self) -> None:
+        """A bucket allows a burst, then limits the rate."""
+        bucket = scheduler.TokenBucket(rate=2.0, burst=3.0)
+        now = bucket.stamp
+        for _i in range(3):
+            self.assertEqual(bucket.delay(now), 0)
+            bucket.take()
+        self.assertAlmostEqual(bucket.delay(now), 0.5)
+        self.assertEqual(bucket.delay(now + 0.5), 0)
+
+    def test_02_interleave(self) -> None:
+        """Hosts take turns, and no host gets more than its share of
+        concurrent requests."""
+        sched = scheduler.FetchScheduler()
+        for i in range(6):
+            sched.put(make_feed(i, "cdn.example.com"))
+        for i in range(6, 9):
+            sched.put(make_feed(i, f"host{i}.example.org"))
+        self.assertEqual(len(sched), 9)
+
+        taken = []
+        while (f := sched.get(0.05)) is not None:
+            taken.append(f)
+        hosts = [scheduler.host_of(f.feed_url) for f in taken]
+        self.assertEqual(hosts.count("cdn.example.com"), scheduler.HOST_CONCURRENCY)
+        self.assertEqual(len(taken), scheduler.HOST_CONCURRENCY + 3)
+        # The second feed from the CDN comes after the other hosts had a turn.
+        self.assertEqual(hosts[0], "cdn.example.com")
+        self.assertNotEqual(hosts[1], "cdn.example.com")
+
+        sched.done(taken[0])
+        f = sched.get(0.05)
+        self.assertIsNotNone(f)
+        self.assertEqual(scheduler.host_of(f.feed_url), "cdn.example.com")  # type: ignore
+
+    def test_03_hold(self) -> None:
+        """A host that asks us to wait is left alone."""
+        sched = scheduler.FetchScheduler()
+        feeds = [make_feed(i, "busy.example.com") for i in range(3)]
+        futures = [sched.put(f) for f in feeds]
+        f = sched.get(0.05)
+        assert f is not None
+        err = RuntimeError("Too many requests")
+
+        # A short wait puts the feed back in the queue.
+        self.assertTrue(sched.hold(f, 0.2, err))
+        self.assertEqual(len(sched), 3)
+        self.assertIsNone(sched.get(0.05))
+        self.assertIs(sched.get(0.5), f)
+
+        # A long one fails the host's feeds, and keeps new ones out.
+        self.assertFalse(sched.hold(f, scheduler.MAX_HOLD * 2, err))
+        self.assertEqual(len(sched), 0)
+        for fut in futures:
+            self.assertIs(fut.exception(0), err)  # type: ignore
+        self.assertIsNone(sched.put(feeds[0]))
+        self.assertIsNotNone(sched.put(make_feed(9, "other.example.com")))
+
+    def test_04_priority(self) -> None:
+        """Urgent feeds jump the queue, and duplicates share a Future."""
+        sched = scheduler.FetchScheduler()
+        feeds = [make_feed(i, f"host{i}.example.com") for i in range(5)]
+        futures = [sched.put(f) for f in feeds]
+        urgent = make_feed(10, "host0.example.com")
+        fut = sched.put(urgent, True)
+        # Queueing a feed again returns its Future, and can make it urgent.
+        self.assertIs(sched.put(feeds[4], True), futures[4])
+        self.assertIs(sched.put(urgent), fut)
+        self.assertEqual(len(sched), 6)
+
+        order = [sched.get(0.05) for _i in range(6)]
+        self.assertEqual([f.fid for f in order[:2]], [10, 4])  # type: ignore
+
+        for f in order:
+            sched.done(f, [f.fid])  # type: ignore
+        self.assertEqual(fut.result(0), [10])  # type: ignore
+        self.assertEqual(futures[4].result(0), [4])  # type: ignore
+        sched.join()
+        self.assertEqual(len(sched), 0)
+
+    def test_05_slot_limited(self) -> None:
+        """A server answering 429 inside a slot delays the next slot on
+        the same host, but not on others."""
+        sched = scheduler.FetchScheduler()
+        url = "https://busy.example.com/feed.rss"
+        with self.assertRaises(RateLimited):
+            with sched.slot(url):
+                raise RateLimited(url, 429, 0.3)
+        start = time.monotonic()
+        with sched.slot("https://other.example.com/feed.rss"):
+            self.assertLess(time.monotonic() - start, 0.1)
+        with sched.slot(url):
+            self.assertGreaterEqual(time.monotonic() - start, 0.25)
+
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
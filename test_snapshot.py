@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-19 12:51:09 krylon>
+#
+# /data/code/python/cephalopod/test_snapshot.py
+# created on 19. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/gpl-3.0
+
+"""
+cephalopod.test_snapshot
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import os
+import unittest
+from datetime import datetime
+
+from krylib import isdir
+
+from cephalopod import common, snapshot
+
+TEST_ROOT: str = "/tmp/"
+
+# On my main development machines, I have a RAM disk mounted at /data/ram.
+# If it's available, I'd rather use that than /tmp which might live on disk.
+if isdir("/data/ram"):
+    TEST_ROOT = "/data/ram"
+
+
+class SnapshotTest(unittest.TestCase):
+    """Test saving and loading GUI snapshots."""
+
+    folder: str
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        stamp = datetime.now()
+        folder_name = \
+            stamp.strftime("cephalopod_test_snapshot_%Y%m%d_%H%M%S")
+        cls.folder = os.path.join(TEST_ROOT,
+                                  folder_name)
+        common.set_basedir(cls.folder)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        os.system(f"/bin/rm -rf {cls.folder}")
+
+    def test_01_missing(self) -> None:
+        """Loading a snapshot that does not exist should return None."""
+        self.assertIsNone(snapshot.load())
+
+    def test_02_roundtrip(self) -> None:
+        """Save a snapshot and load it back."""
+        snap = snapshot.Snapshot(
+            layout=snapshot.Layout(width=1024, height=768, page=1, feed_id=2),
+            feeds=[(1, "Sternengeschichten", 1711087200), (2, "Ünïcödé", 0)],
+            titles={10: "Folge 591", 11: "Folge 590"},
+        )
+        for i in range(1000):
+            snap.keys.ids.append(i)
+            snap.keys.feed_ids.append(i % 2 + 1)
+            snap.keys.numbers.append(i)
+            snap.keys.published.append(1711087200 - i * 86400)
+            snap.keys.positions.append(i * 3)
+            snap.keys.durations.append(600)
+            snap.keys.flags.append(i % 16)
+
+        snapshot.save(snap)
+        loaded = snapshot.load()
+        self.assertIsNotNone(loaded)
+        assert loaded is not None
+        self.assertEqual(loaded.layout, snap.layout)
+        self.assertEqual(loaded.feeds, snap.feeds)
+        self.assertEqual(loaded.titles, snap.titles)
+        self.assertEqual(loaded.keys, snap.keys)
+
+    def test_03_corrupt(self) -> None:
+        """A damaged snapshot must not be loaded."""
+        with open(common.path.window(), "r+b") as fh:
+            fh.seek(12)
+            fh.write(b"garbage")
+        self.assertIsNone(snapshot.load())
+
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
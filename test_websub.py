@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-19 19:14:02 krylon>
+#
+# /data/code/python/cephalopod/test_websub.py
+# created on 19. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/gpl-3.0
+
+"""
+cephalopod.test_websub
+
+(c) 2026 Benjamin Walkenhorst
+"""
+
+import hashlib
+import hmac
+import http.client
+import os
+import time
+import unittest
+import urllib.parse
+import urllib.request
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from typing import Final, Optional
+
+from cephalopod import client as cl
+from cephalopod import common, websub
+from cephalopod.cast import Feed
+from cephalopod.client import Client
+from cephalopod.test_client import TEST_ROOT
+from cephalopod.test_example_feed import EXAMPLE_FEED
+
+HUB_URL: Final[str] = "https://pubsubhubbub.appspot.com/"
+NEW_ITEM: Final[str] = """
+    <item>
+      <title>Sternengeschichten Folge 592: Gepushte Sterne</title>
+      <description>Diese Folge kam per WebSub.</description>
+      <pubDate>Fri, 29 Mar 2024 06:00:00 +0000</pubDate>
+      <guid isPermaLink="false">websub-592</guid>
+      <enclosure length="1" type="audio/mpeg" url="http://127.0.0.1/pushed/592.mp3"/>
+    </item>"""
+
+
+class Hub(BaseHTTPRequestHandler):
+    """A stand-in WebSub hub. It verifies every subscription request right
+    away, and remembers the subscription so the test can publish to it."""
+
+    subscriptions: dict[str, dict[str, str]] = {}
+    verified: dict[str, bool] = {}
+
+    def do_POST(self) -> None:  # pylint: disable-msg=C0103
+        """Handle a subscription request."""
+        length = int(self.headers.get("Content-Length", "0"))
+        form = dict(urllib.parse.parse_qsl(self.rfile.read(length).decode("utf-8")))
+        self.send_response(202)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+        Thread(target=self.verify, args=(form, ), daemon=True).start()
+
+    @classmethod
+    def verify(cls, form: dict[str, str]) -> None:
+        """Verify the intent of the subscriber, like a real hub does."""
+        challenge = "c" + os.urandom(8).hex()
+        query = urllib.parse.urlencode({
+            "hub.mode": form["hub.mode"],
+            "hub.topic": form["hub.topic"],
+            "hub.challenge": challenge,
+            "hub.lease_seconds": form["hub.lease_seconds"],
+        })
+        with urllib.request.urlopen(f"{form['hub.callback']}?{query}", timeout=5) as res:
+            ok = res.status == 200 and res.read().decode("utf-8") == challenge
+        cls.subscriptions[form["hub.topic"]] = form
+        cls.verified[form["hub.topic"]] = ok
+
+    @classmethod
+    def publish(cls, topic: str, body: bytes, secret: Optional[str] = None) -> int:
+        """Push content to the subscriber of topic, signed with secret, or
+        with the secret of the subscription if secret is None."""
+        sub = cls.subscriptions[topic]
+        key = sub["hub.secret"] if secret is None else secret
+        sig = hmac.new(key.encode("utf-8"), body, hashlib.sha256).hexdigest()
+        req = urllib.request.Request(sub["hub.callback"],
+                                     data=body,
+                                     headers={
+                                         "Content-Type": "application/rss+xml",
+                                         "X-Hub-Signature": f"sha256={sig}",
+                                     })
+        with urllib.request.urlopen(req, timeout=5) as res:
+            return res.status
+
+    def log_message(self, *args) -> None:  # pylint: disable-msg=W0221
+        pass
+
+
+def wait_for(cond, timeout: float = 5.0) -> bool:
+    """Wait until cond() returns True."""
+    deadline: Final[float] = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if cond():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+class WebSubTest(unittest.TestCase):
+    """Test subscribing to a WebSub hub and receiving pushed content."""
+
+    folder: str
+    client: Client
+    hub: ThreadingHTTPServer
+    sub: websub.Subscriber
+    feed: Feed
+    topic: str
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        stamp = datetime.now()
+        folder_name = \
+            stamp.strftime("cephalopod_test_websub_%Y%m%d_%H%M%S")
+        cls.folder = os.path.join(TEST_ROOT, folder_name)
+        common.set_basedir(cls.folder)
+        cls.client = Client()
+        cls.hub = ThreadingHTTPServer(("127.0.0.1", 0), Hub)
+        Thread(target=cls.hub.serve_forever, daemon=True).start()
+        cls.sub = websub.Subscriber(cls.client)
+        cls.sub.start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.sub.stop()
+        cls.hub.shutdown()
+        cls.hub.server_close()
+        os.system(f"/bin/rm -rf {cls.folder}")
+
+    def test_01_signature(self) -> None:
+        """Check signatures of pushed content."""
+        body = b"<rss/>"
+        sig = hmac.new(b"geheim", body, hashlib.sha1).hexdigest()
+        self.assertTrue(websub.check_signature("geheim", body, f"sha1={sig}"))
+        self.assertFalse(websub.check_signature("anders", body, f"sha1={sig}"))
+        self.assertFalse(websub.check_signature("geheim", body + b" ", f"sha1={sig}"))
+        self.assertFalse(websub.check_signature("geheim", body, f"md5={sig}"))
+        self.assertFalse(websub.check_signature("geheim", body, None))
+        self.assertFalse(websub.check_signature("", body, f"sha1={sig}"))
+
+    def test_02_discover(self) -> None:
+        """Adding a feed remembers the hub it advertises."""
+        port = self.hub.server_address[1]
+        c = self.__class__
+        d = cl.parse(EXAMPLE_FEED.replace(HUB_URL, f"http://127.0.0.1:{port}/"))
+        feed = c.client.make_feed("http://127.0.0.1/websub.rss", d)
+        db = c.client.get_database()
+        with db:
+            c.client.store_feed(feed, d)
+        sub = db.websub_get_by_feed(feed.fid)
+        self.assertIsNotNone(sub)
+        assert sub is not None
+        self.assertEqual(sub.hub, f"http://127.0.0.1:{port}/")
+        self.assertTrue(sub.topic.startswith("https://sternengeschichten.podigee.io/"))
+        self.assertFalse(sub.is_active())
+        c.feed = feed
+        c.topic = sub.topic
+
+    def test_03_subscribe(self) -> None:
+        """Subscribe to the hub, and answer its verification."""
+        c = self.__class__
+        self.assertEqual(c.sub.maintain(), 1)
+        self.assertTrue(wait_for(lambda: c.topic in Hub.verified))
+        self.assertTrue(Hub.verified[c.topic])
+        db = c.client.get_database()
+        sub = db.websub_get_by_feed(c.feed.fid)
+        assert sub is not None
+        self.assertTrue(sub.is_active())
+        self.assertIn(c.feed.fid, db.websub_get_active(datetime.now()))
+        # Asking again right away is pointless.
+        self.assertEqual(c.sub.maintain(), 0)
+
+    def test_04_push(self) -> None:
+        """Content pushed by the hub is added to the feed."""
+        c = self.__class__
+        db = c.client.get_database()
+        before: Final[int] = len(db.episode_get_by_feed(c.feed))
+        body = EXAMPLE_FEED.replace("<item>", NEW_ITEM.strip() + "\n    <item>", 1)
+        self.assertEqual(Hub.publish(c.topic, body.encode("utf-8")), 202)
+
+        def arrived() -> bool:
+            return len(db.episode_get_by_feed(c.feed)) > before
+
+        self.assertTrue(wait_for(arrived))
+        urls = {e.url for e in db.episode_get_by_feed(c.feed)}
+        self.assertIn("http://127.0.0.1/pushed/592.mp3", urls)
+
+    def test_05_forged_push(self) -> None:
+        """Content with a bad signature is acknowledged, but ignored."""
+        c = self.__class__
+        db = c.client.get_database()
+        before: Final[int] = len(db.episode_get_by_feed(c.feed))
+        body = EXAMPLE_FEED.replace("<item>", NEW_ITEM.replace("592", "593") + "\n<item>", 1)
+        self.assertEqual(Hub.publish(c.topic, body.encode("utf-8"), "falsch"), 202)
+        time.sleep(0.5)
+        self.assertEqual(len(db.episode_get_by_feed(c.feed)), before)
+
+    def test_06_bad_length(self) -> None:
+        """Pushes without a valid Content-Length are turned away before we
+        read anything."""
+        c = self.__class__
+        url = urllib.parse.urlsplit(Hub.subscriptions[c.topic]["hub.callback"])
+        for clen, status in (("-1", 400), ("many", 400), (None, 411)):
+            with self.subTest(length=clen):
+                conn = http.client.HTTPConnection(url.hostname, url.port, timeout=5)
+                try:
+                    conn.putrequest("POST", url.path)
+                    if clen is not None:
+                        conn.putheader("Content-Length", clen)
+                    conn.endheaders()
+                    self.assertEqual(conn.getresponse().status, status)
+                finally:
+                    conn.close()
+
+    def test_07_polling(self) -> None:
+        """Feeds the hub pushes to us are polled far less often."""
+        c = self.__class__
+        f: Final[Feed] = c.feed
+        f.last_refresh = datetime.now() - 2 * cl.refresh_interval
+        now = datetime.now()
+        self.assertTrue(cl.is_due(f, now))
+        self.assertFalse(cl.is_due(f, now, interval=cl.push_interval))
+
+    def test_08_renew(self) -> None:
+        """Renewing a subscription keeps its secret, so pushes keep arriving
+        while the hub verifies the renewal."""
+        c = self.__class__
+        db = c.client.get_database()
+        # The content pushed earlier pointed the feed at the real hub.
+        db.websub_discover(c.feed, f"http://127.0.0.1:{self.hub.server_address[1]}/", c.topic)
+        sub = db.websub_get_by_feed(c.feed.fid)
+        assert sub is not None
+        del Hub.verified[c.topic]
+        c.sub.subscribe(sub)
+        self.assertTrue(wait_for(lambda: c.topic in Hub.verified))
+        secret: Final[str] = sub.secret
+        self.assertNotEqual(secret, "")
+
+        del Hub.verified[c.topic]
+        c.sub.subscribe(sub)
+        self.assertEqual(db.websub_get_by_feed(c.feed.fid).secret, secret)  # type: ignore
+        self.assertTrue(wait_for(lambda: c.topic in Hub.verified))
+        self.assertTrue(Hub.verified[c.topic])
+        self.assertEqual(Hub.subscriptions[c.topic]["hub.secret"], secret)
+
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #
@@ -17,14 +17,21 @@ cephalopod.ui
 (c) 2024 Benjamin Walkenhorst
 """
 
-from threading import Lock, local
-from typing import Final
+import html
+import re
+from datetime import datetime
+from threading import Lock, Thread, local
+from collections.abc import Mapping
+from typing import Any, Callable, Final, Optional
 
 import gi  # type: ignore
 
-from cephalopod import common
-from cephalopod.cast import Episode, Feed
+from cephalopod import common, config, daemon, snapshot
+from cephalopod.cast import Feed
 from cephalopod.database import Database
+from cephalopod.model import Column, EpisodeModel, View, fetch_keys
+from cephalopod.playqueue import PlayQueue
+from cephalopod.snapshot import EpisodeKeys
 
 gi.require_version("Gtk", "3.0")
 gi.require_version("Gdk", "3.0")
@@ -39,6 +46,15 @@ from gi.repository import \
     Gtk as gtk  # noqa: E402 pylint: disable-msg=C0413,C0411 # type: ignore
 
 ICON_NAME_DEFAULT: Final[str] = ''
+# How much of an episode's description we show in its tooltip.
+TOOLTIP_MAX: Final[int] = 1000
+# How many episodes of the queue we display.
+QUEUE_SHOWN: Final[int] = 500
+
+_tag_pat: Final[re.Pattern] = re.compile(r"<[^>]*>")
+
+CellFunc = Callable[[gtk.TreeViewColumn, gtk.CellRenderer, gtk.TreeModel, gtk.TreeIter, int],
+                    None]
 
 
 class GUI:  # pylint: disable-msg=R0902,R0903
@@ -66,11 +82,13 @@ class GUI:  # pylint: disable-msg=R0902,R0903
         self.notebook: gtk.Notebook = gtk.Notebook.new()
         self.nb_label_feed = gtk.Label.new("Feeds")
         self.nb_label_episode = gtk.Label.new("Episodes")
+        self.nb_label_queue = gtk.Label.new("Queue")
 
         self.sw_feeds = gtk.ScrolledWindow()
         self.sw_episodes = gtk.ScrolledWindow()
+        self.sw_queue = gtk.ScrolledWindow()
 
-        for sw in (self.sw_feeds, self.sw_episodes):
+        for sw in (self.sw_feeds, self.sw_episodes, self.sw_queue):
             sw.set_vexpand(True)
             sw.set_hexpand(True)
 
@@ -78,7 +96,8 @@ class GUI:  # pylint: disable-msg=R0902,R0903
             (0, "ID"),
             (1, "Title"),
             (2, "Refresh"),
-            (4, "New episodes"),
+            (3, "New episodes"),
+            (4, "Status"),
         ]
 
         self.feed_store = gtk.ListStore(
@@ -86,9 +105,11 @@ class GUI:  # pylint: disable-msg=R0902,R0903
             str,  # Title
             str,  # Refresh timestamp
             int,  # Number of new episodes
+            str,  # Failure state, empty if the feed is fine
         )
 
         self.feed_view = gtk.TreeView(model=self.feed_store)
+        self.feed_rows: list[tuple[int, str, int]] = []
 
         for c in feed_columns:
             col = gtk.TreeViewColumn(
@@ -99,36 +120,66 @@ class GUI:  # pylint: disable-msg=R0902,R0903
             )
             self.feed_view.append_column(col)
 
-        episode_columns: Final[list[tuple[int, str]]] = [
-            (0, "ID"),
-            (1, "Feed"),
-            (2, "Number"),
-            (3, "Published"),
-            (4, "Title"),
-            (5, "Duration"),
-            (6, "Position"),
+        # The Title column is not sortable, because sorting by it would
+        # require loading every single title from the database.
+        episode_columns: Final[list[tuple[Column, str, Optional[CellFunc]]]] = [
+            (Column.ID, "ID", None),
+            (Column.Feed, "Feed", None),
+            (Column.Number, "Number", None),
+            (Column.Published, "Published", fmt_timestamp),
+            (Column.Title, "Title", None),
+            (Column.Duration, "Duration", fmt_duration),
+            (Column.Position, "Position", fmt_position),
         ]
 
-        self.episode_store = gtk.ListStore(
+        self.episode_model = EpisodeModel(self.get_database)
+        self.episode_view = gtk.TreeView()
+        self.episode_view.set_fixed_height_mode(True)
+        self.episode_view.set_has_tooltip(True)
+        self.episode_filter: Optional[gtk.TreeModelFilter] = None
+        self.episode_sort: Optional[gtk.TreeModelSort] = None
+        self.wrap_episode_model()
+
+        for c in episode_columns:
+            cell = gtk.CellRendererText()
+            if c[2] is None:
+                col = gtk.TreeViewColumn(c[1], cell, text=c[0], size=12)
+            else:
+                col = gtk.TreeViewColumn(c[1], cell, size=12)
+                col.set_cell_data_func(cell, c[2], c[0])
+            # Fixed height mode requires all columns to be fixed size.
+            col.set_sizing(gtk.TreeViewColumnSizing.FIXED)
+            col.set_resizable(True)
+            col.set_fixed_width(400 if c[0] == Column.Title else 100)
+            if c[0] != Column.Title:
+                col.set_sort_column_id(c[0])
+            self.episode_view.append_column(col)
+
+        # The queue can be reordered by drag and drop. When a row is
+        # dropped, the ListStore inserts a copy of it at its new place and
+        # deletes the original, we remember the copy and tell the daemon
+        # where it went once the drag is over.
+        self.queue_store = gtk.ListStore(
             int,  # Episode ID
-            str,  # Feed name
-            int,  # Episode number
-            str,  # Date published
-            str,  # Episode Title
-            str,  # Duration
-            str,  # Playback position
+            str,  # Feed title
+            str,  # Episode title
         )
+        self.queue_view = gtk.TreeView(model=self.queue_store)
+        self.queue_view.set_reorderable(True)
+        self.queue_dragging: bool = False
+        self.queue_dropped: Optional[gtk.TreeRowReference] = None
 
-        self.episode_view = gtk.TreeView(model=self.episode_store)
+        for idx, title in enumerate(("ID", "Feed", "Title")):
+            col = gtk.TreeViewColumn(title, gtk.CellRendererText(), text=idx, size=12)
+            col.set_resizable(True)
+            self.queue_view.append_column(col)
 
-        for c in episode_columns:
-            col = gtk.TreeViewColumn(
-                c[1],
-                gtk.CellRendererText(),
-                text=c[0],
-                size=12,
-            )
-            self.episode_view.append_column(col)
+        self.view_box = gtk.ComboBoxText()
+        for v in View:
+            self.view_box.append(v.name, v.name)
+        self.view_box.set_active_id(View.All.name)
+
+        self.episode_box = gtk.Box(orientation=gtk.Orientation.VERTICAL)
 
         # Menu
 
@@ -140,37 +191,83 @@ class GUI:  # pylint: disable-msg=R0902,R0903
         self.feed_menu_item.set_submenu(self.feed_menu)
 
         self.fm_add_item = gtk.MenuItem.new_with_mnemonic("_Add Feed")
+        self.fm_refresh_item = gtk.MenuItem.new_with_mnemonic("_Refresh")
+        self.fm_refresh_feed_item = gtk.MenuItem.new_with_mnemonic("Refresh _Selected Feed")
         self.fm_quit_item = gtk.MenuItem.new_with_mnemonic("_Quit")
 
         self.feed_menu.add(self.fm_add_item)
+        self.feed_menu.add(self.fm_refresh_item)
+        self.feed_menu.add(self.fm_refresh_feed_item)
         self.feed_menu.add(self.fm_quit_item)
 
+        self.episode_menu_item: gtk.MenuItem = \
+            gtk.MenuItem.new_with_mnemonic("_Episode")
+
+        self.episode_menu = gtk.Menu()
+        self.episode_menu_item.set_submenu(self.episode_menu)
+
+        self.em_enqueue_item = gtk.MenuItem.new_with_mnemonic("Add to _Queue")
+        self.em_dequeue_item = gtk.MenuItem.new_with_mnemonic("_Remove from Queue")
+
+        self.episode_menu.add(self.em_enqueue_item)
+        self.episode_menu.add(self.em_dequeue_item)
+
         self.menubar.add(self.feed_menu_item)
+        self.menubar.add(self.episode_menu_item)
 
         # Assemble UI
 
         self.sw_feeds.add(self.feed_view)
         self.sw_episodes.add(self.episode_view)
+        self.sw_queue.add(self.queue_view)
+        self.episode_box.pack_start(self.view_box, False, True, 0)
+        self.episode_box.pack_start(self.sw_episodes, True, True, 0)
 
         self.notebook.append_page(self.sw_feeds, self.nb_label_feed)
-        self.notebook.append_page(self.sw_episodes, self.nb_label_episode)
+        self.notebook.append_page(self.episode_box, self.nb_label_episode)
+        self.notebook.append_page(self.sw_queue, self.nb_label_queue)
 
         self.mbox.pack_start(self.menubar, False, True, 0)
         self.mbox.pack_start(self.notebook, False, True, 0)
 
         self.win.add(self.mbox)
 
+        # If we have a snapshot from the last run, we display it right away
+        # and catch up with the database in the background.
+        snap: Final[Optional[snapshot.Snapshot]] = snapshot.load(log=self.log)
+        if snap is not None:
+            self.apply_snapshot(snap)
+
         self.win.show_all()
 
         # Register signal handlers
 
         self.win.connect("destroy", self.quit)
         self.fm_quit_item.connect("activate", self.quit)
+        self.fm_add_item.connect("activate", self.handle_add_feed)
+        self.fm_refresh_item.connect("activate", self.handle_refresh)
+        self.fm_refresh_feed_item.connect("activate", self.handle_refresh_feed)
+        self.feed_view.connect("row-activated", self.handle_feed_activated)
+        self.view_box.connect("changed", self.handle_view_changed)
+        self.episode_view.connect("query-tooltip", self.handle_episode_tooltip)
+        self.em_enqueue_item.connect("activate", self.handle_enqueue)
+        self.em_dequeue_item.connect("activate", self.handle_dequeue)
+        self.queue_view.connect("drag-begin", self.handle_queue_drag_begin)
+        self.queue_view.connect("drag-end", self.handle_queue_drag_end)
+        self.queue_store.connect("row-inserted", self.handle_queue_row_inserted)
 
         glib.timeout_add(2_500, self.periodic)
-        glib.timeout_add(50, self.load_models)
+        Thread(target=self.reconcile, daemon=True).start()
 
     def quit(self, _whatever) -> None:
+        """Save the current state and leave the main loop."""
+        if not self.active:
+            return
+        self.active = False
+        try:
+            snapshot.save(self.make_snapshot())
+        except OSError as err:
+            self.log.error("Cannot save snapshot: %s", err)
         self.log.info("Bye bye!")
         self.win.destroy()
         gtk.main_quit()
@@ -178,53 +275,313 @@ class GUI:  # pylint: disable-msg=R0902,R0903
     def get_database(self) -> Database:
         """Get the Database instance for the calling thread."""
         try:
-            return self.local.db
+            db = self.local.db
         except AttributeError:
             db = Database()
             self.local.db = db
             return db
+        db.retune()
+        return db
 
-    def load_models(self) -> None:
-        """Fill the TreeModels with data from the database."""
-        db: Database = self.get_database()
-
+    def reconcile(self) -> None:
+        """Load the current state from the database and hand it over to the
+        main thread. Runs in a background thread."""
+        try:
+            db: Final[Database] = self.get_database()
+        except config.ConfigError as err:
+            # Without a database, there is nothing to catch up with, the
+            # window keeps showing the snapshot, if any.
+            self.log.error("Cannot open the database: %s", err)
+            glib.idle_add(self.display_msg, f"Cannot open the database: {err}")
+            return
         feeds: Final[list[Feed]] = db.feed_get_all()
-        ftitles: dict[int, str] = {}
-
+        keys: Final[EpisodeKeys] = fetch_keys(db)
+        feed_map: Final[Mapping[int, Feed]] = db.feed_map()
+        ids: Final[list[int]] = PlayQueue(db).next(QUEUE_SHOWN)
+        titles: Final[dict[int, tuple[int, str]]] = \
+            {e.epid: (e.feed_id, e.title) for e in db.episode_get_by_ids(ids)}
+        queue: Final[list[tuple[int, str, str]]] = []
+        for epid in ids:
+            fid, title = titles[epid]
+            f = feed_map.get(fid)
+            queue.append((epid, f.title if f is not None else "", title))
+        glib.idle_add(self.load_models, feeds, feed_map, keys, queue)
+
+    def load_models(self,
+                    feeds: list[Feed],
+                    feed_map: Mapping[int, Feed],
+                    keys: EpisodeKeys,
+                    queue: list[tuple[int, str, str]]) -> bool:
+        """Fill the TreeModels with the given data."""
+        self.load_feeds([(f.fid, f.title, int(f.last_refresh.timestamp())) for f in feeds],
+                        {f.fid: f.status() for f in feeds})
+        if not self.queue_dragging:
+            self.queue_store.clear()
+            for row in queue:
+                self.queue_store.append(row)
+        self.episode_model.set_feeds(feed_map)
+        self.episode_view.set_model(None)
+        self.episode_model.set_keys(keys)
+        self.wrap_episode_model()
+        return False
+
+    def load_feeds(self,
+                   feeds: list[tuple[int, str, int]],
+                   status: Optional[dict[int, str]] = None) -> None:
+        """Fill the feed list. Each Feed is given as a tuple of its ID,
+        title and refresh timestamp, status maps the IDs of failing Feeds
+        to a description of their trouble."""
+        self.feed_rows = feeds
         self.feed_store.clear()
+        for fid, title, stamp in feeds:
+            self.feed_store.append(
+                (fid,
+                 title,
+                 datetime.fromtimestamp(stamp).strftime(common.TIME_FMT),
+                 0,
+                 status.get(fid, "") if status is not None else ""))
+
+    def apply_snapshot(self, snap: snapshot.Snapshot) -> None:
+        """Restore the window layout and the models from a snapshot."""
+        lay: Final[snapshot.Layout] = snap.layout
+        self.win.resize(lay.width, lay.height)
+        if lay.x >= 0 and lay.y >= 0:
+            self.win.move(lay.x, lay.y)
+
+        self.load_feeds(snap.feeds)
+        self.episode_model.set_feed_titles({f[0]: f[1] for f in snap.feeds})
+        self.episode_model.set_titles(snap.titles)
+        try:
+            view = View(lay.view)
+        except ValueError:
+            view = View.All
+        self.episode_model.set_view(view, lay.feed_id if lay.feed_id >= 0 else None)
+        self.view_box.set_active_id(view.name)
+        self.episode_view.set_model(None)
+        self.episode_model.set_keys(snap.keys)
+        self.wrap_episode_model()
+        if lay.sort_column >= 0:
+            self.episode_sort.set_sort_column_id(lay.sort_column, gtk.SortType(lay.sort_order))
+        self.notebook.set_current_page(lay.page)
+
+    def make_snapshot(self) -> snapshot.Snapshot:
+        """Capture the current window layout and models in a snapshot."""
+        width, height = self.win.get_size()
+        x, y = self.win.get_position()
+        sort_col, sort_order = self.episode_sort.get_sort_column_id()
+        lay: Final[snapshot.Layout] = snapshot.Layout(
+            width=width,
+            height=height,
+            x=x,
+            y=y,
+            page=self.notebook.get_current_page(),
+            view=self.episode_model.view.value,
+            feed_id=self.episode_model.feed_id if self.episode_model.feed_id is not None else -1,
+            sort_column=sort_col if sort_col is not None else -1,
+            sort_order=int(sort_order) if sort_order is not None else 0,
+        )
+        return snapshot.Snapshot(
+            layout=lay,
+            feeds=self.feed_rows,
+            keys=self.episode_model.keys,
+            titles=dict(self.episode_model.titles),
+        )
 
-        for f in feeds:
-            ftitles[f.fid] = f.title
-            fiter = self.feed_store.append()
-            self.feed_store.set(
-                fiter,
-                (0, 1, 2, 3),
-                (f.fid,
-                 f.title,
-                 f.last_refresh.strftime(common.TIME_FMT),
-                 0),
-            )
+    def wrap_episode_model(self) -> None:
+        """Stack a TreeModelFilter and a TreeModelSort on top of the
+        EpisodeModel and attach them to the episode view."""
+        sort_col, sort_order = Column.Published, gtk.SortType.DESCENDING
+        if self.episode_sort is not None:
+            sort_col, sort_order = self.episode_sort.get_sort_column_id()
+        self.episode_filter = self.episode_model.filter_new()
+        self.episode_filter.set_visible_func(
+            lambda m, it, _data: m.is_visible(it))
+        self.episode_sort = gtk.TreeModelSort(model=self.episode_filter)
+        self.episode_sort.set_sort_column_id(sort_col, sort_order)
+        self.episode_view.set_model(self.episode_sort)
+
+    def set_episode_view(self, view: View, feed_id: Optional[int]) -> None:
+        """Display the given subset of episodes. This only re-evaluates the
+        precomputed flags, the database is not touched."""
+        self.episode_model.set_view(view, feed_id)
+        self.episode_filter.refilter()
+
+    def handle_view_changed(self, box: gtk.ComboBoxText) -> None:
+        """Switch the episode list to the view selected by the user."""
+        view: Final[View] = View[box.get_active_id()]
+        self.set_episode_view(view, self.episode_model.feed_id)
+
+    def handle_feed_activated(self,
+                              view: gtk.TreeView,
+                              path: gtk.TreePath,
+                              _col: gtk.TreeViewColumn) -> None:
+        """Show only the episodes of the activated Feed.
+        Activating the Feed again shows all episodes."""
+        fiter = view.get_model().get_iter(path)
+        fid: int = view.get_model().get_value(fiter, 0)
+        if self.episode_model.feed_id == fid:
+            self.set_episode_view(self.episode_model.view, None)
+        else:
+            self.set_episode_view(self.episode_model.view, fid)
+            self.notebook.set_current_page(1)
+
+    def handle_episode_tooltip(self,  # pylint: disable-msg=R0913
+                               view: gtk.TreeView,
+                               x: int,
+                               y: int,
+                               keyboard: bool,
+                               tooltip: gtk.Tooltip) -> bool:
+        """Show the description of the Episode under the pointer. Only the
+        descriptions that are actually displayed are loaded from the
+        database and decompressed."""
+        ok, x, y, model, _path, it = view.get_tooltip_context(x, y, keyboard)
+        if not ok:
+            return False
+        try:
+            db: Final[Database] = self.get_database()
+        except config.ConfigError:
+            # reconcile has told the user already.
+            return False
+        desc: Final[str] = db.episode_get_description(model.get_value(it, Column.ID))
+        if desc == "":
+            return False
+        tooltip.set_text(plain_text(desc)[:TOOLTIP_MAX])
+        return True
 
-        episodes: Final[list[Episode]] = db.episode_get_all()
-        self.episode_store.clear()
-        self.log.debug("Add %d episodes to episode_store",
-                       len(episodes))
-
-        for e in episodes:
-            e_iter = self.episode_store.append()
-            self.episode_store.set(
-                e_iter,
-                (0, 1, 2, 3, 4, 5, 6),
-                (
-                    e.epid,
-                    ftitles[e.feed_id],
-                    e.number,
-                    e.published.strftime(common.TIME_FMT),
-                    e.title,
-                    "??:??:??",
-                    fmt_pos(e.cur_pos),
-                ),
-            )
+    def handle_enqueue(self, _item: gtk.MenuItem) -> None:
+        """Add the selected episode to the end of the queue."""
+        model, it = self.episode_view.get_selection().get_selected()
+        if it is None:
+            return
+        epid: Final[int] = model.get_value(it, Column.ID)
+        for queued in self.queue_store:
+            if queued[0] == epid:
+                self.queue_store.remove(queued.iter)
+                break
+        row: Final[tuple[int, str, str]] = \
+            (epid, model.get_value(it, Column.Feed), model.get_value(it, Column.Title))
+
+        def append(_res: dict[str, Any]) -> bool:
+            self.queue_store.append(row)
+            return False
+
+        self.run_remote("queue_add", append, reconcile=False, id=epid)
+
+    def handle_dequeue(self, _item: gtk.MenuItem) -> None:
+        """Take the episode selected in the queue out of it."""
+        model, it = self.queue_view.get_selection().get_selected()
+        if it is None:
+            return
+        ref: Final[gtk.TreeRowReference] = gtk.TreeRowReference.new(model, model.get_path(it))
+
+        def remove(_res: dict[str, Any]) -> bool:
+            if ref.valid():
+                model.remove(model.get_iter(ref.get_path()))
+            return False
+
+        self.run_remote("queue_remove", remove, reconcile=False, id=model.get_value(it, 0))
+
+    def handle_queue_drag_begin(self, _view: gtk.TreeView, _ctx) -> None:
+        """Start watching for the row the user is about to drop."""
+        self.queue_dragging = True
+        self.queue_dropped = None
+
+    def handle_queue_row_inserted(self,
+                                  store: gtk.ListStore,
+                                  path: gtk.TreePath,
+                                  _it: gtk.TreeIter) -> None:
+        """Remember where a row dragged within the queue was dropped."""
+        if self.queue_dragging:
+            self.queue_dropped = gtk.TreeRowReference.new(store, path)
+
+    def handle_queue_drag_end(self, _view: gtk.TreeView, _ctx) -> None:
+        """Tell the daemon where the dropped episode went. Only that one
+        episode gets a new rank, the rest of the queue stays as it is."""
+        self.queue_dragging = False
+        ref: Final[Optional[gtk.TreeRowReference]] = self.queue_dropped
+        self.queue_dropped = None
+        if ref is None or not ref.valid():
+            return
+        idx: Final[int] = ref.get_path().get_indices()[0]
+        epid: Final[int] = self.queue_store[idx][0]
+        after: Final[Optional[int]] = self.queue_store[idx - 1][0] if idx > 0 else None
+        self.run_remote("queue_move", reconcile=False, id=epid, after=after)
+
+    def handle_refresh(self, _item: gtk.MenuItem) -> None:
+        """Ask the daemon to refresh all feeds."""
+        self.run_remote("refresh", force=True)
+
+    def handle_refresh_feed(self, _item: gtk.MenuItem) -> None:
+        """Ask the daemon to refresh the selected feed right away."""
+        model, fiter = self.feed_view.get_selection().get_selected()
+        if fiter is None:
+            return
+        self.run_remote("refresh_feed", self.update_feed_row, id=model.get_value(fiter, 0))
+
+    def update_feed_row(self, res: dict[str, Any]) -> bool:
+        """Update the row of a single Feed with the result of refreshing it."""
+        for row in self.feed_store:
+            if row[0] == res["id"]:
+                row[2] = datetime.fromtimestamp(res["last_refresh"]).strftime(common.TIME_FMT)
+                row[3] = res["new"]
+                row[4] = res["status"]
+                break
+        self.feed_rows = [(fid, title, res["last_refresh"] if fid == res["id"] else stamp)
+                          for fid, title, stamp in self.feed_rows]
+        return False
+
+    def handle_add_feed(self, _item: gtk.MenuItem) -> None:
+        """Ask the user for the URL of a feed and have the daemon add it."""
+        dlg = gtk.Dialog(title="Add Feed", parent=self.win, modal=True)
+        dlg.add_buttons(gtk.STOCK_CANCEL, gtk.ResponseType.CANCEL,
+                        gtk.STOCK_OK, gtk.ResponseType.OK)
+        entry = gtk.Entry()
+        entry.set_activates_default(True)
+        dlg.set_default_response(gtk.ResponseType.OK)
+        dlg.get_content_area().pack_start(entry, True, True, 0)
+        dlg.show_all()
+
+        try:
+            if dlg.run() == gtk.ResponseType.OK and entry.get_text().strip() != "":
+                self.run_remote("add", url=entry.get_text().strip())
+        finally:
+            dlg.destroy()
+
+    def run_remote(self,
+                   cmd: str,
+                   callback: Optional[Callable[[Any], bool]] = None,
+                   reconcile: bool = True,
+                   **kwargs) -> None:
+        """Send a command to the daemon in a background thread and reload
+        the models once it is done, unless reconcile is False. If a
+        callback is given, it is called with the command's result in the
+        main thread first."""
+        def work() -> None:
+            try:
+                res = daemon.call(cmd, **kwargs)
+            except (OSError, daemon.DaemonError) as err:
+                self.log.error("Command %s failed: %s", cmd, err)
+                glib.idle_add(self.display_msg, f"Command {cmd} failed: {err}")
+                return
+            if callback is not None:
+                glib.idle_add(callback, res)
+            if reconcile:
+                self.reconcile()
+
+        Thread(target=work, daemon=True).start()
+
+    def display_msg(self, msg: str) -> bool:
+        """Display a message in a dialog."""
+        dlg = gtk.MessageDialog(
+            transient_for=self.win,
+            modal=True,
+            message_type=gtk.MessageType.INFO,
+            buttons=gtk.ButtonsType.OK,
+            text=msg,
+        )
+        dlg.run()
+        dlg.destroy()
+        return False
 
     def periodic(self) -> bool:
         """Perform routine periodic things."""
@@ -232,19 +589,38 @@ class GUI:  # pylint: disable-msg=R0902,R0903
         return True
 
 
-def fmt_pos(p: int) -> str:
-    """Format the argument p as a playback position, i.e. minutes and seconds."""
-    hours: int = 0
-    minutes: int = 0
-    seconds: int = p
+def fmt_timestamp(_col: gtk.TreeViewColumn,
+                  cell: gtk.CellRenderer,
+                  model: gtk.TreeModel,
+                  it: gtk.TreeIter,
+                  column: int) -> None:
+    """Display a timestamp column as date and time."""
+    stamp: Final[int] = model.get_value(it, column)
+    cell.set_property("text", datetime.fromtimestamp(stamp).strftime(common.TIME_FMT))
+
+
+def fmt_duration(_col: gtk.TreeViewColumn,
+                 cell: gtk.CellRenderer,
+                 model: gtk.TreeModel,
+                 it: gtk.TreeIter,
+                 column: int) -> None:
+    """Display a duration column, marking unknown durations as such."""
+    seconds: Final[int] = model.get_value(it, column)
+    cell.set_property("text", common.fmt_pos(seconds) if seconds > 0 else "??:??:??")
+
 
-    if seconds >= 3600:
-        hours, seconds = divmod(seconds, 3600)
+def plain_text(desc: str) -> str:
+    """Strip the markup from an HTML description."""
+    return html.unescape(_tag_pat.sub("", desc)).strip()
 
-    if seconds >= 60:
-        minutes, seconds = divmod(seconds, 60)
 
-    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+def fmt_position(_col: gtk.TreeViewColumn,
+                 cell: gtk.CellRenderer,
+                 model: gtk.TreeModel,
+                 it: gtk.TreeIter,
+                 column: int) -> None:
+    """Display a playback position column."""
+    cell.set_property("text", common.fmt_pos(model.get_value(it, column)))
 
 
 def main() -> None:
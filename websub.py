@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Time-stamp: <2026-10-19 18:52:37 krylon>
+#
+# /data/code/python/cephalopod/websub.py
+# created on 19. 10. 2026
+# (c) 2026 Benjamin Walkenhorst
+#
+# This file is part of the Wetterfrosch weather app. It is distributed
+# under the terms of the GNU General Public License 3. See the file
+# LICENSE for details or find a copy online at
+# https://www.gnu.org/licenses/gpl-3.0
+
+"""
+cephalopod.websub
+
+(c) 2026 Benjamin Walkenhorst
+
+Receive feed updates from WebSub hubs instead of polling for them.
+
+Many feeds name a hub that pushes new versions of the feed to subscribers
+as soon as they are published. We subscribe to the hubs of our feeds,
+giving them the URL of a small HTTP server as the callback. The hub first
+checks that we really asked for the subscription, by sending us a
+challenge we have to echo, and then POSTs the feed to us whenever it
+changes, signed with a secret we gave it when subscribing.
+
+For this to work with public hubs, the callback URL must be reachable
+from the internet, so the address we listen on and the URL we hand to the
+hubs are configured separately.
+"""
+
+import hashlib
+import hmac
+import logging
+import re
+import secrets
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from threading import Thread
+from typing import Callable, Final, Optional
+
+from cephalopod import common
+from cephalopod.cast import Feed, Subscription
+from cephalopod.client import Client, connect_timeout, parse
+from cephalopod.database import Database
+
+# How long we ask the hubs to keep our subscriptions.
+LEASE: Final[timedelta] = timedelta(days=7)
+# We renew a subscription when its lease ends in less than this.
+RENEW_MARGIN: Final[timedelta] = timedelta(days=1)
+# If a hub does not verify our request, we ask again after this.
+RETRY: Final[timedelta] = timedelta(hours=6)
+# The largest feed a hub may push to us.
+MAX_BODY: Final[int] = 32 << 20
+# How many callbacks we handle at the same time.
+HANDLER_CNT: Final[int] = 2
+
+_path_pat: Final[re.Pattern] = re.compile(r"^/websub/(\d+)$")
+
+# The hash functions a hub may sign its content with.
+_digests: Final[dict[str, Callable]] = {
+    "sha1": hashlib.sha1,
+    "sha256": hashlib.sha256,
+    "sha384": hashlib.sha384,
+    "sha512": hashlib.sha512,
+}
+
+
+class WebSubError(Exception):
+    """WebSubError is raised when a hub rejects a subscription request."""
+
+
+def check_signature(secret: str, body: bytes, header: Optional[str]) -> bool:
+    """Return True if the X-Hub-Signature header proves that the content
+    came from a hub that knows our secret."""
+    if not secret or not header or "=" not in header:
+        return False
+    method, sig = header.strip().split("=", 1)
+    digest: Final[Optional[Callable]] = _digests.get(method.lower())
+    if digest is None:
+        return False
+    expected: Final[str] = hmac.new(secret.encode("utf-8"), body, digest).hexdigest()
+    return hmac.compare_digest(expected, sig.strip().lower())
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Handle the requests of the hubs."""
+
+    def log_message(self, format, *args) -> None:  # pylint: disable-msg=W0622
+        self.server.owner.log.debug(format, *args)  # type: ignore
+
+    def _feed_id(self) -> Optional[int]:
+        m = _path_pat.match(urllib.parse.urlsplit(self.path).path)
+        return int(m[1]) if m is not None else None
+
+    def _reply(self, status: int, body: bytes = b"") -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:  # pylint: disable-msg=C0103
+        """Answer the hub's verification of intent."""
+        owner: Final[Subscriber] = self.server.owner  # type: ignore
+        fid: Final[Optional[int]] = self._feed_id()
+        params: Final[dict[str, str]] = \
+            dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(self.path).query))
+        challenge = owner.verify(fid, params) if fid is not None else None
+        if challenge is None:
+            self._reply(404)
+        else:
+            self._reply(200, challenge.encode("utf-8"))
+
+    def do_POST(self) -> None:  # pylint: disable-msg=C0103
+        """Receive content pushed by the hub."""
+        owner: Final[Subscriber] = self.server.owner  # type: ignore
+        fid: Final[Optional[int]] = self._feed_id()
+        if fid is None:
+            self._reply(404)
+            return
+        # Without a valid length, we would not know when the body ends,
+        # and a reader waiting for it would tie up a handler thread.
+        clen: Final[Optional[str]] = self.headers.get("Content-Length")
+        if clen is None:
+            self._reply(411)
+            return
+        if not (clen.isascii() and clen.isdigit()):
+            self._reply(400)
+            return
+        length: Final[int] = int(clen)
+        if length > MAX_BODY:
+            self._reply(413)
+            return
+        body: Final[bytes] = self.rfile.read(length)
+        # The hub is not interested in what we do with the content, and it
+        # must not retry content we rejected, so we acknowledge everything
+        # addressed to a valid callback.
+        self._reply(202)
+        owner.receive(fid, body,
+                      self.headers.get("X-Hub-Signature"),
+                      self.headers.get("Content-Type", ""))
+
+
+class _Server(HTTPServer):
+    """An HTTPServer that handles requests in a fixed pool of threads, so
+    each handler thread can keep its database connection open."""
+
+    def __init__(self, address: tuple[str, int], owner: "Subscriber") -> None:
+        self.owner: Final[Subscriber] = owner
+        self.executor: Final[ThreadPoolExecutor] = \
+            ThreadPoolExecutor(HANDLER_CNT, thread_name_prefix="websub")
+        super().__init__(address, _Handler)
+
+    def process_request(self, request, client_address) -> None:
+        self.executor.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address) -> None:
+        try:
+            self.finish_request(request, client_address)
+        except Exception:  # pylint: disable-msg=W0718
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.executor.shutdown(wait=False)
+
+
+class Subscriber:
+    """Subscriber subscribes to the hubs of our feeds and receives the
+    content they push to us."""
+
+    __slots__ = [
+        "log",
+        "client",
+        "server",
+        "base_url",
+        "thread",
+    ]
+
+    log: logging.Logger
+    client: Client
+    server: _Server
+    base_url: str
+    thread: Optional[Thread]
+
+    def __init__(self,
+                 client: Client,
+                 address: tuple[str, int] = ("127.0.0.1", 0),
+                 base_url: str = "") -> None:
+        """Create a Subscriber listening on address. base_url is the URL
+        under which the hubs reach the listening socket, it defaults to the
+        socket's own address."""
+        self.log = common.get_logger("WebSub")
+        self.client = client
+        self.server = _Server(address, self)
+        host, port = self.server.server_address[:2]
+        self.base_url = base_url.rstrip("/") if base_url != "" else f"http://{host}:{port}"
+        self.thread = None
+
+    def start(self) -> None:
+        """Start accepting callbacks in a background thread."""
+        if self.thread is None:
+            self.thread = Thread(target=self.server.serve_forever, daemon=True)
+            self.thread.start()
+            self.log.info("Accepting WebSub callbacks at %s", self.base_url)
+
+    def stop(self) -> None:
+        """Stop accepting callbacks."""
+        if self.thread is not None:
+            self.server.shutdown()
+            self.thread.join()
+            self.thread = None
+        self.server.server_close()
+
+    def callback_url(self, fid: int) -> str:
+        """Return the callback URL for the Feed with the given ID."""
+        return f"{self.base_url}/websub/{fid}"
+
+    def subscribe(self, sub: Subscription) -> None:
+        """Ask the hub for a subscription, or to renew it. The hub confirms
+        the subscription asynchronously, by calling us back.
+
+        A renewal keeps the secret, the hub goes on signing its pushes
+        with the old one until it has verified the request."""
+        secret: Final[str] = sub.secret if sub.secret != "" else secrets.token_hex(20)
+        db: Final[Database] = self.client.get_database()
+        # The hub may verify the request before it even answers it, so the
+        # secret must be stored before we send it.
+        db.websub_set_requested(sub, secret, datetime.now())
+        form: Final[bytes] = urllib.parse.urlencode({
+            "hub.mode": "subscribe",
+            "hub.topic": sub.topic,
+            "hub.callback": self.callback_url(sub.feed_id),
+            "hub.secret": secret,
+            "hub.lease_seconds": str(int(LEASE.total_seconds())),
+        }).encode("utf-8")
+        req: Final[urllib.request.Request] = urllib.request.Request(
+            sub.hub,
+            data=form,
+            headers={
+                "Content-Type": "application/x-www-form-urlencoded",
+                "User-Agent": f"{common.APP_NAME}/{common.APP_VERSION}",
+            })
+        try:
+            with urllib.request.urlopen(req, timeout=connect_timeout) as res:
+                res.read()
+        except urllib.error.HTTPError as err:
+            raise WebSubError(f"Hub {sub.hub} rejected subscription to {sub.topic}: "
+                              f"{err.code} {err.reason}") from err
+        except OSError as err:
+            raise WebSubError(f"Cannot reach hub {sub.hub}: {err}") from err
+
+    def maintain(self) -> int:
+        """Subscribe to the hubs of all Feeds we have no subscription for,
+        and renew those that are about to expire. Returns the number of
+        requests sent."""
+        now: Final[datetime] = datetime.now()
+        due: Final[list[Subscription]] = \
+            self.client.get_database().websub_get_due(now + RENEW_MARGIN, now - RETRY)
+        cnt: int = 0
+        for sub in due:
+            try:
+                self.subscribe(sub)
+                cnt += 1
+            except WebSubError as err:
+                self.log.error("%s", err)
+        return cnt
+
+    def verify(self, fid: int, params: dict[str, str]) -> Optional[str]:
+        """Check a verification of intent from a hub. Returns the challenge
+        to echo if we asked for what the hub is verifying, None otherwise."""
+        db: Final[Database] = self.client.get_database()
+        sub: Final[Optional[Subscription]] = db.websub_get_by_feed(fid)
+        mode: Final[str] = params.get("hub.mode", "")
+        if sub is None or sub.secret == "" or params.get("hub.topic") != sub.topic:
+            self.log.info("Reject verification of %s for feed %d", mode, fid)
+            return None
+
+        if mode == "denied":
+            self.log.info("Hub %s denied subscription to %s: %s",
+                          sub.hub, sub.topic, params.get("hub.reason", ""))
+            db.websub_set_expires(sub, datetime.fromtimestamp(0))
+            return ""
+        if mode != "subscribe" or "hub.challenge" not in params:
+            return None
+
+        try:
+            lease = timedelta(seconds=int(params.get("hub.lease_seconds", "")))
+        except ValueError:
+            lease = LEASE
+        db.websub_set_expires(sub, datetime.now() + lease)
+        self.log.debug("Subscribed to %s at %s for %s", sub.topic, sub.hub, lease)
+        return params["hub.challenge"]
+
+    def receive(self,
+                fid: int,
+                body: bytes,
+                signature: Optional[str],
+                content_type: str = "") -> bool:
+        """Process content pushed by a hub. Content that is not signed with
+        the secret of our subscription is ignored. Returns True if the
+        content was processed."""
+        db: Final[Database] = self.client.get_database()
+        sub: Final[Optional[Subscription]] = db.websub_get_by_feed(fid)
+        if sub is None or not check_signature(sub.secret, body, signature):
+            self.log.info("Ignore content with a bad signature for feed %d", fid)
+            return False
+        feed: Final[Optional[Feed]] = db.feed_get_by_id(fid)
+        if feed is None:
+            return False
+
+        try:
+            d = parse(body, {"content-location": sub.topic, "content-type": content_type})
+            episodes = self.client.process_feed(feed, d, pushed=True)
+        except Exception as err:  # pylint: disable-msg=W0718
+            self.log.error("Cannot process content pushed for %s: %s", feed.title, err)
+            return False
+        self.log.debug("Hub pushed %d new episodes of %s", len(episodes), feed.title)
+        return True
+
+
+# Local Variables: #
+# python-indent: 4 #
+# End: #